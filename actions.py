@@ -1,41 +1,268 @@
-from users_data_processor import final_users_data
-from config.db_config import db
+from users_data_processor import (
+    CSV_ENGINES,
+    load_final_users_data,
+    load_users_backend,
+    paths,
+    UsersDataOptions,
+)
+from users_data_utils import DataFile, RejectionCollector, UsersDataFormatter
+from users_db_loader import UsersDbLoader
+from users_backends import (
+    BackendError,
+    Deadline,
+    InMemoryUsersBackend,
+    QueryTimeout,
+    ShardedSqliteUsersBackend,
+    SnapshotUsersBackend,
+    SqliteUsersBackend,
+    UsersBackend,
+)
+from snapshot_store import SnapshotError, UsersSnapshot
+from config.db_config import db, db_manifest, busy_timeout
+from config.snapshot_config import snapshot
+from config.login_filter_config import false_positive_rate
+from results_writer import ResultsWriter
+from users_data_exporter import UsersDataExporter
+from session_store import SessionStore
+from result_cache import ResultCache
+from metrics import MetricsRegistry
+from datetime import datetime
+import functools
 import itertools
 import os.path
 import sqlite3
-from sqlite3 import Cursor, Connection
-from typing import Optional, List
+import sys
+import time
+from typing import Callable, Iterator, Optional, List
 from pandas import DataFrame
 
 
 class Actions:
-    def __init__(self, login: str, password: str):
+    ACCOUNTS_PAGE_SIZE = 1000
+    AUTHENTICATION_COLUMNS = ["email", "telephone_number", "password", "role"]
+    SIMILAR_USERS_COLUMNS = ["firstname", "telephone_number", "email", "children"]
+    OLDEST_ACCOUNT_COLUMNS = ["firstname", "email", "created_at"]
+    SEARCH_RESULTS_COLUMNS = ["firstname", "email", "telephone_number", "role"]
+
+    def __init__(
+        self,
+        login: str,
+        password: str,
+        columns: Optional[List[str]] = None,
+        data_options: UsersDataOptions = UsersDataOptions(),
+        output: Optional[ResultsWriter] = None,
+        session_store: Optional[SessionStore] = None,
+        metrics: Optional[MetricsRegistry] = None,
+        timeout: Optional[float] = None,
+        result_cache: Optional[ResultCache] = None,
+        load_data_files: bool = True,
+    ):
+        # The time budget starts here, so it also covers loading users data.
+        # Without load_data_files there is no backend in file mode, commands
+        # loading the data files on their own authenticate against them.
+        self.deadline = None if timeout is None else Deadline(timeout)
+        self.timed_out = False
         self.login = login
         self.password = password
+        self.data_options = data_options
+        self.output = ResultsWriter() if output is None else output
+        self.session_store = session_store
+        self.metrics = metrics
+        self.result_cache = result_cache
+        self.load_data_files = load_data_files
+        self.data_files_fingerprint = None
+        self.columns = (
+            None
+            if columns is None
+            else tuple(dict.fromkeys(Actions.AUTHENTICATION_COLUMNS + columns))
+        )
         self.authenticated_user = False
         self.role = None
-        self.db_available = Actions.is_db_available(db)
+        self.db_available = any(
+            Actions.is_db_available(db_path) for db_path in [db, db_manifest]
+        )
+        self.backend_name = None
+        opening_started = time.perf_counter()
+        self.backend = self.open_backend()
+        if self.metrics is not None:
+            self.metrics.observe(
+                "users_backend_open_duration_seconds",
+                time.perf_counter() - opening_started,
+                backend=self.backend_name,
+            )
         self.authenticate_user()
 
-    def authenticate_user(self):
+    def open_backend(self) -> Optional[UsersBackend]:
         if self.db_available:
-            self.authenticate_user_with_db()
+            try:
+                db_backend = Actions.open_db_backend()
+            except BackendError:
+                print("Error while opening database shards manifest.")
+            else:
+                self.backend_name = (
+                    "sharded-db"
+                    if isinstance(db_backend, ShardedSqliteUsersBackend)
+                    else "db"
+                )
+                return db_backend
+        users_snapshot = Actions.open_snapshot(snapshot)
+        # Snapshots of other or changed data files would give wrong answers
+        if (
+            users_snapshot is not None
+            and users_snapshot.source_version != self.get_source_version()
+        ):
+            users_snapshot.close()
+            users_snapshot = None
+            print(
+                "Snapshot was built from other users data files, using the data files."
+            )
+        if users_snapshot is not None:
+            self.backend_name = "snapshot"
+            return SnapshotUsersBackend(
+                users_snapshot, None if self.columns is None else list(self.columns)
+            )
+        self.backend_name = "file"
+        if not self.load_data_files:
+            return None
+        return load_users_backend(self.columns, self.data_options)
+
+    @staticmethod
+    def open_db_backend(read_only: bool = True) -> UsersBackend:
+        if os.path.exists(db_manifest):
+            return ShardedSqliteUsersBackend(db_manifest, read_only, busy_timeout)
+        return SqliteUsersBackend(db, read_only, busy_timeout)
+
+    def get_source_paths(self) -> List[str]:
+        if self.data_options.data_files is not None:
+            return [data_file.path for data_file in self.data_options.data_files]
+        return paths
+
+    def get_source_version(self) -> str:
+        return SessionStore.get_dataset_version(self.get_source_paths())
+
+    def get_dataset_version(self) -> str:
+        if self.db_available:
+            return SessionStore.get_dataset_version([db_manifest, db, f"{db}-wal"])
+        elif self.backend_name == "snapshot":
+            return SessionStore.get_dataset_version([snapshot])
+        return self.get_source_version()
+
+    def get_data_fingerprint(self) -> Optional[str]:
+        # Data files by size and modification time, databases and snapshots
+        # by their data version. In file mode a password login still loads the
+        # data files to authenticate, a hit only saves the query.
+        if self.backend_name != "file":
+            return self.backend.get_data_version()
+        if self.data_files_fingerprint is None:
+            self.data_files_fingerprint = ResultCache.hash_files(
+                [DataFile(path) for path in paths]
+                if self.data_options.data_files is None
+                else list(self.data_options.data_files)
+            )
+        return self.data_files_fingerprint
+
+    def get_cache_key(
+        self, command: str, per_user: bool, arguments: tuple = ()
+    ) -> Optional[tuple]:
+        # (fingerprint, key), None when results of the data are not cached.
+        # Results of the logged user are keyed by login, never by password.
+        if self.result_cache is None:
+            return None
+        fingerprint = self.get_data_fingerprint()
+        if fingerprint is None:
+            return None
+        return fingerprint, [
+            command,
+            list(arguments),
+            self.columns,
+            self.login if per_user else None,
+        ]
+
+    def count_cache_lookup(self, command: str, result: str):
+        if self.metrics is not None:
+            self.metrics.inc("users_result_cache_total", command=command, result=result)
+
+    def get_cached(self, command: str, compute: Callable, per_user: bool = False):
+        cache_key = self.get_cache_key(command, per_user)
+        if cache_key is None:
+            return compute()
+        result = self.result_cache.get(*cache_key)
+        if result is not ResultCache.MISSING:
+            self.count_cache_lookup(command, "hit")
+            return result
+        self.count_cache_lookup(command, "miss")
+        result = compute()
+        self.result_cache.put(*cache_key, result)
+        return result
+
+    def iter_cached(
+        self,
+        command: str,
+        iter_results: Callable[[], Iterator[dict]],
+        per_user: bool = False,
+        arguments: tuple = (),
+    ) -> Iterator[dict]:
+        # Results are streamed as computed and cached once all were read, so
+        # partial results of an expired time budget are not
+        cache_key = self.get_cache_key(command, per_user, arguments)
+        if cache_key is None:
+            yield from iter_results()
+            return
+        results = self.result_cache.get(*cache_key)
+        if results is not ResultCache.MISSING:
+            self.count_cache_lookup(command, "hit")
+            yield from results
+            return
+        self.count_cache_lookup(command, "miss")
+        results = []
+        for result in iter_results():
+            results.append(result)
+            yield result
+        self.result_cache.put(*cache_key, results)
+
+    def authenticate_user(self):
+        # Without password, only a valid session of the same login authenticates
+        if self.password is None:
+            if self.session_store is not None:
+                self.authenticate_session()
+            return
+        if self.backend is None:
+            return
+        try:
+            # Unknown logins are rejected by the login filter, without a lookup
+            if not self.backend.might_have_login(self.login):
+                if self.metrics is not None:
+                    self.metrics.inc(
+                        "users_login_filter_rejected_total", backend=self.backend_name
+                    )
+                return
+            role = self.get_role_of_logged_user()
+        except BackendError:
+            print("Error while authenticating user.")
         else:
-            user = self.get_data_of_user()
-            if user:
+            if role:
                 self.authenticated_user = True
-                self.role = self.get_role_of_logged_user()
+                self.role = role
 
-    def authenticate_user_with_db(self):
+    def authenticate_loaded_users(self, backend: UsersBackend) -> bool:
+        # Admin login checked against users loaded by a command
+        self.backend = backend
         try:
-            with sqlite3.connect(db) as db_conn:
-                cursor = db_conn.cursor()
-                role = self.get_role_of_logged_user_db(cursor)
-                if role:
-                    self.authenticated_user = True
-                    self.role = role
-        except sqlite3.Error:
-            print("Error while authenticating user.")
+            self.authenticate_user()
+        finally:
+            self.backend = None
+        return self.authenticated_user and self.role == "admin"
+
+    def authenticate_session(self):
+        session = self.session_store.load(self.get_dataset_version())
+        if session is not None and self.login in (None, session.login):
+            self.login = session.login
+            self.authenticated_user = True
+            self.role = session.role
+
+    @property
+    def users_data(self) -> DataFrame:
+        return load_final_users_data(self.columns, self.data_options)
 
     @staticmethod
     def admin_required(func):
@@ -57,267 +284,288 @@ class Actions:
 
         return wrapper
 
+    @staticmethod
+    def timed(func):
+        # Latency histogram labelled with command and backend, when enabled
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            if self.metrics is None:
+                return func(self, *args, **kwargs)
+            with self.metrics.time(
+                "users_command_duration_seconds",
+                command=func.__name__,
+                backend=self.backend_name,
+            ):
+                return func(self, *args, **kwargs)
+
+        return wrapper
+
+    @staticmethod
+    def bounded(func):
+        # Queries stop once the time budget expires, results written until then
+        # are kept and flagged as partial
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            if self.deadline is None:
+                return func(self, *args, **kwargs)
+            self.backend.set_deadline(self.deadline)
+            try:
+                return func(self, *args, **kwargs)
+            except QueryTimeout:
+                self.timed_out = True
+                print(
+                    f"Time budget of {self.deadline.timeout:g} s expired, "
+                    "results are partial.",
+                    file=sys.stderr,
+                )
+            finally:
+                self.backend.set_deadline(None)
+
+        return wrapper
+
     @staticmethod
     def is_db_available(db_path: str) -> bool:
         return True if os.path.exists(db_path) else False
 
-    @authentication_required
-    def print_children(self):
-        if self.db_available:
-            self.print_children_db()
-        else:
-            user_children = self.get_children_of_logged_user()
-            if user_children:
-                user_children.sort(key=lambda x: x["name"])
-                for child in user_children:
-                    print(f"{child['name']}, {child['age']}")
-            else:
-                print(f"User with login: {self.login} has no children.")
+    @staticmethod
+    def open_snapshot(snapshot_path: str) -> Optional[UsersSnapshot]:
+        if not os.path.exists(snapshot_path):
+            return None
+        try:
+            return UsersSnapshot(snapshot_path)
+        except (SnapshotError, OSError, ValueError):
+            print("Error while opening snapshot, using users data files.")
+            return None
 
     @authentication_required
-    def print_children_db(self):
+    @timed
+    @bounded
+    def print_children(self):
         try:
-            with sqlite3.connect(db) as db_conn:
-                cursor = db_conn.cursor()
-                children_of_user = self.get_children_of_logged_user_db(cursor)
-                if children_of_user:
-                    children_of_user.sort(key=lambda x: x["name"])
-                    for child in children_of_user:
-                        print(f"{child['name']}, {child['age']}")
-                else:
-                    print(f"User with login: {self.login} has no children.")
-        except sqlite3.Error:
+            user_children = self.get_cached(
+                "children", self.get_children_of_logged_user, per_user=True
+            )
+        except BackendError:
             print("Error while getting user's children from database.")
+        else:
+            children_count = self.output.write_records(
+                sorted(user_children or [], key=lambda x: x["name"]),
+                ["name", "age"],
+                lambda child: f"{child['name']}, {child['age']}",
+            )
+            if not children_count and self.output.output_format == "text":
+                print(f"User with login: {self.login} has no children.")
 
     @authentication_required
+    @timed
+    @bounded
     def find_similar_children_by_age(self):
-        if self.db_available:
-            self.find_similar_children_by_age_db()
-        else:
-            try:
-                children_ages = [
-                    child["age"] for child in self.get_children_of_logged_user()
-                ]
-            except TypeError:
-                print(f"User with login: {self.login} has no children.")
-            else:
-                similar_users = Actions.find_users_with_children_of_age(children_ages)
-                try:
-                    for user in similar_users:
-                        if (
-                            user["telephone_number"] == self.login
-                            or user["email"] == self.login
-                        ):
-                            continue
-                        children_sorted_by_name = sorted(
-                            user["children"], key=lambda x: x["name"]
-                        )
-                        children_join = "; ".join(
-                            f"{child['name']}, {child['age']}"
-                            for child in children_sorted_by_name
-                        )
-                        print(
-                            f"{user['firstname']}, {user['telephone_number']}: {children_join}"
-                        )
-                except IndexError:
-                    print("Not found users with children of the same age.")
+        try:
+            user_children = self.get_cached(
+                "children", self.get_children_of_logged_user, per_user=True
+            )
+            if not user_children:
+                self.write_no_children()
+                return
+            children_ages = [child["age"] for child in user_children]
+            self.output.write_records(
+                self.iter_cached(
+                    "find_similar_children_by_age",
+                    lambda: self.iter_similar_users(
+                        self.backend.find_users_with_children_of_age(children_ages)
+                    ),
+                    per_user=True,
+                ),
+                Actions.SIMILAR_USERS_COLUMNS,
+                Actions.format_similar_user,
+            )
+        except BackendError:
+            print("Error while finding the similar children by age from database.")
 
     @authentication_required
-    def find_similar_children_by_age_db(self):
+    @timed
+    @bounded
+    def find_matching_families(self, match: str = "exact"):
+        # Users whose children ages are the same multiset as the logged user's,
+        # or with match "superset" contain it
         try:
-            with sqlite3.connect(db) as db_conn:
-                cursor = db_conn.cursor()
-                try:
-                    ages_of_logged_user_children = [
-                        child["age"]
-                        for child in self.get_children_of_logged_user_db(cursor)
-                    ]
-                except TypeError:
-                    print(f"User with login: {self.login} has no children.")
-                else:
-                    placeholders = ",".join("?" * len(ages_of_logged_user_children))
-                    cursor.execute(
-                        """SELECT DISTINCT parent_id FROM users_children
-                            WHERE child_age IN ({});""".format(
-                            placeholders
-                        ),
-                        ages_of_logged_user_children,
-                    )
-                    users_with_similar_children_age = [
-                        user[0] for user in cursor.fetchall()
-                    ]
-                    for user_id in users_with_similar_children_age:
-                        cursor.execute(
-                            """SELECT firstname, email,telephone_number FROM users_data
-                                    WHERE user_id = ? AND (email !=  ? AND telephone_number != ?);""",
-                            (user_id, self.login, self.login),
+            user_children = self.get_cached(
+                "children", self.get_children_of_logged_user, per_user=True
+            )
+            if not user_children:
+                self.write_no_children()
+                return
+            children_ages = [child["age"] for child in user_children]
+            self.output.write_records(
+                self.iter_cached(
+                    "find_matching_families",
+                    lambda: self.iter_similar_users(
+                        self.backend.find_users_with_children_ages(
+                            children_ages, superset=match == "superset"
                         )
-                        result = cursor.fetchone()
-                        if result:
-                            firstname, email, telephone_number = result
-                            cursor.execute(
-                                """SELECT child_name, child_age FROM users_children WHERE parent_id = ?;""",
-                                (user_id,),
-                            )
-                            children_info = cursor.fetchall()
-                            sorted_by_children_name = sorted(
-                                children_info, key=lambda x: x[0]
-                            )
-                            children_join = "; ".join(
-                                f"{child[0]}, {child[1]}"
-                                for child in sorted_by_children_name
-                            )
-                            print(f"{firstname}, {telephone_number}: {children_join}")
-
-        except sqlite3.Error:
-            print("Error while finding the similar children by age from database.")
+                    ),
+                    per_user=True,
+                    arguments=(match,),
+                ),
+                Actions.SIMILAR_USERS_COLUMNS,
+                Actions.format_similar_user,
+            )
+        except BackendError:
+            print(
+                "Error while finding families with matching children ages from database."
+            )
+
+    def write_no_children(self):
+        if self.output.output_format == "text":
+            print(f"User with login: {self.login} has no children.")
+        else:
+            self.output.write_records([], Actions.SIMILAR_USERS_COLUMNS, str)
+
+    def iter_similar_users(self, users: Iterator[dict]) -> Iterator[dict]:
+        # Other users than the logged one, children ordered by name
+        for user in users:
+            if user["telephone_number"] == self.login or user["email"] == self.login:
+                continue
+            # Only output columns, results may be cached
+            yield {
+                **Actions.project(user, Actions.SIMILAR_USERS_COLUMNS),
+                "children": sorted(user["children"], key=lambda x: x["name"]),
+            }
 
     @staticmethod
-    def find_users_with_children_of_age(
-        list_of_ages: List[int],
-    ) -> Optional[List[dict]]:
-        def has_matching_child(children):
-            return any(
-                isinstance(child, dict) and child["age"] in list_of_ages
-                for child in children
-            )
+    def project(record: dict, columns: List[str]) -> dict:
+        return {column: record.get(column) for column in columns}
 
-        users_with_children = final_users_data[final_users_data["children"].notna()]
-        users_with_children_of_age = users_with_children[
-            users_with_children["children"].apply(has_matching_child)
-        ].to_dict(orient="records")
-        return users_with_children_of_age
+    @staticmethod
+    def format_similar_user(user: dict) -> str:
+        children_join = "; ".join(
+            f"{child['name']}, {child['age']}" for child in user["children"]
+        )
+        return f"{user['firstname']}, {user['telephone_number']}: {children_join}"
 
     @admin_required
+    @timed
+    @bounded
     def print_all_accounts(self):
-        if self.db_available:
-            self.print_all_accounts_db()
-        else:
-            print(len(final_users_data))
-
-    @admin_required
-    def print_all_accounts_db(self):
         try:
-            with sqlite3.connect(db) as db_conn:
-                cursor = db_conn.cursor()
-                cursor.execute("""SELECT COUNT(*) FROM users_data;""")
-                all_accounts = cursor.fetchone()
-                if all_accounts:
-                    print(int(all_accounts[0]))
-        except sqlite3.Error:
+            accounts_count = self.get_cached(
+                "print_all_accounts", self.backend.count_users
+            )
+        except BackendError:
             print("Error while getting the number of all accounts from database.")
+        else:
+            self.output.write_records(
+                [{"accounts": accounts_count}],
+                ["accounts"],
+                lambda record: str(record["accounts"]),
+            )
 
     @admin_required
+    @timed
+    @bounded
     def print_oldest_account(self):
-        if self.db_available:
-            self.print_oldest_account_db()
+        try:
+            oldest_account = self.get_cached(
+                "print_oldest_account", self.get_oldest_account
+            )
+        except BackendError:
+            print("Error while getting the oldest account from database.")
         else:
-            oldest_account = final_users_data.sort_values(by="created_at").to_dict(
-                orient="records"
-            )[0]
-            if oldest_account is not None:
-                print(
-                    f"name: {oldest_account['firstname']}\n"
-                    f"email_address: {oldest_account['email']}\n"
-                    f"created_at: {oldest_account['created_at']}"
-                )
+            self.output.write_records(
+                [] if oldest_account is None else [oldest_account],
+                Actions.OLDEST_ACCOUNT_COLUMNS,
+                lambda account: (
+                    f"name: {account['firstname']}\n"
+                    f"email_address: {account['email']}\n"
+                    f"created_at: {account['created_at']}"
+                ),
+            )
 
     @admin_required
-    def print_oldest_account_db(self):
+    @timed
+    @bounded
+    def print_accounts_created(
+        self, since: str, until: str, role: Optional[str] = None
+    ):
         try:
-            with sqlite3.connect(db) as db_conn:
-                cursor = db_conn.cursor()
-                cursor.execute(
-                    """SELECT firstname, email, created_at FROM users_data ORDER BY created_at ASC LIMIT 1;"""
-                )
-                firstname, email, created_at = cursor.fetchone()
-                print(
-                    f"name: {firstname}\n"
-                    f"email_address: {email}\n"
-                    f"created_at: {created_at}"
-                )
-        except sqlite3.Error:
-            print("Error while getting the oldest account from database.")
+            accounts_count = self.output.write_records(
+                itertools.chain.from_iterable(
+                    self.backend.iter_accounts_created(
+                        since, until, role, Actions.ACCOUNTS_PAGE_SIZE
+                    )
+                ),
+                ["created_at", "firstname", "email", "role"],
+                Actions.format_created_account,
+            )
+            if not accounts_count and self.output.output_format == "text":
+                print("Not found accounts created in given time range.")
+        except BackendError:
+            print("Error while getting accounts created in time range from database.")
+
+    @staticmethod
+    def format_created_account(account: dict) -> str:
+        return (
+            f"{account['created_at']}, {account['firstname']}, "
+            f"{account['email']}, {account['role']}"
+        )
 
     @admin_required
+    @timed
+    @bounded
     def group_children_by_age(self):
-        if self.db_available:
-            self.group_children_by_age_db()
+        try:
+            children_ages_histogram = self.get_cached(
+                "group_children_by_age", self.backend.get_children_ages_histogram
+            )
+        except BackendError:
+            print("Error while grouping children by age from database.")
         else:
-            children_data = final_users_data["children"].to_list()
-            children_valid_data = [
-                child for child in children_data if child is not None
-            ]
-            children_ages = [
-                child["age"]
-                for user in children_valid_data
-                for child in user
-                if isinstance(child["age"], int)
-            ]
-            grouped_ages = Actions.group_children_ages_helper(children_ages)
-            for child_age in grouped_ages:
-                print(f"age: {child_age['age']}, count: {child_age['count']}")
+            self.output.write_records(
+                (
+                    {"age": age, "count": count}
+                    for age, count in sorted(
+                        children_ages_histogram, key=lambda x: x[1]
+                    )
+                ),
+                ["age", "count"],
+                lambda child_age: (
+                    f"age: {child_age['age']}, count: {child_age['count']}"
+                ),
+            )
 
     @admin_required
-    def group_children_by_age_db(self):
+    @timed
+    @bounded
+    def search_users(self, query: str):
+        # Only the page written out has to be ranked
+        limit = self.output.limit
+        if limit is not None:
+            limit += self.output.offset
         try:
-            with sqlite3.connect(db) as db_conn:
-                cursor = db_conn.cursor()
-                cursor.execute("""SELECT child_age from users_children""")
-                result_ages_of_all_children = cursor.fetchall()
-                if result_ages_of_all_children:
-                    children_ages = [child[0] for child in result_ages_of_all_children]
-                    grouped_ages = Actions.group_children_ages_helper(children_ages)
-                    for child_age in grouped_ages:
-                        print(f"age: {child_age['age']}, count: {child_age['count']}")
-        except sqlite3.Error:
-            print("Error while grouping children by age from database.")
-
-    @staticmethod
-    def group_children_ages_helper(list_of_children_ages: List[int]) -> List[dict]:
-        sorted_list_od_children_ages = sorted(list_of_children_ages)
-        grouped_ages_of_children = sorted(
-            [
-                {"age": key, "count": len(list(group))}
-                for key, group in itertools.groupby(sorted_list_od_children_ages)
-            ],
-            key=lambda x: x["count"],
-        )
-        return grouped_ages_of_children
+            users_count = self.output.write_records(
+                self.backend.search_users(query, limit),
+                Actions.SEARCH_RESULTS_COLUMNS,
+                lambda user: (
+                    f"{user['firstname']}, {user['email']}, "
+                    f"{user['telephone_number']}, {user['role']}"
+                ),
+            )
+            if not users_count and self.output.output_format == "text":
+                print("Not found users matching search query.")
+        except BackendError:
+            print("Error while searching users in database.")
 
     def get_data_of_user(self) -> Optional[dict]:
-        try:
-            user_data = final_users_data[
-                (
-                    (final_users_data["email"] == self.login)
-                    | (final_users_data["telephone_number"] == self.login)
-                )
-                & (final_users_data["password"] == self.password)
-            ].to_dict(orient="records")[0]
-        except (TypeError, IndexError):
+        return self.backend.find_user(self.login, self.password)
+
+    def get_oldest_account(self) -> Optional[dict]:
+        oldest_user = self.backend.get_oldest_user()
+        if oldest_user is None:
             return None
-        else:
-            return user_data
+        return Actions.project(oldest_user, Actions.OLDEST_ACCOUNT_COLUMNS)
 
     def get_children_of_logged_user(self) -> Optional[List[dict]]:
-        user_data = self.get_data_of_user()
-        if user_data and isinstance(user_data.get("children"), list):
-            return user_data["children"]
-        return None
-
-    def get_children_of_logged_user_db(self, cursor: Cursor) -> Optional[List[dict]]:
-        cursor.execute(
-            """SELECT uc.child_name, uc.child_age FROM users_children uc
-                            JOIN users_data ud ON uc.parent_id = ud.user_id
-                            WHERE ud.email = ? OR ud.telephone_number = ?; """,
-            (self.login, self.login),
-        )
-        result = cursor.fetchall()
-        if result:
-            children_data = [{"name": child[0], "age": child[1]} for child in result]
-        else:
-            return None
-        return children_data
+        return self.backend.get_children(self.login, self.password)
 
     def get_role_of_logged_user(self) -> Optional[str]:
         user_data = self.get_data_of_user()
@@ -325,83 +573,165 @@ class Actions:
             return user_data["role"]
         return None
 
-    def get_role_of_logged_user_db(self, cursor: Cursor) -> Optional[str]:
-        cursor.execute(
-            "SELECT role FROM users_data WHERE (email = ? OR telephone_number = ?) AND password = ?;",
-            (self.login, self.login, self.password),
-        )
-        user_role = cursor.fetchone()
-        if user_role:
-            return user_role[0]
+    @authentication_required
+    @timed
+    def create_session(self):
+        if self.password is None or self.session_store is None:
+            print("Invalid Login")
+            return
+        try:
+            session = self.session_store.create(
+                self.login, self.role, self.get_dataset_version()
+            )
+        except OSError:
+            print("Error while creating session.")
         else:
-            return None
+            expires_at = datetime.fromtimestamp(session.expires_at)
+            print(f"Logged in until {expires_at:%Y-%m-%d %H:%M:%S}.")
+
+    @admin_required
+    @timed
+    def build_snapshot(self):
+        try:
+            UsersSnapshot.build(
+                self.users_data,
+                snapshot,
+                false_positive_rate,
+                self.get_source_version(),
+            )
+        except (OSError, KeyError, ValueError):
+            print("Error while building snapshot.")
+        else:
+            print("Snapshot created.")
 
     @admin_required
-    def create_database(self):
-        if not self.db_available:
+    @timed
+    def export_users_data(
+        self, output_path: str, export_format: str, columns: Optional[List[str]] = None
+    ):
+        try:
+            users_count = UsersDataExporter(output_path, export_format, columns).export(
+                self.users_data
+            )
+        except (OSError, ValueError, sqlite3.Error):
+            print(f"Error while exporting users data to: {output_path}")
+        else:
+            print(f"Exported {users_count} users to: {output_path}")
+
+    @timed
+    def create_database(self, shards: int = 1):
+        # Without a backend the data files are loaded once, for the database,
+        # and the login is authenticated against the loaded users
+        authenticate_loaded = self.backend is None and self.password is not None
+        if not authenticate_loaded and not (
+            self.role == "admin" and self.authenticated_user
+        ):
+            print("Invalid Login")
+        elif not self.db_available:
             try:
-                with sqlite3.connect(db) as db_conn:
-                    cursor = db_conn.cursor()
-                    Actions.create_starting_db_tables(cursor)
-                    Actions.add_users_data_to_db(db_conn, final_users_data)
-                    print("Database created and users data added.")
-            except sqlite3.Error:
+                if shards > 1:
+                    users_data = self.users_data
+                    if authenticate_loaded and not self.authenticate_loaded_users(
+                        InMemoryUsersBackend(users_data)
+                    ):
+                        print("Invalid Login")
+                        return
+                    insert_started = time.perf_counter()
+                    inserted_users = ShardedSqliteUsersBackend.create(
+                        db_manifest,
+                        users_data,
+                        shards,
+                        busy_timeout,
+                        false_positive_rate,
+                    )
+                else:
+                    insert_started = time.perf_counter()
+                    inserted_users = self.load_database(authenticate_loaded)
+                    if inserted_users is None:
+                        print("Invalid Login")
+                        return
+                if self.metrics is not None:
+                    # Insert rate is rows inserted over insert seconds
+                    self.metrics.inc("users_db_rows_inserted_total", inserted_users)
+                    self.metrics.inc(
+                        "users_db_insert_seconds_total",
+                        time.perf_counter() - insert_started,
+                    )
+            except BackendError:
                 print("Error while creating/filling db tables.")
+            else:
+                print("Database created and users data added.")
         else:
             print("Database exists already.")
 
-    @staticmethod
-    def add_users_data_to_db(db_conn: Connection, users_data: DataFrame):
-        cursor = db_conn.cursor()
+    def load_database(self, authenticate: bool = False) -> Optional[int]:
+        # Streams the data files into the database. Rows rejected while
+        # loading users data files for the backend are already reported.
+        # With authenticate, users are loaded next to the database and moved
+        # in place only for an admin login, None otherwise.
+        rejections = (
+            None
+            if self.backend_name == "file" and self.backend is not None
+            else RejectionCollector(self.data_options.quarantine_path)
+        )
+        db_path = f"{db}.loading" if authenticate else db
+        Actions.remove_db_files(db_path)
+        loader = UsersDbLoader(
+            db_path,
+            CSV_ENGINES[self.data_options.csv_engine],
+            UsersDataFormatter,
+            self.data_options.workers,
+            rejections,
+            self.metrics,
+            busy_timeout,
+            false_positive_rate,
+        )
         try:
-            for index, row in users_data.iterrows():
-                cursor.execute(
-                    """INSERT INTO users_data
-                        (email, firstname, telephone_number, password, role, created_at)
-                        VALUES (?, ?, ?, ?, ?, ?)""",
-                    (
-                        row["email"],
-                        row["firstname"],
-                        row["telephone_number"],
-                        row["password"],
-                        row["role"],
-                        row["created_at"],
-                    ),
-                )
-                user_id = cursor.lastrowid
-                if row["children"] is not None:
-                    for child in row["children"]:
-                        cursor.execute(
-                            """INSERT INTO users_children (parent_id, child_name, child_age) VALUES (?, ?, ?)""",
-                            (user_id, child["name"], child["age"]),
-                        )
-                db_conn.commit()
-        except sqlite3.Error:
-            db_conn.rollback()
+            inserted_users = loader.load(
+                paths
+                if self.data_options.data_files is None
+                else list(self.data_options.data_files)
+            )
+        finally:
+            if rejections is not None:
+                rejections.write_quarantine()
+                rejections.print_summary()
+                if self.metrics is not None:
+                    rejections.add_to_metrics(self.metrics)
+        loader.print_throughput()
+        if authenticate:
+            loaded_backend = SqliteUsersBackend(db_path, False, busy_timeout)
+            try:
+                is_admin = self.authenticate_loaded_users(loaded_backend)
+            finally:
+                loaded_backend.close()
+            if not is_admin:
+                Actions.remove_db_files(db_path)
+                return None
+            os.replace(db_path, db)
+            Actions.remove_db_files(db_path)
+        return inserted_users
 
     @staticmethod
-    def create_starting_db_tables(cursor: Cursor):
-        cursor.execute(
-            """CREATE TABLE IF NOT EXISTS users_data
-              (
-                 user_id          INTEGER PRIMARY KEY,
-                 email            TEXT NOT NULL,
-                 firstname        TEXT NOT NULL,
-                 telephone_number TEXT NOT NULL,
-                 password         TEXT NOT NULL,
-                 role             TEXT NOT NULL,
-                 created_at       TEXT NOT NULL,
-                 UNIQUE (email, telephone_number)
-              )
-        ;"""
-        )
+    def remove_db_files(db_path: str):
+        for path in [db_path, f"{db_path}-wal", f"{db_path}-shm"]:
+            if os.path.exists(path):
+                os.remove(path)
 
-        cursor.execute(
-            """CREATE TABLE IF NOT EXISTS users_children
-              (
-                 parent_id  INTEGER NOT NULL,
-                 child_name TEXT NOT NULL,
-                 child_age  INTEGER NOT NULL,
-                 FOREIGN KEY (parent_id) REFERENCES users_data(user_id) ON DELETE CASCADE
-              );"""
-        )
+    @admin_required
+    @timed
+    def check_database(self):
+        if self.db_available:
+            try:
+                db_backend = Actions.open_db_backend(read_only=False)
+                stale_summaries = db_backend.check_summary_tables(false_positive_rate)
+                db_backend.close()
+            except BackendError:
+                print("Error while checking database summary tables.")
+            else:
+                if stale_summaries:
+                    print(f"Recomputed summary tables: {', '.join(stale_summaries)}.")
+                else:
+                    print("Summary tables are consistent.")
+        else:
+            print("Database does not exist.")
@@ -0,0 +1,106 @@
+"""Run every backend query used by the CLI commands against each backend.
+
+Run from the project root: python -m benchmarks.backends_benchmark
+"""
+
+import os
+import random
+import tempfile
+import timeit
+from pandas import DataFrame
+from benchmarks.synthetic_data import generate_users
+from snapshot_store import UsersSnapshot
+from users_backends import (
+    InMemoryUsersBackend,
+    ShardedSqliteUsersBackend,
+    SnapshotUsersBackend,
+    SqliteUsersBackend,
+)
+
+NUMBER_OF_USERS = 50000
+NUMBER_OF_LOGINS = 200
+NUMBER_OF_SHARDS = 4
+REPEAT = 3
+
+
+def get_queries(users: list) -> dict:
+    randomizer = random.Random(1)
+    logins = [
+        (
+            user[randomizer.choice(["email", "telephone_number"])],
+            user["password"],
+        )
+        for user in randomizer.sample(users, NUMBER_OF_LOGINS)
+    ]
+    return {
+        "find-user": lambda backend: [
+            backend.find_user(login, password) for login, password in logins
+        ],
+        "get-children": lambda backend: [
+            backend.get_children(login, password) for login, password in logins
+        ],
+        "children-of-age": lambda backend: list(
+            backend.find_users_with_children_of_age([3, 7, 12])
+        ),
+        "ages-histogram": lambda backend: backend.get_children_ages_histogram(),
+        "count": lambda backend: backend.count_users(),
+        "oldest": lambda backend: backend.get_oldest_user(),
+        "search-email": lambda backend: [
+            list(backend.search_users(login))
+            for login, _ in logins[: NUMBER_OF_LOGINS // 10]
+        ],
+        "search-prefix": lambda backend: list(backend.search_users("jo")),
+        "created-in-2015": lambda backend: sum(
+            len(page)
+            for page in backend.iter_accounts_created(
+                "2015-01-01 00:00:00", "2015-12-31 23:59:59"
+            )
+        ),
+    }
+
+
+def main():
+    users = generate_users(NUMBER_OF_USERS)
+    users_data = DataFrame(users)
+    queries = get_queries(users)
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, "users_db.db")
+        manifest_path = os.path.join(directory, "users_db.manifest.json")
+        snapshot_path = os.path.join(directory, "users_snapshot.bin")
+        builds = {
+            "in-memory": lambda: InMemoryUsersBackend(users_data),
+            "sqlite": lambda: SqliteUsersBackend.create(db_path, users_data),
+            f"sharded-{NUMBER_OF_SHARDS}": lambda: ShardedSqliteUsersBackend.create(
+                manifest_path, users_data, NUMBER_OF_SHARDS
+            ),
+            "snapshot": lambda: UsersSnapshot.build(users_data, snapshot_path),
+        }
+        build_timings = [timeit.timeit(build, number=1) for build in builds.values()]
+        users_snapshot = UsersSnapshot(snapshot_path)
+        backends = {
+            "in-memory": InMemoryUsersBackend(users_data),
+            "sqlite": SqliteUsersBackend(db_path),
+            f"sharded-{NUMBER_OF_SHARDS}": ShardedSqliteUsersBackend(manifest_path),
+            "snapshot": SnapshotUsersBackend(users_snapshot),
+        }
+        print(f"{'query':<18}" + "".join(f"{name:>14}" for name in backends))
+        print(
+            f"{'build':<18}"
+            + "".join(f"{timing * 1000:>11.0f} ms" for timing in build_timings)
+        )
+        for query_name, query in queries.items():
+            timings = [
+                min(timeit.repeat(lambda: query(backend), number=1, repeat=REPEAT))
+                for backend in backends.values()
+            ]
+            print(
+                f"{query_name:<18}"
+                + "".join(f"{timing * 1000:>11.2f} ms" for timing in timings)
+            )
+        backends["sqlite"].close()
+        backends[f"sharded-{NUMBER_OF_SHARDS}"].close()
+        users_snapshot.close()
+
+
+if __name__ == "__main__":
+    main()
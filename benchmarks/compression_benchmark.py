@@ -0,0 +1,68 @@
+"""Compare extraction of compressed and uncompressed data files.
+
+Reports wall time and bytes read through read syscalls (rchar from
+/proc/self/io, file size where it is not available).
+
+Run from the project root: python -m benchmarks.compression_benchmark
+"""
+
+import bz2
+import gzip
+import lzma
+import os
+import shutil
+import tempfile
+import time
+from benchmarks.synthetic_data import generate_users, write_users
+from users_data_utils import UsersDataExtractor
+
+NUMBER_OF_USERS = 50000
+COMPRESSIONS = {"gz": gzip.open, "bz2": bz2.open, "xz": lzma.open}
+
+
+def read_bytes() -> int:
+    try:
+        with open("/proc/self/io") as io_file:
+            for line in io_file:
+                if line.startswith("rchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return -1
+
+
+def measure_extraction(path: str) -> tuple:
+    bytes_before = read_bytes()
+    start = time.perf_counter()
+    UsersDataExtractor(path).extract_data()
+    elapsed = time.perf_counter() - start
+    bytes_after = read_bytes()
+    if bytes_before < 0:
+        return elapsed, os.path.getsize(path)
+    return elapsed, bytes_after - bytes_before
+
+
+def main():
+    users = generate_users(NUMBER_OF_USERS)
+    with tempfile.TemporaryDirectory() as directory:
+        for data_format in ["csv", "json", "xml"]:
+            path = os.path.join(directory, f"users.{data_format}")
+            write_users(users, path, data_format)
+            paths = [path]
+            for compression, opener in COMPRESSIONS.items():
+                compressed_path = f"{path}.{compression}"
+                with open(path, "rb") as source, opener(
+                    compressed_path, "wb"
+                ) as target:
+                    shutil.copyfileobj(source, target)
+                paths.append(compressed_path)
+            for measured_path in paths:
+                elapsed, bytes_read = measure_extraction(measured_path)
+                print(
+                    f"{os.path.basename(measured_path)}: {elapsed * 1000:.1f} ms, "
+                    f"{bytes_read / 1024:.0f} KiB read"
+                )
+
+
+if __name__ == "__main__":
+    main()
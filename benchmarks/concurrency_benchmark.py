@@ -0,0 +1,86 @@
+"""Reader throughput while a bulk load writes to the same SQLite database.
+
+Run from the project root: python -m benchmarks.concurrency_benchmark
+"""
+
+from contextlib import closing
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from pandas import DataFrame
+from benchmarks.synthetic_data import generate_users
+from users_backends import BackendError, SqliteUsersBackend
+
+NUMBER_OF_USERS = 20000
+NUMBER_OF_LOADED_USERS = 5000
+NUMBER_OF_READERS = 4
+JOURNAL_MODES = ["delete", "wal"]
+
+
+def run_reader(db_path: str, logins: list, load_done, results):
+    backend = SqliteUsersBackend(db_path)
+    randomizer = random.Random(os.getpid())
+    queries, errors = 0, 0
+    started = time.perf_counter()
+    while not load_done.is_set():
+        login, password = randomizer.choice(logins)
+        try:
+            backend.find_user(login, password)
+            backend.count_users()
+        except BackendError:
+            errors += 1
+        else:
+            queries += 1
+    results.put((queries, errors, time.perf_counter() - started))
+    backend.close()
+
+
+def run_writer(db_path: str, users: list, load_done):
+    with closing(SqliteUsersBackend.connect(db_path)) as db_conn:
+        SqliteUsersBackend.add_users_data_to_db(db_conn, DataFrame(users))
+    load_done.set()
+
+
+def main():
+    users = generate_users(NUMBER_OF_USERS + NUMBER_OF_LOADED_USERS)
+    initial_users, loaded_users = users[:NUMBER_OF_USERS], users[NUMBER_OF_USERS:]
+    logins = [(user["email"], user["password"]) for user in initial_users]
+    for journal_mode in JOURNAL_MODES:
+        with tempfile.TemporaryDirectory() as directory:
+            db_path = os.path.join(directory, "users_db.db")
+            SqliteUsersBackend.create(db_path, DataFrame(initial_users))
+            with closing(SqliteUsersBackend.connect(db_path)) as db_conn:
+                db_conn.execute(f"PRAGMA journal_mode = {journal_mode};")
+
+            load_done = multiprocessing.Event()
+            results = multiprocessing.Queue()
+            readers = [
+                multiprocessing.Process(
+                    target=run_reader, args=(db_path, logins, load_done, results)
+                )
+                for _ in range(NUMBER_OF_READERS)
+            ]
+            writer = multiprocessing.Process(
+                target=run_writer, args=(db_path, loaded_users, load_done)
+            )
+            started = time.perf_counter()
+            for process in readers + [writer]:
+                process.start()
+            reader_results = [results.get() for _ in readers]
+            for process in readers + [writer]:
+                process.join()
+            load_time = time.perf_counter() - started
+
+            queries = sum(result[0] for result in reader_results)
+            errors = sum(result[1] for result in reader_results)
+            print(
+                f"{journal_mode}: load {load_time:.2f} s, "
+                f"{queries / load_time:.0f} reads/s from {NUMBER_OF_READERS} readers, "
+                f"{errors} failed reads"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Compare loading data files into SQLite: merge in memory then insert row by
+row, and the pipelined loader streaming batches into upserts.
+
+Peak memory is measured with tracemalloc, worker processes are not counted.
+
+Run from the project root: python -m benchmarks.db_load_benchmark
+"""
+
+import os
+import tempfile
+import time
+import tracemalloc
+from benchmarks.synthetic_data import generate_users, write_users
+from users_backends import SqliteUsersBackend
+from users_data_processor import process_users_data
+from users_db_loader import UsersDbLoader
+
+NUMBER_OF_USERS = 100000
+
+
+def measure(load) -> tuple:
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        load()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return time.perf_counter() - started, peak
+
+
+def main():
+    users = generate_users(NUMBER_OF_USERS)
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for data_format in ["csv", "json", "xml"]:
+            paths.append(os.path.join(directory, f"users.{data_format}"))
+            write_users(users, paths[-1], data_format)
+        loaders = {
+            "merge then insert": lambda db_path: SqliteUsersBackend.create(
+                db_path, process_users_data(paths)
+            ),
+            "pipelined loader": lambda db_path: UsersDbLoader(db_path).load(paths),
+        }
+        for name, load in loaders.items():
+            db_path = os.path.join(directory, f"{name.replace(' ', '_')}.db")
+            seconds, peak = measure(lambda: load(db_path))
+            print(f"{name}: {seconds:.2f} s, peak {peak / 1024 / 1024:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
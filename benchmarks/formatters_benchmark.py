@@ -0,0 +1,43 @@
+"""Compare generic and format-specialized formatting per source format.
+
+Run from the project root: python -m benchmarks.formatters_benchmark
+"""
+
+import os
+import tempfile
+import timeit
+from benchmarks.synthetic_data import generate_users, write_users
+from users_data_utils import UsersDataExtractor, UsersDataFormatter
+
+NUMBER_OF_USERS = 20000
+REPEAT = 5
+
+
+def time_formatter(formatter, extractor: UsersDataExtractor) -> float:
+    timings = []
+    for _ in range(REPEAT):
+        data = extractor.extract_data()
+        timings.append(timeit.timeit(lambda: formatter(data).process_data(), number=1))
+    return min(timings)
+
+
+def main():
+    users = generate_users(NUMBER_OF_USERS)
+    with tempfile.TemporaryDirectory() as directory:
+        for data_format in ["csv", "json", "xml"]:
+            path = os.path.join(directory, f"users.{data_format}")
+            write_users(users, path, data_format)
+            extractor = UsersDataExtractor(path)
+            generic = time_formatter(UsersDataFormatter, extractor)
+            specialized = time_formatter(
+                UsersDataFormatter.for_data_format(extractor.data_format), extractor
+            )
+            print(
+                f"{data_format}: generic {generic * 1000:.1f} ms, "
+                f"specialized {specialized * 1000:.1f} ms, "
+                f"speedup {generic / specialized:.2f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
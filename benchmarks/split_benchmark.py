@@ -0,0 +1,47 @@
+"""Compare formatting of one large data file on one core and split into parts.
+
+Speedup needs as many free cores as workers, parts are pickled between processes.
+
+Run from the project root: python -m benchmarks.split_benchmark
+"""
+
+import os
+import tempfile
+import time
+from benchmarks.synthetic_data import generate_users, write_users
+from users_data_utils import UsersDataExtractor, UsersDataFormatter, UsersDataMerger
+
+NUMBER_OF_USERS = 200000
+WORKERS = max(2, min(4, os.cpu_count() or 1))
+SPLIT_SIZE = 1024 * 1024
+
+
+def time_merge(path: str, workers: int) -> float:
+    started = time.perf_counter()
+    UsersDataMerger.merge_data(
+        [path],
+        UsersDataExtractor,
+        UsersDataFormatter,
+        workers=workers,
+        split_size=SPLIT_SIZE,
+    )
+    return time.perf_counter() - started
+
+
+def main():
+    users = generate_users(NUMBER_OF_USERS)
+    with tempfile.TemporaryDirectory() as directory:
+        for data_format in ["csv", "json", "xml"]:
+            path = os.path.join(directory, f"users.{data_format}")
+            write_users(users, path, data_format)
+            single = time_merge(path, 1)
+            split = time_merge(path, WORKERS)
+            print(
+                f"{data_format} ({os.path.getsize(path) // (1024 * 1024)} MiB): "
+                f"1 worker {single:.2f} s, {WORKERS} workers {split:.2f} s, "
+                f"speedup {single / split:.2f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
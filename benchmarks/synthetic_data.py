@@ -0,0 +1,83 @@
+import csv
+import json
+import random
+from typing import List
+import xml.etree.ElementTree as ET
+
+USERS_COLUMNS = [
+    "firstname",
+    "telephone_number",
+    "email",
+    "password",
+    "role",
+    "created_at",
+    "children",
+]
+NAMES = ["Adam", "Anna", "Bob", "Hellen", "John", "Kate", "Marie", "Peter", "Teresa"]
+
+
+def generate_users(number_of_users: int, seed: int = 0) -> List[dict]:
+    randomizer = random.Random(seed)
+    users = []
+    for user_number in range(number_of_users):
+        children = [
+            {"name": randomizer.choice(NAMES), "age": randomizer.randint(1, 18)}
+            for _ in range(randomizer.randint(0, 3))
+        ]
+        users.append(
+            {
+                "firstname": randomizer.choice(NAMES),
+                "telephone_number": f"+48{100000000 + user_number}",
+                "email": f"user{user_number}@example.com",
+                "password": f"password{user_number}",
+                "role": randomizer.choice(["admin", "user"]),
+                "created_at": f"20{randomizer.randint(10, 23)}-"
+                f"{randomizer.randint(1, 12):02d}-{randomizer.randint(1, 28):02d} "
+                f"{randomizer.randint(0, 23):02d}:{randomizer.randint(0, 59):02d}:"
+                f"{randomizer.randint(0, 59):02d}",
+                "children": children,
+            }
+        )
+    return users
+
+
+def write_csv(users: List[dict], path: str):
+    with open(path, "w", newline="") as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=USERS_COLUMNS, delimiter=";")
+        writer.writeheader()
+        for user in users:
+            writer.writerow(
+                {
+                    **user,
+                    "children": ",".join(
+                        f"{child['name']} ({child['age']})"
+                        for child in user["children"]
+                    ),
+                }
+            )
+
+
+def write_json(users: List[dict], path: str):
+    with open(path, "w") as file:
+        json.dump(users, file)
+
+
+def write_xml(users: List[dict], path: str):
+    root = ET.Element("users")
+    for user in users:
+        user_element = ET.SubElement(root, "user")
+        for column in USERS_COLUMNS:
+            field = ET.SubElement(user_element, column)
+            if column == "children":
+                for child in user["children"]:
+                    child_element = ET.SubElement(field, "child")
+                    ET.SubElement(child_element, "name").text = child["name"]
+                    ET.SubElement(child_element, "age").text = str(child["age"])
+            else:
+                field.text = user[column]
+    ET.ElementTree(root).write(path)
+
+
+def write_users(users: List[dict], path: str, data_format: str):
+    writers = {"csv": write_csv, "json": write_json, "xml": write_xml}
+    writers[data_format](users, path)
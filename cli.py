@@ -1,11 +1,30 @@
 from argparse import Namespace, ArgumentParser
 from actions import Actions
+from results_writer import OUTPUT_FORMATS, ResultsWriter
+from users_data_exporter import EXPORT_COLUMNS, EXPORT_FORMATS
+from session_store import SessionStore
+from result_cache import ResultCache
+from metrics import MetricsRegistry
+from config.session_config import session_file, session_key_file, session_ttl
+from config.result_cache_config import (
+    result_cache_dir,
+    result_cache_entries,
+    result_cache_bytes,
+)
+from users_data_processor import CSV_ENGINES, UsersDataOptions
+from users_data_utils import UsersDataFinder, UsersDataMerger
+from datetime import datetime
 import re
+import sys
 from typing import Optional
 
 PHONE_VALID_PATTERN = r"[\d]{9}"
 EMAIL_VALID_PATTERN = r"(^[^@]+@[^@\.]+\.[a-z\d]{1,4}$)"
 PASSWORD_VALID_PATTERN_LENGTH = r".{6,24}"
+DATE_FORMAT = "%Y-%m-%d"
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+# Exit status of commands stopped by --timeout, as of coreutils timeout
+EXIT_TIMEOUT = 124
 
 commands_list = [
     "print-all-accounts",
@@ -13,9 +32,37 @@ commands_list = [
     "group-by-age",
     "print-children",
     "find-similar-children-by-age",
+    "find-matching-families",
     "create-database",
+    "print-accounts-created",
+    "build-snapshot",
+    "check-database",
+    "login",
+    "logout",
+    "search-users",
+    "export",
 ]
 
+commands_columns = {
+    "print-all-accounts": [],
+    "print-oldest-account": ["firstname", "created_at"],
+    "group-by-age": ["children"],
+    "print-children": ["children"],
+    "find-similar-children-by-age": ["firstname", "children"],
+    "find-matching-families": ["firstname", "children"],
+    "create-database": None,
+    "print-accounts-created": ["firstname", "created_at"],
+    "build-snapshot": None,
+    "check-database": [],
+    "login": [],
+    "logout": None,
+    "search-users": ["firstname"],
+    "export": None,
+}
+
+roles_list = ["admin", "user"]
+match_list = ["exact", "superset"]
+
 
 def validate_login(login: str) -> Optional[str]:
     try:
@@ -41,23 +88,206 @@ def validate_password(password: str) -> Optional[str]:
         return str(password)
 
 
-def main():
+def validate_datetime(value: str, end_of_day: bool = False) -> Optional[str]:
+    for date_format in (DATETIME_FORMAT, DATE_FORMAT):
+        try:
+            parsed_datetime = datetime.strptime(value, date_format)
+        except (TypeError, ValueError):
+            continue
+        if date_format == DATE_FORMAT and end_of_day:
+            parsed_datetime = parsed_datetime.replace(hour=23, minute=59, second=59)
+        return parsed_datetime.strftime(DATETIME_FORMAT)
+    return None
+
+
+def validate_since(since: str) -> Optional[str]:
+    return validate_datetime(since)
+
+
+def validate_until(until: str) -> Optional[str]:
+    return validate_datetime(until, end_of_day=True)
+
+
+def main() -> Optional[int]:
     parser = ArgumentParser(description="Command-line interface for user actions")
     parser.add_argument(
         "command", type=str, help="enter command: " + ", ".join(commands_list)
     )
+    parser.add_argument(
+        "query",
+        nargs="?",
+        help="search-users query: words or beginnings of words of name, email or "
+        "telephone number",
+    )
     parser.add_argument("--login", type=validate_login, help="input user login")
     parser.add_argument(
         "--password", type=validate_password, help="input user password"
     )
+    parser.add_argument(
+        "--since",
+        type=validate_since,
+        help="input start of time range: YYYY-MM-DD or 'YYYY-MM-DD HH:MM:SS'",
+    )
+    parser.add_argument(
+        "--until",
+        type=validate_until,
+        help="input end of time range: YYYY-MM-DD or 'YYYY-MM-DD HH:MM:SS'",
+    )
+    parser.add_argument("--role", choices=roles_list, help="filter accounts by role")
+    parser.add_argument(
+        "--match",
+        choices=match_list,
+        default="exact",
+        help="find-matching-families: same children ages, or at least them",
+    )
+    parser.add_argument(
+        "--quarantine",
+        help="write a sample of rejected rows to given file (JSON lines)",
+    )
+    parser.add_argument(
+        "--data-dir", help="load users data files found recursively in directory"
+    )
+    parser.add_argument(
+        "--include",
+        action="append",
+        help="glob of data files (relative to --data-dir) to load, can be repeated",
+    )
+    parser.add_argument(
+        "--exclude",
+        action="append",
+        help="glob of data files (relative to --data-dir) to skip, can be repeated",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="number of worker processes loading data files",
+    )
+    parser.add_argument(
+        "--split-size",
+        type=int,
+        default=UsersDataMerger.SPLIT_SIZE // (1024 * 1024),
+        help="with workers, data files larger than this many MiB are split into "
+        "parts formatted in parallel",
+    )
+    parser.add_argument(
+        "--csv-engine",
+        choices=list(CSV_ENGINES),
+        default="python",
+        help="CSV reader: python csv module or chunked pandas C parser",
+    )
+    parser.add_argument(
+        "--format",
+        choices=list(dict.fromkeys(OUTPUT_FORMATS + EXPORT_FORMATS)),
+        default="text",
+        help="output format of command results, export: " + ", ".join(EXPORT_FORMATS),
+    )
+    parser.add_argument(
+        "--output",
+        help="export file path, compressed when ending in .gz, .bz2 or .xz",
+    )
+    parser.add_argument(
+        "--columns",
+        type=lambda columns: [column.strip() for column in columns.split(",")],
+        help="comma separated columns to export: " + ", ".join(EXPORT_COLUMNS),
+    )
+    parser.add_argument("--limit", type=int, help="maximum number of results to output")
+    parser.add_argument(
+        "--offset", type=int, default=0, help="number of results to skip"
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=1,
+        help="number of SQLite files create-database partitions users into",
+    )
+    parser.add_argument(
+        "--metrics",
+        help="add metrics of the run to given Prometheus textfile (.prom) or JSON file",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        help="time budget of the command in seconds, results found until it "
+        "expires are output as partial",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="compute results without reading or writing the result cache",
+    )
     args: Namespace = parser.parse_args()
 
     if args.command in commands_list:
-        if (
+        session_store = SessionStore(session_file, session_key_file, session_ttl)
+        # Without --password, commands authenticate with the login session
+        use_session = args.password is None and args.command != "login"
+        if args.command == "logout":
+            session_store.delete()
+            print("Logged out.")
+        elif use_session or (
             validate_login(args.login) is not None
             and validate_password(args.password) is not None
         ):
-            action = Actions(login=args.login, password=args.password)
+            if (args.limit is not None and args.limit < 0) or args.offset < 0:
+                print("Invalid Limit or Offset")
+                return
+            if args.timeout is not None and args.timeout <= 0:
+                print("Invalid Timeout")
+                return
+            if args.split_size <= 0:
+                print("Invalid Split Size")
+                return
+            columns = commands_columns[args.command]
+            if args.command == "export":
+                if args.format not in EXPORT_FORMATS or args.output is None:
+                    print("Invalid Export Format or Output")
+                    return
+                if args.columns is not None:
+                    if not args.columns or not set(args.columns) <= set(EXPORT_COLUMNS):
+                        print("Invalid Export Columns")
+                        return
+                    # Only exported columns are loaded
+                    columns = args.columns
+            elif args.format not in OUTPUT_FORMATS:
+                print("Invalid Format")
+                return
+            data_files = None
+            if args.data_dir is not None:
+                data_files = UsersDataFinder(
+                    args.data_dir, args.include, args.exclude
+                ).find_data_files()
+                if not data_files:
+                    print(f"No data files found in: {args.data_dir}")
+                    return
+            metrics = None if args.metrics is None else MetricsRegistry()
+            result_cache = (
+                None
+                if args.no_cache
+                else ResultCache(
+                    result_cache_dir, result_cache_entries, result_cache_bytes
+                )
+            )
+            action = Actions(
+                login=args.login,
+                password=args.password,
+                columns=columns,
+                data_options=UsersDataOptions(
+                    data_files=None if data_files is None else tuple(data_files),
+                    quarantine_path=args.quarantine,
+                    workers=args.workers,
+                    csv_engine=args.csv_engine,
+                    metrics=metrics,
+                    split_size=args.split_size * 1024 * 1024,
+                ),
+                output=ResultsWriter(args.format, args.limit, args.offset),
+                session_store=session_store,
+                metrics=metrics,
+                timeout=args.timeout,
+                result_cache=result_cache,
+                # The database load authenticates the login by itself
+                load_data_files=args.command != "create-database",
+            )
 
             if args.command == "print-all-accounts":
                 action.print_all_accounts()
@@ -74,8 +304,43 @@ def main():
             elif args.command == "find-similar-children-by-age":
                 action.find_similar_children_by_age()
 
+            elif args.command == "find-matching-families":
+                action.find_matching_families(args.match)
+
             elif args.command == "create-database":
-                action.create_database()
+                action.create_database(args.shards)
+
+            elif args.command == "build-snapshot":
+                action.build_snapshot()
+
+            elif args.command == "check-database":
+                action.check_database()
+
+            elif args.command == "login":
+                action.create_session()
+
+            elif args.command == "export":
+                action.export_users_data(args.output, args.format, args.columns)
+
+            elif args.command == "search-users":
+                if args.query is not None and args.query.strip():
+                    action.search_users(args.query)
+                else:
+                    print("Invalid Search Query")
+
+            elif args.command == "print-accounts-created":
+                if args.since is not None and args.until is not None:
+                    action.print_accounts_created(args.since, args.until, args.role)
+                else:
+                    print("Invalid Time Range")
+
+            if metrics is not None:
+                try:
+                    metrics.write(args.metrics)
+                except (OSError, ValueError, KeyError):
+                    print(f"Error while writing metrics to: {args.metrics}")
+            if action.timed_out:
+                return EXIT_TIMEOUT
         else:
             print("Invalid Login")
     else:
@@ -83,4 +348,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -1 +1,5 @@
-db = "users_db.db"
\ No newline at end of file
+db = "users_db.db"
+# Describes the SQLite files of a sharded database (create-database --shards)
+db_manifest = "users_db.manifest.json"
+# Milliseconds a connection waits for a lock held by another process
+busy_timeout = 5000
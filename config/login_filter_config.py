@@ -0,0 +1,3 @@
+# Share of unknown logins the login Bloom filter lets through to the lookup,
+# lower rates take more memory (about 1.2 bytes per login at 0.01)
+false_positive_rate = 0.01
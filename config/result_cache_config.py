@@ -0,0 +1,7 @@
+import os
+
+# User-private directory of cached command results
+result_cache_dir = os.path.join(os.path.expanduser("~"), ".users_cli", "results")
+# Least recently used results are deleted past either limit
+result_cache_entries = 256
+result_cache_bytes = 64 * 1024 * 1024
@@ -0,0 +1,9 @@
+import os
+
+# User-private directory holding the session token written by the login command
+session_dir = os.path.join(os.path.expanduser("~"), ".users_cli")
+session_file = os.path.join(session_dir, "session")
+# Random key signing session tokens, created on first login
+session_key_file = os.path.join(session_dir, "session.key")
+# Seconds a session token stays valid
+session_ttl = 900
@@ -0,0 +1 @@
+snapshot = "users_snapshot.bin"
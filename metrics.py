@@ -0,0 +1,184 @@
+from collections import Counter
+from contextlib import contextmanager
+import fcntl
+import json
+import math
+import os
+import re
+import stat
+import tempfile
+import time
+from typing import Iterator, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+HISTOGRAM_SUFFIXES = ["_bucket", "_sum", "_count"]
+SAMPLE_PATTERN = re.compile(r"^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})?\s+(\S+)$")
+LABEL_PATTERN = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"')
+
+
+class MetricsRegistry:
+    # Only counters and cumulative histograms, so registries of worker
+    # processes or of earlier runs are merged by adding sample values.
+    # Samples are keyed by (metric name, histogram suffix, labels).
+    def __init__(self):
+        self.types = {}
+        self.samples = Counter()
+
+    def merge(self, other: "MetricsRegistry"):
+        self.types.update(other.types)
+        self.samples.update(other.samples)
+
+    @staticmethod
+    def get_labels(labels: dict) -> Tuple[Tuple[str, str], ...]:
+        return tuple((key, str(labels[key])) for key in sorted(labels))
+
+    def inc(self, name: str, value: float = 1, **labels):
+        self.types.setdefault(name, "counter")
+        self.samples[(name, "", self.get_labels(labels))] += value
+
+    def observe(self, name: str, value: float, buckets=LATENCY_BUCKETS, **labels):
+        self.types[name] = "histogram"
+        labels = self.get_labels(labels)
+        for bound in list(buckets) + [math.inf]:
+            bucket_labels = labels + (("le", self.format_value(bound)),)
+            self.samples[(name, "_bucket", bucket_labels)] += int(value <= bound)
+        self.samples[(name, "_sum", labels)] += value
+        self.samples[(name, "_count", labels)] += 1
+
+    @contextmanager
+    def time(self, name: str, **labels) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    @staticmethod
+    def format_value(value: float) -> str:
+        if value == math.inf:
+            return "+Inf"
+        if float(value).is_integer():
+            return str(int(value))
+        return repr(float(value))
+
+    @staticmethod
+    def format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+        if not labels:
+            return ""
+        escaped_labels = ",".join(
+            f'{key}="{MetricsRegistry.escape(value)}"' for key, value in labels
+        )
+        return f"{{{escaped_labels}}}"
+
+    @staticmethod
+    def escape(value: str) -> str:
+        return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    @staticmethod
+    def unescape(value: str) -> str:
+        return re.sub(
+            r"\\(.)", lambda match: "\n" if match[1] == "n" else match[1], value
+        )
+
+    def to_prometheus(self) -> str:
+        lines = []
+        for name in sorted(self.types):
+            lines.append(f"# TYPE {name} {self.types[name]}")
+            lines.extend(
+                f"{name}{suffix}{self.format_labels(labels)} {self.format_value(value)}"
+                for (sample_name, suffix, labels), value in self.samples.items()
+                if sample_name == name
+            )
+        return "".join(f"{line}\n" for line in lines)
+
+    @classmethod
+    def from_prometheus(cls, text: str) -> "MetricsRegistry":
+        metrics = cls()
+        for line in text.splitlines():
+            if line.startswith("# TYPE "):
+                _, _, name, metric_type = line.split()
+                metrics.types[name] = metric_type
+                continue
+            match = SAMPLE_PATTERN.match(line)
+            if line.startswith("#") or match is None:
+                continue
+            name, labels, value = match.groups()
+            suffix = ""
+            for histogram_suffix in HISTOGRAM_SUFFIXES:
+                base_name = name[: -len(histogram_suffix)]
+                if (
+                    name.endswith(histogram_suffix)
+                    and metrics.types.get(base_name) == "histogram"
+                ):
+                    name, suffix = base_name, histogram_suffix
+            labels = tuple(
+                (key, cls.unescape(label_value))
+                for key, label_value in LABEL_PATTERN.findall(labels or "")
+            )
+            metrics.samples[(name, suffix, labels)] += float(value)
+        return metrics
+
+    def to_json(self) -> dict:
+        return {
+            "types": self.types,
+            "samples": [
+                {"name": name, "suffix": suffix, "labels": dict(labels), "value": value}
+                for (name, suffix, labels), value in self.samples.items()
+            ],
+        }
+
+    @classmethod
+    def from_json(cls, data: dict) -> "MetricsRegistry":
+        metrics = cls()
+        metrics.types.update(data["types"])
+        for sample in data["samples"]:
+            key = (sample["name"], sample["suffix"], tuple(sample["labels"].items()))
+            metrics.samples[key] += sample["value"]
+        return metrics
+
+    @classmethod
+    def load(cls, path: str) -> "MetricsRegistry":
+        with open(path) as file:
+            if path.endswith(".json"):
+                return cls.from_json(json.load(file))
+            return cls.from_prometheus(file.read())
+
+    def write(self, path: str):
+        # Adds metrics of this run to the ones already in the file, JSON for
+        # .json paths and Prometheus text format (textfile collector) otherwise.
+        # Runs sharing the path take turns on a lock file next to it, so no
+        # increments are lost, and each writes its own temporary file.
+        with open(f"{path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            metrics = (
+                MetricsRegistry.load(path)
+                if os.path.exists(path)
+                else MetricsRegistry()
+            )
+            metrics.merge(self)
+            file_descriptor, temporary_path = tempfile.mkstemp(
+                prefix=f"{os.path.basename(path)}.",
+                suffix=".tmp",
+                dir=os.path.dirname(path) or ".",
+            )
+            try:
+                # Readable by the collector as a file created with open would be
+                os.chmod(
+                    temporary_path,
+                    (
+                        stat.S_IMODE(os.stat(path).st_mode)
+                        if os.path.exists(path)
+                        else 0o644
+                    ),
+                )
+                with os.fdopen(file_descriptor, "w") as file:
+                    if path.endswith(".json"):
+                        json.dump(metrics.to_json(), file, indent=2)
+                        file.write("\n")
+                    else:
+                        file.write(metrics.to_prometheus())
+                os.replace(temporary_path, path)
+            except BaseException:
+                if os.path.exists(temporary_path):
+                    os.remove(temporary_path)
+                raise
@@ -0,0 +1,109 @@
+import hashlib
+import json
+import os
+from typing import Iterator, List
+from session_store import SessionStore
+from users_data_utils import DataFile
+
+
+class ResultCache:
+    # One JSON file per result, named by a hash of the dataset fingerprint and
+    # a hash of the command and its arguments, so changed data misses its old
+    # results. Hits touch the file, so mtimes order entries of every
+    # fingerprint for least recently used eviction. Files are readable by
+    # their owner only.
+    MISSING = object()
+    FILE_SUFFIX = ".json"
+
+    def __init__(
+        self, cache_dir: str, max_entries: int = 256, max_bytes: int = 64 * 1024 * 1024
+    ):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def get_hash(value) -> str:
+        return hashlib.sha256(
+            json.dumps(value, sort_keys=True, default=str).encode()
+        ).hexdigest()[:32]
+
+    @classmethod
+    def hash_files(cls, data_files: List[DataFile]) -> str:
+        # Files by path, format, size and modification time, without reading
+        # them. Sizes and mtimes found with the files are used, others are
+        # looked up here.
+        files = []
+        for data_file in data_files:
+            size, mtime_ns = data_file.size, data_file.mtime_ns
+            if not mtime_ns:
+                try:
+                    stat_result = os.stat(data_file.path)
+                except OSError:
+                    size, mtime_ns = None, None
+                else:
+                    size, mtime_ns = stat_result.st_size, stat_result.st_mtime_ns
+            files.append(
+                [
+                    os.path.abspath(data_file.path),
+                    data_file.data_format,
+                    data_file.byte_range,
+                    size,
+                    mtime_ns,
+                ]
+            )
+        return cls.get_hash(files)
+
+    def get_path(self, fingerprint: str, key) -> str:
+        return os.path.join(
+            self.cache_dir,
+            f"{self.get_hash(fingerprint)}-{self.get_hash(key)}{self.FILE_SUFFIX}",
+        )
+
+    def get(self, fingerprint: str, key):
+        # MISSING when not cached, None is a valid result
+        path = self.get_path(fingerprint, key)
+        try:
+            with open(path, "rb") as file:
+                entry = json.loads(file.read())
+            os.utime(path)
+        except (OSError, ValueError):
+            return self.MISSING
+        if not isinstance(entry, dict) or "result" not in entry:
+            return self.MISSING
+        return entry["result"]
+
+    def put(self, fingerprint: str, key, result):
+        path = self.get_path(fingerprint, key)
+        try:
+            data = json.dumps({"result": result}).encode()
+            if len(data) > self.max_bytes:
+                return
+            SessionStore.write_private_file(path, data)
+            self.evict()
+        except (OSError, TypeError, ValueError):
+            # Results are recomputed when they can't be cached
+            pass
+
+    def iter_entries(self) -> Iterator[tuple]:
+        # (mtime, size, path) of the entries
+        for directory_entry in os.scandir(self.cache_dir):
+            if not directory_entry.name.endswith(self.FILE_SUFFIX):
+                continue
+            try:
+                stat_result = directory_entry.stat()
+            except OSError:
+                continue
+            yield stat_result.st_mtime_ns, stat_result.st_size, directory_entry.path
+
+    def evict(self):
+        # Newest first, entries past either limit are deleted
+        entries = sorted(self.iter_entries(), reverse=True)
+        kept_bytes = 0
+        for number, (_, size, path) in enumerate(entries):
+            kept_bytes += size
+            if number >= self.max_entries or kept_bytes > self.max_bytes:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
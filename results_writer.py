@@ -0,0 +1,83 @@
+import csv
+import itertools
+import json
+import sys
+from typing import Callable, Iterable, List, Optional, TextIO
+
+OUTPUT_FORMATS = ["text", "json", "jsonl", "csv"]
+
+
+class ResultsWriter:
+    # Records are consumed lazily, so with limit/offset only the requested page
+    # is read from the backend. Output is joined in a buffer and written to the
+    # stream in large chunks instead of one write per result.
+    BUFFER_SIZE = 64 * 1024
+
+    def __init__(
+        self,
+        output_format: str = "text",
+        limit: Optional[int] = None,
+        offset: int = 0,
+        stream: Optional[TextIO] = None,
+    ):
+        self.output_format = output_format
+        self.limit = limit
+        self.offset = offset
+        self.stream = stream
+        self.buffer = []
+        self.buffer_size = 0
+
+    def write(self, text: str):
+        self.buffer.append(text)
+        self.buffer_size += len(text)
+        if self.buffer_size >= self.BUFFER_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            # Resolved on write, so output follows a redirected sys.stdout
+            (self.stream or sys.stdout).write("".join(self.buffer))
+            self.buffer = []
+            self.buffer_size = 0
+
+    @staticmethod
+    def to_csv_value(value):
+        # Children are written like in CSV data files: "Name (age),Name (age)"
+        if isinstance(value, list):
+            return ",".join(f"{child['name']} ({child['age']})" for child in value)
+        return value
+
+    def write_records(
+        self,
+        records: Iterable[dict],
+        columns: List[str],
+        text_format: Callable[[dict], str],
+    ) -> int:
+        stop = None if self.limit is None else self.offset + self.limit
+        records = itertools.islice(records, self.offset, stop)
+        records_count = 0
+        if self.output_format == "csv":
+            csv_writer = csv.writer(self, delimiter=";", lineterminator="\n")
+            csv_writer.writerow(columns)
+        elif self.output_format == "json":
+            self.write("[")
+        try:
+            for record in records:
+                record = {column: record.get(column) for column in columns}
+                if self.output_format == "text":
+                    self.write(f"{text_format(record)}\n")
+                elif self.output_format == "jsonl":
+                    self.write(f"{json.dumps(record)}\n")
+                elif self.output_format == "json":
+                    self.write(f"{',' if records_count else ''}\n{json.dumps(record)}")
+                else:
+                    csv_writer.writerow(
+                        [self.to_csv_value(record[column]) for column in columns]
+                    )
+                records_count += 1
+        finally:
+            # Records written before an interrupted query stay valid output
+            if self.output_format == "json":
+                self.write("\n]\n" if records_count else "]\n")
+            self.flush()
+        return records_count
@@ -0,0 +1,106 @@
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import time
+from typing import List, NamedTuple, Optional
+
+
+class Session(NamedTuple):
+    login: str
+    role: str
+    expires_at: int
+    dataset_version: str
+
+
+class SessionStore:
+    # Token: base64 of the JSON session, a dot and its HMAC-SHA256 hex digest.
+    # Checking a token reads two small files and computes one HMAC, users data
+    # is not touched. Files are created readable by their owner only.
+    KEY_SIZE = 32
+
+    def __init__(self, session_path: str, key_path: str, ttl: int = 900):
+        self.session_path = session_path
+        self.key_path = key_path
+        self.ttl = ttl
+
+    @staticmethod
+    def get_dataset_version(paths: List[str]) -> str:
+        # Changes when any existing file is replaced or modified
+        dataset_hash = hashlib.sha256()
+        for path in paths:
+            try:
+                stat_result = os.stat(path)
+            except OSError:
+                continue
+            dataset_hash.update(
+                f"{os.path.abspath(path)}:{stat_result.st_size}:"
+                f"{stat_result.st_mtime_ns}\n".encode()
+            )
+        return dataset_hash.hexdigest()[:16]
+
+    @staticmethod
+    def write_private_file(path: str, data: bytes):
+        os.makedirs(os.path.dirname(path) or ".", mode=0o700, exist_ok=True)
+        temp_path = f"{path}.tmp"
+        file_descriptor = os.open(
+            temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600
+        )
+        with os.fdopen(file_descriptor, "wb") as file:
+            file.write(data)
+        os.replace(temp_path, path)
+
+    def get_key(self, create: bool = False) -> Optional[bytes]:
+        try:
+            with open(self.key_path, "rb") as file:
+                key = file.read()
+        except FileNotFoundError:
+            key = b""
+        if len(key) == self.KEY_SIZE:
+            return key
+        if not create:
+            return None
+        key = secrets.token_bytes(self.KEY_SIZE)
+        self.write_private_file(self.key_path, key)
+        return key
+
+    @staticmethod
+    def sign(key: bytes, payload: bytes) -> str:
+        return hmac.new(key, payload, hashlib.sha256).hexdigest()
+
+    def create(self, login: str, role: str, dataset_version: str) -> Session:
+        session = Session(login, role, int(time.time()) + self.ttl, dataset_version)
+        payload = base64.urlsafe_b64encode(json.dumps(session._asdict()).encode())
+        token = payload + b"." + self.sign(self.get_key(create=True), payload).encode()
+        self.write_private_file(self.session_path, token)
+        return session
+
+    def load(self, dataset_version: str) -> Optional[Session]:
+        key = self.get_key()
+        try:
+            with open(self.session_path, "rb") as file:
+                payload, signature = file.read().strip().split(b".")
+        except (OSError, ValueError):
+            return None
+        if key is None or not hmac.compare_digest(
+            self.sign(key, payload).encode(), signature
+        ):
+            return None
+        try:
+            session = Session(**json.loads(base64.urlsafe_b64decode(payload)))
+        except (binascii.Error, ValueError, TypeError):
+            return None
+        if session.expires_at <= time.time():
+            return None
+        if not hmac.compare_digest(session.dataset_version, dataset_version):
+            return None
+        return session
+
+    def delete(self):
+        try:
+            os.remove(self.session_path)
+        except FileNotFoundError:
+            pass
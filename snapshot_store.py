@@ -0,0 +1,329 @@
+import json
+import mmap
+import os
+import struct
+from collections import Counter
+from typing import Iterator, List, Optional
+import numpy as np
+from pandas import DataFrame
+from users_data_index import LoginsBloomFilter, get_children_ages_signature
+
+
+class SnapshotError(Exception):
+    pass
+
+
+class UsersSnapshot:
+    # Layout: header (magic, version, directory length), JSON directory of
+    # sections, then 8-byte aligned sections. Numeric sections are fixed-width
+    # little-endian arrays, string columns are offsets array plus UTF-8 data.
+    # Sections are numpy views on the mmap, nothing is copied on open.
+    MAGIC = b"UDSNAP"
+    VERSION = 1
+    HEADER = struct.Struct("<6sHQ")
+    ALIGNMENT = 8
+    STRING_COLUMNS = [
+        "firstname",
+        "email",
+        "telephone_number",
+        "password",
+        "role",
+        "created_at",
+    ]
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as file:
+            self.mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            # Snapshots are replaced whole, never modified in place
+            stat_result = os.fstat(file.fileno())
+        self.version = (
+            f"{stat_result.st_ino}:{stat_result.st_size}:{stat_result.st_mtime_ns}"
+        )
+        try:
+            magic, version, directory_length = self.HEADER.unpack_from(self.mmap, 0)
+        except struct.error:
+            self.close()
+            raise SnapshotError(f"Invalid snapshot file: {path}")
+        if magic != self.MAGIC or version != self.VERSION:
+            self.close()
+            raise SnapshotError(f"Unsupported snapshot file or version: {path}")
+        directory = json.loads(
+            self.mmap[self.HEADER.size : self.HEADER.size + directory_length]
+        )
+        self.users_count = directory["users_count"]
+        self.children_count = directory["children_count"]
+        self.login_filter_hashes = directory.get("login_filter_hashes")
+        # Version of the data files it was built from, None for old snapshots
+        self.source_version = directory.get("source_version")
+        self.sections = {
+            name: np.frombuffer(
+                self.mmap, dtype=dtype, count=count, offset=section_offset
+            )
+            for name, (section_offset, dtype, count) in directory["sections"].items()
+        }
+
+    def __len__(self) -> int:
+        return self.users_count
+
+    def close(self):
+        self.sections = {}
+        self.mmap.close()
+
+    @staticmethod
+    def encode_strings(values: List[str]) -> tuple:
+        encoded_values = [str(value).encode() for value in values]
+        offsets = np.zeros(len(encoded_values) + 1, dtype="<u8")
+        np.cumsum([len(value) for value in encoded_values], out=offsets[1:])
+        return offsets, np.frombuffer(b"".join(encoded_values), dtype="u1")
+
+    @classmethod
+    def build(
+        cls,
+        users_data: DataFrame,
+        path: str,
+        false_positive_rate: float = LoginsBloomFilter.FALSE_POSITIVE_RATE,
+        source_version: Optional[str] = None,
+    ):
+        users = users_data.to_dict(orient="records")
+        sections = {}
+        login_filter = LoginsBloomFilter.from_logins(
+            (
+                user[column]
+                for user in users
+                for column in ["email", "telephone_number"]
+            ),
+            false_positive_rate,
+        )
+        sections["login_filter"] = login_filter.bits
+        for column in cls.STRING_COLUMNS:
+            values = [user[column] for user in users]
+            sections[f"{column}_offsets"], sections[f"{column}_data"] = (
+                cls.encode_strings(values)
+            )
+            # User ids ordered by column value, for binary search lookups
+            if column in ["email", "telephone_number", "created_at"]:
+                sections[f"{column}_order"] = np.array(
+                    sorted(range(len(values)), key=values.__getitem__), dtype="<u4"
+                )
+
+        children = [
+            (user_id, child["name"], child["age"])
+            for user_id, user in enumerate(users)
+            if isinstance(user.get("children"), list)
+            for child in user["children"]
+            if isinstance(child["age"], int)
+        ]
+        children_per_user = np.bincount(
+            np.array([child[0] for child in children], dtype=np.int64),
+            minlength=len(users),
+        )
+        sections["children_offsets"] = np.zeros(len(users) + 1, dtype="<u8")
+        np.cumsum(children_per_user, out=sections["children_offsets"][1:])
+        sections["child_name_offsets"], sections["child_name_data"] = (
+            cls.encode_strings([child[1] for child in children])
+        )
+        child_ages = np.array([child[2] for child in children], dtype="<i4")
+        sections["child_age"] = child_ages
+        age_order = np.argsort(child_ages, kind="stable")
+        sections["age_sorted_ages"] = child_ages[age_order]
+        sections["age_sorted_parents"] = np.array(
+            [child[0] for child in children], dtype="<u4"
+        )[age_order]
+        # User ids ordered by canonical children ages signature, for exact
+        # profile lookups
+        children_offsets = sections["children_offsets"].astype(np.int64)
+        signatures = [
+            get_children_ages_signature(child_ages[start:stop])
+            for start, stop in zip(children_offsets[:-1], children_offsets[1:])
+        ]
+        sections["children_signature_offsets"], sections["children_signature_data"] = (
+            cls.encode_strings(signatures)
+        )
+        sections["children_signature_order"] = np.array(
+            sorted(range(len(signatures)), key=signatures.__getitem__), dtype="<u4"
+        )
+        histogram_ages, histogram_counts = np.unique(child_ages, return_counts=True)
+        sections["age_histogram_ages"] = histogram_ages.astype("<i4")
+        sections["age_histogram_counts"] = histogram_counts.astype("<u8")
+
+        cls.write_sections(
+            path,
+            sections,
+            {
+                "users_count": len(users),
+                "children_count": len(children),
+                "login_filter_hashes": login_filter.hashes_count,
+                "source_version": source_version,
+            },
+        )
+
+    @classmethod
+    def write_sections(cls, path: str, sections: dict, metadata: dict):
+        directory = {**metadata, "sections": {}}
+        # Offsets depend on directory length, so size the directory first
+        directory_length = 0
+        while True:
+            offset = cls.align(cls.HEADER.size + directory_length)
+            for name, array in sections.items():
+                directory["sections"][name] = [offset, array.dtype.str, len(array)]
+                offset = cls.align(offset + array.nbytes)
+            encoded_directory = json.dumps(directory).encode()
+            if len(encoded_directory) <= directory_length:
+                break
+            directory_length = len(encoded_directory)
+        encoded_directory = encoded_directory.ljust(directory_length)
+
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, "wb") as file:
+            file.write(cls.HEADER.pack(cls.MAGIC, cls.VERSION, directory_length))
+            file.write(encoded_directory)
+            for name, array in sections.items():
+                file.seek(directory["sections"][name][0])
+                file.write(array.tobytes())
+            file.truncate(cls.align(file.tell()))
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def align(cls, offset: int) -> int:
+        return -(-offset // cls.ALIGNMENT) * cls.ALIGNMENT
+
+    def get_string(self, column: str, user_id: int) -> str:
+        offsets = self.sections[f"{column}_offsets"]
+        return bytes(
+            self.sections[f"{column}_data"][offsets[user_id] : offsets[user_id + 1]]
+        ).decode()
+
+    def get_user(self, user_id: int, columns: Optional[List[str]] = None) -> dict:
+        user = {
+            column: self.get_string(column, user_id)
+            for column in (columns or self.STRING_COLUMNS)
+            if column != "children"
+        }
+        if columns is None or "children" in columns:
+            user["children"] = self.get_children(user_id)
+        return user
+
+    def get_children(self, user_id: int) -> List[dict]:
+        offsets = self.sections["children_offsets"]
+        name_offsets = self.sections["child_name_offsets"]
+        names = self.sections["child_name_data"]
+        ages = self.sections["child_age"]
+        return [
+            {
+                "name": bytes(
+                    names[name_offsets[child_id] : name_offsets[child_id + 1]]
+                ).decode(),
+                "age": int(ages[child_id]),
+            }
+            for child_id in range(offsets[user_id], offsets[user_id + 1])
+        ]
+
+    def bisect_column(self, column: str, value: str, right: bool = False) -> int:
+        order = self.sections[f"{column}_order"]
+        low, high = 0, len(order)
+        while low < high:
+            middle = (low + high) // 2
+            middle_value = self.get_string(column, int(order[middle]))
+            if middle_value < value or (right and middle_value == value):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def find_user_ids(self, column: str, value: str) -> List[int]:
+        order = self.sections[f"{column}_order"]
+        start = self.bisect_column(column, value)
+        stop = self.bisect_column(column, value, right=True)
+        return [int(user_id) for user_id in order[start:stop]]
+
+    def might_have_login(self, login: str) -> bool:
+        # Snapshots built before the login filter look up every login
+        if self.login_filter_hashes is None:
+            return True
+        return login in LoginsBloomFilter(
+            self.sections["login_filter"], self.login_filter_hashes
+        )
+
+    def find_user_by_login(self, login: str, password: Optional[str]) -> Optional[int]:
+        for column in ["email", "telephone_number"]:
+            for user_id in self.find_user_ids(column, login):
+                if password is None or self.get_string("password", user_id) == password:
+                    return user_id
+        return None
+
+    def get_oldest_user_id(self) -> Optional[int]:
+        if not self.users_count:
+            return None
+        return int(self.sections["created_at_order"][0])
+
+    def iter_created_between(
+        self, since: str, until: str, page_size: int = 1000
+    ) -> Iterator[List[int]]:
+        order = self.sections["created_at_order"]
+        start = self.bisect_column("created_at", since)
+        stop = max(start, self.bisect_column("created_at", until, right=True))
+        for page_start in range(start, stop, page_size):
+            yield [
+                int(user_id)
+                for user_id in order[page_start : min(page_start + page_size, stop)]
+            ]
+
+    def find_users_with_children_of_age(self, ages: List[int]) -> List[int]:
+        sorted_ages = self.sections["age_sorted_ages"]
+        parents = self.sections["age_sorted_parents"]
+        matching_parents = [
+            parents[
+                np.searchsorted(sorted_ages, age, side="left") : np.searchsorted(
+                    sorted_ages, age, side="right"
+                )
+            ]
+            for age in set(ages)
+        ]
+        if not matching_parents:
+            return []
+        return [int(user_id) for user_id in np.unique(np.concatenate(matching_parents))]
+
+    def find_users_with_children_ages(
+        self, ages: List[int], superset: bool = False
+    ) -> List[int]:
+        if not ages:
+            return []
+        # Snapshots built before the signatures match exact profiles by postings
+        if not superset and "children_signature_order" in self.sections:
+            return sorted(
+                self.find_user_ids(
+                    "children_signature", get_children_ages_signature(ages)
+                )
+            )
+        sorted_ages = self.sections["age_sorted_ages"]
+        parents = self.sections["age_sorted_parents"]
+        user_ids = None
+        for age, count in Counter(ages).items():
+            parent_ids, children_counts = np.unique(
+                parents[
+                    np.searchsorted(sorted_ages, age, side="left") : np.searchsorted(
+                        sorted_ages, age, side="right"
+                    )
+                ],
+                return_counts=True,
+            )
+            parent_ids = parent_ids[children_counts >= count]
+            user_ids = (
+                parent_ids if user_ids is None else np.intersect1d(user_ids, parent_ids)
+            )
+        if not superset:
+            children_counts = np.diff(
+                self.sections["children_offsets"].astype(np.int64)
+            )
+            user_ids = user_ids[children_counts[user_ids] == len(ages)]
+        return [int(user_id) for user_id in user_ids]
+
+    def get_children_ages_histogram(self) -> List[tuple]:
+        return [
+            (int(age), int(count))
+            for age, count in zip(
+                self.sections["age_histogram_ages"],
+                self.sections["age_histogram_counts"],
+            )
+        ]
@@ -1,4 +1,5 @@
 from users_data_processor import process_users_data
+from users_backends import InMemoryUsersBackend
 import os
 
 paths = [
@@ -6,3 +7,4 @@ paths = [
     for path in ["final_test_data.csv"]
 ]
 test_final_users_data = process_users_data(paths)
+test_users_backend = InMemoryUsersBackend(test_final_users_data)
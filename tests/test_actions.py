@@ -1,10 +1,33 @@
+import io
+import json
+import os
+import tempfile
 import unittest
+import actions
 from actions import Actions
-from tests.data.users_test_data_processor import test_final_users_data
+from metrics import MetricsRegistry
+from result_cache import ResultCache
+from results_writer import ResultsWriter
+from session_store import SessionStore
+from snapshot_store import UsersSnapshot
+from users_data_processor import UsersDataOptions
+from users_data_utils import DataFile
+from users_backends import (
+    InMemoryUsersBackend,
+    ShardedSqliteUsersBackend,
+    SnapshotUsersBackend,
+    SqliteUsersBackend,
+)
+from tests.data.users_test_data_processor import (
+    paths as test_paths,
+    test_final_users_data,
+    test_users_backend,
+)
 from unittest.mock import patch, call
 
 
-@patch("actions.final_users_data", test_final_users_data)
+@patch("actions.load_final_users_data", lambda *args: test_final_users_data)
+@patch("actions.load_users_backend", lambda *args: test_users_backend)
 class TestActions(unittest.TestCase):
 
     # To test TestActions with db, uncomment below func.
@@ -58,12 +81,12 @@ class TestActions(unittest.TestCase):
         action_base.print_all_accounts()
         mock_print.assert_called_with("Invalid Login")
 
-    @patch("builtins.print")
-    def test_print_all_accounts_admin(self, mock_print):
+    @patch("sys.stdout", new_callable=io.StringIO)
+    def test_print_all_accounts_admin(self, mock_stdout):
         # Test case: Admin
         action_admin = Actions(login="222222222", password="7GRMc-fg42")
         action_admin.print_all_accounts()
-        mock_print.assert_called_with(10)
+        self.assertEqual(mock_stdout.getvalue(), "10\n")
 
     @patch("builtins.print")
     def test_print_all_accounts_unauthenticated_user(self, mock_print):
@@ -79,13 +102,14 @@ class TestActions(unittest.TestCase):
         action_base.print_oldest_account()
         mock_print.assert_called_with("Invalid Login")
 
-    @patch("builtins.print")
-    def test_print_oldest_account_admin(self, mock_print):
+    @patch("sys.stdout", new_callable=io.StringIO)
+    def test_print_oldest_account_admin(self, mock_stdout):
         # Test case: Admin
         action_admin = Actions(login="222222222", password="7GRMc-fg42")
         action_admin.print_oldest_account()
-        mock_print.assert_called_with(
-            "name: Test1\nemail_address: test1@example.com\ncreated_at: 2010-01-21 21:21:01"
+        self.assertEqual(
+            mock_stdout.getvalue(),
+            "name: Test1\nemail_address: test1@example.com\ncreated_at: 2010-01-21 21:21:01\n",
         )
 
     @patch("builtins.print")
@@ -95,19 +119,19 @@ class TestActions(unittest.TestCase):
         action_base.group_children_by_age()
         mock_print.assert_called_with("Invalid Login")
 
-    @patch("builtins.print")
-    def test_group_by_age_admin(self, mock_print):
+    @patch("sys.stdout", new_callable=io.StringIO)
+    def test_group_by_age_admin(self, mock_stdout):
         # Test case: Admin
         action_admin = Actions(login="222222222", password="7GRMc-fg42")
         action_admin.group_children_by_age()
-        expected_calls = [
-            call("age: 3, count: 2"),
-            call("age: 14, count: 2"),
-            call("age: 6, count: 3"),
-            call("age: 9, count: 3"),
-            call("age: 1, count: 4"),
+        expected_lines = [
+            "age: 3, count: 2",
+            "age: 14, count: 2",
+            "age: 6, count: 3",
+            "age: 9, count: 3",
+            "age: 1, count: 4",
         ]
-        mock_print.assert_has_calls(expected_calls)
+        self.assertEqual(mock_stdout.getvalue().splitlines(), expected_lines)
 
     @patch("builtins.print")
     def test_print_children_no_children(self, mock_print):
@@ -116,37 +140,276 @@ class TestActions(unittest.TestCase):
         action.print_children()
         mock_print.assert_called_with("User with login: 666666666 has no children.")
 
-    @patch("builtins.print")
-    def test_print_children_one_child(self, mock_print):
+    @patch("sys.stdout", new_callable=io.StringIO)
+    def test_print_children_one_child(self, mock_stdout):
         # Test case, base user one child: Adam (1)
         action = Actions(login="111111111", password="Wm&fkw9bI8")
         action.print_children()
-        mock_print.assert_called_with("Adam, 1")
+        self.assertEqual(mock_stdout.getvalue(), "Adam, 1\n")
 
-    @patch("builtins.print")
-    def test_print_children_three_children(self, mock_print):
+    @patch("sys.stdout", new_callable=io.StringIO)
+    def test_print_children_three_children(self, mock_stdout):
         # Test case, base user three children: Robert (14),Alex (6),Harry (9)
         action = Actions(login="888888888", password="dQbafj:B:&")
         action.print_children()
-        expected_calls = [call("Alex, 6"), call("Harry, 9"), call("Robert, 14")]
-        mock_print.assert_has_calls(expected_calls)
-        total_calls = mock_print.call_count
-        self.assertEqual(total_calls, 3)
+        expected_lines = ["Alex, 6", "Harry, 9", "Robert, 14"]
+        self.assertEqual(mock_stdout.getvalue().splitlines(), expected_lines)
 
-    @patch("builtins.print")
-    def test_find_similar_children_by_age(self, mock_print):
+    @patch("sys.stdout", new_callable=io.StringIO)
+    def test_find_similar_children_by_age(self, mock_stdout):
         # Test case: base user three children: Robert (14),Alex (6),Harry (9)
         action = Actions(login="888888888", password="dQbafj:B:&")
         action.find_similar_children_by_age()
-        expected_calls = [
-            call("Test5, 555555555: Hellen, 1; Peter, 6"),
-            call("Test7, 777777777: John, 6; Marie, 1"),
-            call("Test9, 999999999: Nicolas, 9"),
-            call("Test10, 123123123: Adam, 14; Victoria, 9"),
+        expected_lines = [
+            "Test5, 555555555: Hellen, 1; Peter, 6",
+            "Test7, 777777777: John, 6; Marie, 1",
+            "Test9, 999999999: Nicolas, 9",
+            "Test10, 123123123: Adam, 14; Victoria, 9",
+        ]
+        self.assertCountEqual(mock_stdout.getvalue().splitlines(), expected_lines)
+
+    def test_find_similar_children_by_age_page(self):
+        # Test case: page of similar users, in the same order as all results
+        action = Actions(login="888888888", password="dQbafj:B:&")
+        all_users = io.StringIO()
+        action.output = ResultsWriter(stream=all_users)
+        action.find_similar_children_by_age()
+        page = io.StringIO()
+        action.output = ResultsWriter(limit=2, offset=1, stream=page)
+        action.find_similar_children_by_age()
+        self.assertEqual(
+            page.getvalue().splitlines(), all_users.getvalue().splitlines()[1:3]
+        )
+
+    def test_find_similar_children_by_age_json(self):
+        action = Actions(login="888888888", password="dQbafj:B:&")
+        output = io.StringIO()
+        action.output = ResultsWriter("json", stream=output)
+        action.find_similar_children_by_age()
+        similar_users = json.loads(output.getvalue())
+        self.assertEqual(len(similar_users), 4)
+        self.assertIn(
+            {
+                "firstname": "Test9",
+                "telephone_number": "999999999",
+                "email": "test9@example.com",
+                "children": [{"name": "Nicolas", "age": 9}],
+            },
+            similar_users,
+        )
+
+    @patch("sys.stdout", new_callable=io.StringIO)
+    def test_find_matching_families(self, mock_stdout):
+        # Test case: same children ages in another order, without the user
+        action = Actions(login="777777777", password="O*PlE8J<Bs")
+        action.find_matching_families()
+        self.assertEqual(
+            mock_stdout.getvalue().splitlines(),
+            ["Test5, 555555555: Hellen, 1; Peter, 6"],
+        )
+
+        # Test case: users with at least the children ages
+        action = Actions(login="111111111", password="Wm&fkw9bI8")
+        output = io.StringIO()
+        action.output = ResultsWriter("jsonl", stream=output)
+        action.find_matching_families()
+        self.assertEqual(output.getvalue(), "")
+        action.find_matching_families("superset")
+        self.assertEqual(
+            [json.loads(line)["firstname"] for line in output.getvalue().splitlines()],
+            ["Test7", "Test5", "Test4"],
+        )
+
+    @patch("builtins.print")
+    def test_find_matching_families_no_children(self, mock_print):
+        action = Actions(login="666666666", password="GcUF~F(<Xx")
+        action.find_matching_families()
+        mock_print.assert_called_with("User with login: 666666666 has no children.")
+
+    def test_print_children_csv(self):
+        action = Actions(login="888888888", password="dQbafj:B:&")
+        output = io.StringIO()
+        action.output = ResultsWriter("csv", stream=output)
+        action.print_children()
+        self.assertEqual(output.getvalue(), "name;age\nAlex;6\nHarry;9\nRobert;14\n")
+
+        # Test case: user without children, only header is written
+        action = Actions(login="666666666", password="GcUF~F(<Xx")
+        output = io.StringIO()
+        action.output = ResultsWriter("csv", stream=output)
+        action.print_children()
+        self.assertEqual(output.getvalue(), "name;age\n")
+
+    @patch("builtins.print")
+    def test_print_accounts_created_base_user(self, mock_print):
+        # Test case: Base user
+        action_base = Actions(login="111111111", password="Wm&fkw9bI8")
+        action_base.print_accounts_created("2010-01-01 00:00:00", "2030-01-01 00:00:00")
+        mock_print.assert_called_with("Invalid Login")
+
+    @patch("builtins.print")
+    def test_search_users(self, mock_print):
+        action_admin = Actions(login="222222222", password="7GRMc-fg42")
+        output = io.StringIO()
+        action_admin.output = ResultsWriter(stream=output)
+        action_admin.search_users("test1")
+        self.assertEqual(
+            output.getvalue().splitlines(),
+            [
+                "Test1, test1@example.com, 111111111, user",
+                "Test10, test10@example.com, 123123123, user",
+            ],
+        )
+
+        # Test case: page of the ranked results
+        output = io.StringIO()
+        action_admin.output = ResultsWriter(limit=2, offset=1, stream=output)
+        action_admin.search_users("test")
+        self.assertEqual(
+            output.getvalue().splitlines(),
+            [
+                "Test8, test8@example.com, 888888888, user",
+                "Test7, test7@example.com, 777777777, admin",
+            ],
+        )
+
+        # Test case: no matching users
+        action_admin.search_users("nobody")
+        mock_print.assert_called_with("Not found users matching search query.")
+
+        # Test case: user without admin role
+        Actions(login="888888888", password="dQbafj:B:&").search_users("test1")
+        mock_print.assert_called_with("Invalid Login")
+
+    @patch("builtins.print")
+    def test_export_users_data(self, mock_print):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "users.jsonl")
+            action_admin = Actions(login="222222222", password="7GRMc-fg42")
+            action_admin.export_users_data(path, "jsonl", ["email"])
+            mock_print.assert_called_with(f"Exported 10 users to: {path}")
+            with open(path) as file:
+                self.assertEqual(
+                    json.loads(file.readline()), {"email": "test10@example.com"}
+                )
+
+            # Test case: compressed SQLite export
+            action_admin.export_users_data(f"{path}.gz", "sqlite")
+            mock_print.assert_called_with(
+                f"Error while exporting users data to: {path}.gz"
+            )
+
+            # Test case: user without admin role
+            Actions(login="888888888", password="dQbafj:B:&").export_users_data(
+                path, "csv"
+            )
+            mock_print.assert_called_with("Invalid Login")
+
+    @patch("sys.stderr", new_callable=io.StringIO)
+    def test_search_users_timeout(self, mock_stderr):
+        action_admin = Actions(login="222222222", password="7GRMc-fg42", timeout=60)
+        output = io.StringIO()
+        action_admin.output = ResultsWriter("json", stream=output)
+        search_users = action_admin.backend.search_users
+
+        def expiring_search_users(query, limit):
+            for number, user in enumerate(search_users(query, limit)):
+                if number == 2:
+                    action_admin.deadline.expires_at = 0
+                yield user
+
+        with patch.object(action_admin.backend, "search_users", expiring_search_users):
+            action_admin.search_users("test")
+        # Test case: results found until the deadline are valid JSON
+        self.assertEqual(
+            [user["firstname"] for user in json.loads(output.getvalue())],
+            ["Test9", "Test8", "Test7"],
+        )
+        self.assertTrue(action_admin.timed_out)
+        self.assertEqual(
+            mock_stderr.getvalue(),
+            "Time budget of 60 s expired, results are partial.\n",
+        )
+        self.assertIs(action_admin.backend.deadline, None)
+
+    def test_timeout_not_expired(self):
+        action_admin = Actions(login="222222222", password="7GRMc-fg42", timeout=60)
+        output = io.StringIO()
+        action_admin.output = ResultsWriter(stream=output)
+        action_admin.print_all_accounts()
+        self.assertEqual(output.getvalue(), "10\n")
+        self.assertFalse(action_admin.timed_out)
+
+    @patch("sys.stdout", new_callable=io.StringIO)
+    def test_print_accounts_created_admin(self, mock_stdout):
+        # Test case: Admin, range with bounds equal to created_at of accounts
+        action_admin = Actions(login="222222222", password="7GRMc-fg42")
+        action_admin.print_accounts_created(
+            "2011-03-18 05:21:11", "2014-03-21 01:21:01"
+        )
+        expected_lines = [
+            "2011-03-18 05:21:11, Test2, test2@example.com, admin",
+            "2012-01-21 21:21:01, Test3, test3@example.com, admin",
+            "2013-02-21 11:21:01, Test4, test4@example.com, user",
+            "2014-03-21 01:21:01, Test5, test5@example.com, admin",
         ]
-        mock_print.assert_has_calls(expected_calls, any_order=True)
-        total_calls = mock_print.call_count
-        self.assertEqual(total_calls, 4)
+        self.assertEqual(mock_stdout.getvalue().splitlines(), expected_lines)
+
+    @patch("sys.stdout", new_callable=io.StringIO)
+    def test_print_accounts_created_admin_with_role(self, mock_stdout):
+        # Test case: Admin, range filtered by role
+        action_admin = Actions(login="222222222", password="7GRMc-fg42")
+        action_admin.print_accounts_created(
+            "2011-03-18 05:21:11", "2014-03-21 01:21:01", "user"
+        )
+        self.assertEqual(
+            mock_stdout.getvalue(),
+            "2013-02-21 11:21:01, Test4, test4@example.com, user\n",
+        )
+
+    def test_print_accounts_created_jsonl(self):
+        # Test case: one JSON object per line, password not included
+        action_admin = Actions(login="222222222", password="7GRMc-fg42")
+        output = io.StringIO()
+        action_admin.output = ResultsWriter("jsonl", stream=output)
+        action_admin.print_accounts_created(
+            "2011-03-18 05:21:11", "2012-01-21 21:21:01"
+        )
+        self.assertEqual(
+            [json.loads(line) for line in output.getvalue().splitlines()],
+            [
+                {
+                    "created_at": "2011-03-18 05:21:11",
+                    "firstname": "Test2",
+                    "email": "test2@example.com",
+                    "role": "admin",
+                },
+                {
+                    "created_at": "2012-01-21 21:21:01",
+                    "firstname": "Test3",
+                    "email": "test3@example.com",
+                    "role": "admin",
+                },
+            ],
+        )
+
+    def test_print_accounts_created_json_empty_range(self):
+        action_admin = Actions(login="222222222", password="7GRMc-fg42")
+        output = io.StringIO()
+        action_admin.output = ResultsWriter("json", stream=output)
+        action_admin.print_accounts_created(
+            "2000-01-01 00:00:00", "2001-01-01 00:00:00"
+        )
+        self.assertEqual(json.loads(output.getvalue()), [])
+
+    @patch("builtins.print")
+    def test_print_accounts_created_admin_empty_range(self, mock_print):
+        # Test case: Admin, no accounts created in range
+        action_admin = Actions(login="222222222", password="7GRMc-fg42")
+        action_admin.print_accounts_created(
+            "2000-01-01 00:00:00", "2001-01-01 00:00:00"
+        )
+        mock_print.assert_called_with("Not found accounts created in given time range.")
 
     def test_get_data_of_user_children(self):
         # Test case: base user three children: Robert (14),Alex (6),Harry (9)
@@ -167,5 +430,482 @@ class TestActions(unittest.TestCase):
         self.assertEqual(action_admin.get_role_of_logged_user(), "admin")
 
 
+@patch("actions.load_final_users_data", lambda *args: test_final_users_data)
+@patch("actions.load_users_backend", lambda *args: test_users_backend)
+class TestActionsSnapshot(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.snapshot_path = os.path.join(cls.directory.name, "users_snapshot.bin")
+        UsersSnapshot.build(
+            test_final_users_data,
+            cls.snapshot_path,
+            source_version=SessionStore.get_dataset_version(test_paths),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def setUp(self):
+        for name, value in [("snapshot", self.snapshot_path), ("paths", test_paths)]:
+            patcher = patch(f"actions.{name}", value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @patch("builtins.print")
+    def test_build_snapshot(self, mock_print):
+        snapshot_path = os.path.join(self.directory.name, "built_snapshot.bin")
+        with patch("actions.snapshot", snapshot_path):
+            Actions(login="222222222", password="7GRMc-fg42").build_snapshot()
+            mock_print.assert_called_with("Snapshot created.")
+            users_snapshot = Actions.open_snapshot(snapshot_path)
+            self.assertEqual(len(users_snapshot), 10)
+            self.assertEqual(
+                users_snapshot.source_version,
+                SessionStore.get_dataset_version(test_paths),
+            )
+            users_snapshot.close()
+
+        # Test case: user without admin role
+        Actions(login="888888888", password="dQbafj:B:&").build_snapshot()
+        mock_print.assert_called_with("Invalid Login")
+
+    @patch("actions.load_users_backend", lambda *args: test_users_backend)
+    @patch("builtins.print")
+    def test_snapshot_of_other_data_files(self, mock_print):
+        # Test case: other data files are loaded instead of the snapshot
+        action_admin = Actions(
+            login="222222222",
+            password="7GRMc-fg42",
+            data_options=UsersDataOptions(
+                data_files=(DataFile("./data/test_data.csv", "csv"),)
+            ),
+        )
+        self.assertEqual(action_admin.backend_name, "file")
+        mock_print.assert_called_with(
+            "Snapshot was built from other users data files, using the data files."
+        )
+
+        # Test case: snapshot built before its source version was stored
+        snapshot_path = os.path.join(self.directory.name, "old_snapshot.bin")
+        UsersSnapshot.build(test_final_users_data, snapshot_path)
+        with patch("actions.snapshot", snapshot_path):
+            action_admin = Actions(login="222222222", password="7GRMc-fg42")
+        self.assertEqual(action_admin.backend_name, "file")
+
+    def test_authenticate_user(self):
+        action_admin = Actions(login="test2@example.com", password="7GRMc-fg42")
+        self.assertIsInstance(action_admin.backend, SnapshotUsersBackend)
+        self.assertEqual(action_admin.role, "admin")
+        self.assertTrue(action_admin.authenticated_user)
+
+        invalid_pass = Actions(login="111111111", password="Wm&fkw9bI88")
+        self.assertFalse(invalid_pass.authenticated_user)
+
+    @patch("sys.stdout", new_callable=io.StringIO)
+    def test_admin_commands(self, mock_stdout):
+        action_admin = Actions(login="222222222", password="7GRMc-fg42")
+        action_admin.print_all_accounts()
+        action_admin.print_oldest_account()
+        action_admin.group_children_by_age()
+        action_admin.print_accounts_created(
+            "2011-03-18 05:21:11", "2014-03-21 01:21:01", "user"
+        )
+        self.assertEqual(
+            mock_stdout.getvalue().splitlines(),
+            [
+                "10",
+                "name: Test1",
+                "email_address: test1@example.com",
+                "created_at: 2010-01-21 21:21:01",
+                "age: 3, count: 2",
+                "age: 14, count: 2",
+                "age: 6, count: 3",
+                "age: 9, count: 3",
+                "age: 1, count: 4",
+                "2013-02-21 11:21:01, Test4, test4@example.com, user",
+            ],
+        )
+
+    @patch("sys.stdout", new_callable=io.StringIO)
+    def test_children_commands(self, mock_stdout):
+        action = Actions(login="888888888", password="dQbafj:B:&")
+        action.print_children()
+        self.assertEqual(
+            mock_stdout.getvalue().splitlines(), ["Alex, 6", "Harry, 9", "Robert, 14"]
+        )
+        mock_stdout.truncate(0)
+        mock_stdout.seek(0)
+        action.find_similar_children_by_age()
+        self.assertCountEqual(
+            mock_stdout.getvalue().splitlines(),
+            [
+                "Test5, 555555555: Hellen, 1; Peter, 6",
+                "Test7, 777777777: John, 6; Marie, 1",
+                "Test9, 999999999: Nicolas, 9",
+                "Test10, 123123123: Adam, 14; Victoria, 9",
+            ],
+        )
+
+
+@patch("actions.load_final_users_data", lambda *args: test_final_users_data)
+@patch("actions.load_users_backend", lambda *args: test_users_backend)
+class TestActionsDatabase(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        for name, file_name in [
+            ("db", "users_db.db"),
+            ("db_manifest", "users_db.manifest.json"),
+            ("snapshot", "users_snapshot.bin"),
+        ]:
+            patcher = patch(f"actions.{name}", os.path.join(directory.name, file_name))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        # Database is loaded from the data files of the test users
+        paths_patcher = patch("actions.paths", test_paths)
+        paths_patcher.start()
+        self.addCleanup(paths_patcher.stop)
+
+    @patch("builtins.print")
+    def test_check_database(self, mock_print):
+        action_admin = Actions(login="222222222", password="7GRMc-fg42")
+        action_admin.check_database()
+        mock_print.assert_called_with("Database does not exist.")
+
+        action_admin.create_database()
+        mock_print.assert_called_with("Database created and users data added.")
+        action_admin = Actions(login="222222222", password="7GRMc-fg42")
+        self.assertIsInstance(action_admin.backend, SqliteUsersBackend)
+        action_admin.check_database()
+        mock_print.assert_called_with("Summary tables are consistent.")
+        output = io.StringIO()
+        action_admin.output = ResultsWriter(stream=output)
+        action_admin.print_all_accounts()
+        self.assertEqual(output.getvalue(), "10\n")
+
+        # Test case: user without admin role
+        Actions(login="888888888", password="dQbafj:B:&").check_database()
+        mock_print.assert_called_with("Invalid Login")
+
+    @patch("builtins.print")
+    def test_metrics(self, mock_print):
+        metrics = MetricsRegistry()
+        Actions(
+            login="222222222", password="7GRMc-fg42", metrics=metrics
+        ).create_database()
+        Actions(
+            login="222222222", password="7GRMc-fg42", metrics=metrics
+        ).group_children_by_age()
+        self.assertEqual(metrics.samples[("users_db_rows_inserted_total", "", ())], 10)
+        self.assertGreater(
+            metrics.samples[("users_db_insert_seconds_total", "", ())], 0
+        )
+        for backend, command in [
+            ("file", "create_database"),
+            ("db", "group_children_by_age"),
+        ]:
+            self.assertEqual(
+                metrics.samples[
+                    (
+                        "users_command_duration_seconds",
+                        "_count",
+                        (("backend", backend), ("command", command)),
+                    )
+                ],
+                1,
+            )
+
+    @patch("builtins.print")
+    def test_login_filter(self, mock_print):
+        Actions(login="222222222", password="7GRMc-fg42").create_database()
+        metrics = MetricsRegistry()
+        # Test case: unknown login rejected without a users lookup
+        with patch.object(SqliteUsersBackend, "find_user") as mock_find_user:
+            unknown_login = Actions(
+                login="unknown@example.org", password="7GRMc-fg42", metrics=metrics
+            )
+            mock_find_user.assert_not_called()
+        self.assertFalse(unknown_login.authenticated_user)
+        self.assertEqual(
+            metrics.samples[
+                ("users_login_filter_rejected_total", "", (("backend", "db"),))
+            ],
+            1,
+        )
+
+        # Test case: known login looked up
+        action_admin = Actions(login="test2@example.com", password="7GRMc-fg42")
+        self.assertEqual(action_admin.role, "admin")
+
+    @patch("actions.load_users_backend")
+    @patch("builtins.print")
+    def test_create_database_without_file_backend(self, mock_print, mock_load):
+        # Test case: user without admin role, nothing left behind
+        for shards in [1, 3]:
+            action_user = Actions(
+                login="888888888", password="dQbafj:B:&", load_data_files=False
+            )
+            self.assertIsNone(action_user.backend)
+            action_user.create_database(shards)
+            mock_print.assert_called_with("Invalid Login")
+            self.assertEqual(os.listdir(os.path.dirname(actions.db)), [])
+
+        # Test case: data files loaded once, for the database
+        Actions(
+            login="test2@example.com", password="7GRMc-fg42", load_data_files=False
+        ).create_database()
+        mock_print.assert_called_with("Database created and users data added.")
+        self.assertEqual(
+            os.listdir(os.path.dirname(actions.db)), [os.path.basename(actions.db)]
+        )
+        mock_load.assert_not_called()
+        action_admin = Actions(login="222222222", password="7GRMc-fg42")
+        self.assertIsInstance(action_admin.backend, SqliteUsersBackend)
+        action_admin.check_database()
+        mock_print.assert_called_with("Summary tables are consistent.")
+
+    @patch("builtins.print")
+    def test_check_sharded_database(self, mock_print):
+        Actions(login="222222222", password="7GRMc-fg42").create_database(shards=3)
+        action_admin = Actions(login="222222222", password="7GRMc-fg42")
+        self.assertIsInstance(action_admin.backend, ShardedSqliteUsersBackend)
+        action_admin.check_database()
+        mock_print.assert_called_with("Summary tables are consistent.")
+        output = io.StringIO()
+        action_admin.output = ResultsWriter("jsonl", stream=output)
+        action_admin.print_oldest_account()
+        self.assertEqual(
+            json.loads(output.getvalue()),
+            {
+                "firstname": "Test1",
+                "email": "test1@example.com",
+                "created_at": "2010-01-21 21:21:01",
+            },
+        )
+
+
+class TestActionsSession(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        for name, value in [
+            ("db", os.path.join(directory.name, "users_db.db")),
+            ("db_manifest", os.path.join(directory.name, "users_db.manifest.json")),
+            ("snapshot", os.path.join(directory.name, "users_snapshot.bin")),
+            ("load_final_users_data", lambda *args: test_final_users_data),
+            ("load_users_backend", lambda *args: test_users_backend),
+            ("paths", test_paths),
+        ]:
+            patcher = patch(f"actions.{name}", value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.db_path = os.path.join(directory.name, "users_db.db")
+        self.session_store = SessionStore(
+            os.path.join(directory.name, "session"),
+            os.path.join(directory.name, "session.key"),
+        )
+        with patch("builtins.print"):
+            Actions(login="222222222", password="7GRMc-fg42").create_database()
+
+    @patch("builtins.print")
+    def test_session_authenticates_commands(self, mock_print):
+        # Test case: no session yet
+        action = Actions(login=None, password=None, session_store=self.session_store)
+        self.assertFalse(action.authenticated_user)
+
+        Actions(
+            login="222222222", password="7GRMc-fg42", session_store=self.session_store
+        ).create_session()
+        self.assertTrue(mock_print.call_args.args[0].startswith("Logged in until"))
+
+        # Test case: login and role taken from session, backend not queried
+        with patch.object(SqliteUsersBackend, "find_user") as mock_find_user:
+            action_admin = Actions(
+                login=None, password=None, session_store=self.session_store
+            )
+        self.assertIsInstance(action_admin.backend, SqliteUsersBackend)
+        mock_find_user.assert_not_called()
+        self.assertEqual(action_admin.login, "222222222")
+        self.assertEqual(action_admin.role, "admin")
+        output = io.StringIO()
+        action_admin.output = ResultsWriter(stream=output)
+        action_admin.print_all_accounts()
+        self.assertEqual(output.getvalue(), "10\n")
+
+        # Test case: session of another login
+        action = Actions(
+            login="888888888", password=None, session_store=self.session_store
+        )
+        self.assertFalse(action.authenticated_user)
+
+    @patch("builtins.print")
+    def test_session_children_commands(self, mock_print):
+        Actions(
+            login="888888888", password="dQbafj:B:&", session_store=self.session_store
+        ).create_session()
+        action = Actions(login=None, password=None, session_store=self.session_store)
+        self.assertEqual(action.role, "user")
+        output = io.StringIO()
+        action.output = ResultsWriter(stream=output)
+        action.print_children()
+        self.assertEqual(
+            output.getvalue().splitlines(), ["Alex, 6", "Harry, 9", "Robert, 14"]
+        )
+        action.print_all_accounts()
+        mock_print.assert_called_with("Invalid Login")
+
+    @patch("builtins.print")
+    def test_session_invalidated_by_dataset_change(self, mock_print):
+        Actions(
+            login="222222222", password="7GRMc-fg42", session_store=self.session_store
+        ).create_session()
+        db_stat = os.stat(self.db_path)
+        os.utime(self.db_path, ns=(db_stat.st_atime_ns, db_stat.st_mtime_ns + 10**9))
+        action = Actions(login=None, password=None, session_store=self.session_store)
+        self.assertFalse(action.authenticated_user)
+
+    @patch("builtins.print")
+    def test_no_password_without_session_store(self, mock_print):
+        # Test case: password is checked when sessions are not used
+        action = Actions(login="222222222", password=None)
+        self.assertFalse(action.authenticated_user)
+        action.create_session()
+        mock_print.assert_called_with("Invalid Login")
+
+
+class TestActionsResultCache(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        for name, value in [
+            ("db", os.path.join(directory.name, "users_db.db")),
+            ("db_manifest", os.path.join(directory.name, "users_db.manifest.json")),
+            ("snapshot", os.path.join(directory.name, "users_snapshot.bin")),
+            ("load_final_users_data", lambda *args: test_final_users_data),
+            ("load_users_backend", lambda *args: test_users_backend),
+            ("paths", test_paths),
+        ]:
+            patcher = patch(f"actions.{name}", value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.db_path = os.path.join(directory.name, "users_db.db")
+        self.cache_dir = os.path.join(directory.name, "results")
+        self.result_cache = ResultCache(self.cache_dir)
+
+    def run_command(self, login: str, password: str, command: str, metrics=None):
+        output = io.StringIO()
+        action = Actions(
+            login=login,
+            password=password,
+            output=ResultsWriter("jsonl", stream=output),
+            metrics=metrics,
+            result_cache=self.result_cache,
+        )
+        getattr(action, command)()
+        return output.getvalue()
+
+    def get_cache_lookups(self, metrics: MetricsRegistry, command: str) -> dict:
+        return {
+            result: metrics.samples.get(
+                (
+                    "users_result_cache_total",
+                    "",
+                    (("command", command), ("result", result)),
+                )
+            )
+            for result in ["hit", "miss"]
+        }
+
+    def test_admin_commands_cached(self):
+        metrics = MetricsRegistry()
+        for command, backend_method in [
+            ("print_all_accounts", "count_users"),
+            ("print_oldest_account", "get_oldest_user"),
+            ("group_children_by_age", "get_children_ages_histogram"),
+        ]:
+            output = self.run_command("222222222", "7GRMc-fg42", command, metrics)
+            # Test case: cached result output without a backend query
+            with patch.object(InMemoryUsersBackend, backend_method) as mock_method:
+                self.assertEqual(
+                    self.run_command("222222222", "7GRMc-fg42", command, metrics),
+                    output,
+                )
+                mock_method.assert_not_called()
+            self.assertEqual(
+                self.get_cache_lookups(metrics, command), {"hit": 1, "miss": 1}
+            )
+
+    def test_user_commands_cached_by_login(self):
+        metrics = MetricsRegistry()
+        output = self.run_command(
+            "888888888", "dQbafj:B:&", "find_similar_children_by_age", metrics
+        )
+        self.assertEqual(
+            self.run_command(
+                "888888888", "dQbafj:B:&", "find_similar_children_by_age", metrics
+            ),
+            output,
+        )
+        self.assertEqual(
+            self.get_cache_lookups(metrics, "find_similar_children_by_age"),
+            {"hit": 1, "miss": 1},
+        )
+        self.assertEqual(
+            self.get_cache_lookups(metrics, "children"), {"hit": 1, "miss": 1}
+        )
+
+        # Test case: arguments are part of the key
+        for match in ["exact", "superset", "superset"]:
+            output = io.StringIO()
+            action = Actions(
+                login="888888888",
+                password="dQbafj:B:&",
+                output=ResultsWriter("jsonl", stream=output),
+                metrics=metrics,
+                result_cache=self.result_cache,
+            )
+            action.find_matching_families(match)
+        self.assertEqual(
+            self.get_cache_lookups(metrics, "find_matching_families"),
+            {"hit": 1, "miss": 2},
+        )
+
+        # Test case: results of another user are not shared
+        self.run_command("test2@example.com", "7GRMc-fg42", "print_children", metrics)
+        self.assertEqual(
+            self.get_cache_lookups(metrics, "children"), {"hit": 4, "miss": 2}
+        )
+
+        # Test case: passwords are never cached
+        for entry in os.listdir(self.cache_dir):
+            with open(os.path.join(self.cache_dir, entry)) as file:
+                cached_result = file.read()
+            for user in test_final_users_data.to_dict(orient="records"):
+                self.assertNotIn(user["password"], cached_result)
+
+    @patch("builtins.print")
+    def test_invalidated_by_database_change(self, mock_print):
+        Actions(login="222222222", password="7GRMc-fg42").create_database()
+        self.assertEqual(
+            self.run_command("222222222", "7GRMc-fg42", "print_all_accounts"),
+            '{"accounts": 10}\n',
+        )
+        with SqliteUsersBackend.connect(self.db_path) as db_conn:
+            db_conn.execute(
+                "INSERT INTO users_data (email, firstname, telephone_number, "
+                "password, role, created_at) VALUES ('new@example.com', 'New', "
+                "'101010101', 'pass', 'user', '2000-01-01 00:00:00');"
+            )
+        db_conn.close()
+        self.assertEqual(
+            self.run_command("222222222", "7GRMc-fg42", "print_all_accounts"),
+            '{"accounts": 11}\n',
+        )
+        # Test case: outdated result not served, left to eviction
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+
+
 if __name__ == "__main__":
     unittest.main()
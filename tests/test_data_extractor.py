@@ -1,6 +1,19 @@
+import bz2
+import gzip
+import lzma
+import os
+import shutil
+import tempfile
+import io
+import json
 import unittest
+from typing import Iterator
 from unittest.mock import patch
-from users_data_utils import UsersDataExtractor
+from users_data_utils import (
+    ChunkedCsvUsersDataExtractor,
+    JsonArrayReader,
+    UsersDataExtractor,
+)
 
 
 class TestUsersDataExtractor(unittest.TestCase):
@@ -11,6 +24,11 @@ class TestUsersDataExtractor(unittest.TestCase):
         # Test case: File path without extension
         file_handler_no_extension = UsersDataExtractor("/path/to/example")
         self.assertIs(file_handler_no_extension.extract_file_extension(), None)
+        # Test case: File path with compressed file extension
+        file_handler_compressed = UsersDataExtractor("/path/to/example.xml.gz")
+        self.assertEqual(file_handler_compressed.extract_file_extension(), "xml.gz")
+        self.assertEqual(file_handler_compressed.data_format, "xml")
+        self.assertEqual(file_handler_compressed.compression, "gz")
 
     def test_read_csv(self):
         # Test case: Read valid csv test file
@@ -31,7 +49,9 @@ class TestUsersDataExtractor(unittest.TestCase):
         # Test case: Read valid json test file
         file_handler = UsersDataExtractor("./data/test_data.json")
         users_data = file_handler.read_json()
-        self.assertIsInstance(users_data, list)
+        self.assertIsInstance(users_data, Iterator)
+        users_data = list(users_data)
+        self.assertEqual(len(users_data), 3)
         for user in users_data:
             self.assertIsInstance(user, dict)
             self.assertIn("firstname", user)
@@ -57,6 +77,48 @@ class TestUsersDataExtractor(unittest.TestCase):
             self.assertIn("created_at", user)
             self.assertIn("children", user)
 
+        # Test case: children are extracted as list of dicts
+        self.assertEqual(
+            users_data[0]["children"],
+            [{"name": "Adam", "age": "11"}, {"name": "Christie", "age": "17"}],
+        )
+
+    def test_extract_data_with_columns(self):
+        # Test case: only projected columns are extracted from every format
+        columns = ["email", "telephone_number"]
+        for path in [
+            "./data/test_data.csv",
+            "./data/test_data.json",
+            "./data/test_data.xml",
+        ]:
+            users_data = UsersDataExtractor(path, columns).extract_data()
+            self.assertTrue(users_data)
+            for user in users_data:
+                self.assertEqual(set(user), set(columns))
+
+    def test_extract_data_compressed(self):
+        # Test case: compressed files give the same data as uncompressed ones
+        with tempfile.TemporaryDirectory() as directory:
+            for data_format in ["csv", "json", "xml"]:
+                path = f"./data/test_data.{data_format}"
+                expected_data = list(UsersDataExtractor(path).extract_data())
+                for compression, opener in [
+                    ("gz", gzip.open),
+                    ("bz2", bz2.open),
+                    ("xz", lzma.open),
+                ]:
+                    compressed_path = os.path.join(
+                        directory, f"test_data.{data_format}.{compression}"
+                    )
+                    with open(path, "rb") as source, opener(
+                        compressed_path, "wb"
+                    ) as target:
+                        shutil.copyfileobj(source, target)
+                    self.assertEqual(
+                        list(UsersDataExtractor(compressed_path).extract_data()),
+                        expected_data,
+                    )
+
     @patch("users_data_utils.UsersDataExtractor.read_csv")
     def test_extract_data_csv(self, mock_read_csv_function):
         # Test case: extract data when file with csv extension
@@ -84,6 +146,111 @@ class TestUsersDataExtractor(unittest.TestCase):
         result = file_handler.extract_data()
         self.assertIs(result, None)
 
+    def test_csv_byte_ranges(self):
+        # Test case: ranges cover rows after header, each ends a line
+        path = "./data/final_test_data.csv"
+        byte_ranges = UsersDataExtractor.get_csv_byte_ranges(path, 100)
+        with open(path, "rb") as file:
+            data = file.read()
+        self.assertGreater(len(byte_ranges), 1)
+        self.assertEqual(byte_ranges[0][0], data.index(b"\n") + 1)
+        self.assertEqual(byte_ranges[-1][1], len(data))
+        for (_, end), (start, _) in zip(byte_ranges, byte_ranges[1:]):
+            self.assertEqual(end, start)
+            self.assertEqual(data[end - 1 : end], b"\n")
+        # Test case: rows of all ranges are the rows of the file
+        self.assertEqual(
+            [
+                user
+                for byte_range in byte_ranges
+                for user in UsersDataExtractor(path, byte_range=byte_range).read_csv()
+            ],
+            UsersDataExtractor(path).read_csv(),
+        )
+
+    def test_iter_batches(self):
+        # Test case: users read lazily, in batches of given size
+        for path, batch_sizes in [
+            ("./data/test_data.xml", [2]),
+            ("./data/test_data.json", [2, 1]),
+        ]:
+            batches = list(UsersDataExtractor(path).iter_batches(2))
+            self.assertEqual([len(batch) for batch in batches], batch_sizes)
+            self.assertEqual(
+                [user for batch in batches for user in batch],
+                list(UsersDataExtractor(path).extract_data()),
+            )
+
+
+class TestChunkedCsvUsersDataExtractor(unittest.TestCase):
+    def test_read_csv_chunks(self):
+        # Test case: chunks hold the same rows as csv.DictReader
+        for path in ["./data/test_data.csv", "./data/final_test_data.csv"]:
+            expected_data = UsersDataExtractor(path).read_csv()
+            chunks = list(
+                ChunkedCsvUsersDataExtractor(path, chunk_size=3).extract_data()
+            )
+            self.assertEqual(len(chunks), -(-len(expected_data) // 3))
+            self.assertEqual(
+                [user for chunk in chunks for user in chunk.to_dict(orient="records")],
+                expected_data,
+            )
+
+    def test_read_csv_chunks_with_columns(self):
+        # Test case: only projected columns are read
+        columns = ["email", "telephone_number"]
+        chunks = ChunkedCsvUsersDataExtractor(
+            "./data/test_data.csv", columns
+        ).extract_data()
+        for chunk in chunks:
+            self.assertEqual(set(chunk.columns), set(columns))
+
+    def test_extract_data_other_formats(self):
+        # Test case: formats other than csv use UsersDataExtractor readers
+        extractor = ChunkedCsvUsersDataExtractor("./data/test_data.xml")
+        self.assertEqual(extractor.data_format, "xml")
+        self.assertEqual(
+            extractor.extract_data(),
+            UsersDataExtractor("./data/test_data.xml").extract_data(),
+        )
+
+
+class TestJsonArrayReader(unittest.TestCase):
+    def test_iter_matches_json_load(self):
+        # Test case: buffer smaller than single user object
+        with open("./data/test_data.json") as file:
+            expected_data = json.load(file)
+        for chunk_size in [1, 7, 64, 1024 * 64]:
+            with open("./data/test_data.json") as file:
+                self.assertEqual(
+                    list(JsonArrayReader(file, chunk_size=chunk_size)), expected_data
+                )
+
+    def test_iter_values_split_between_chunks(self):
+        # Test case: numbers and strings with separators split between chunks
+        data = ' [ 1, 23 ,456, "a,]b", {"x": [1, 2]}, [], null ] '
+        self.assertEqual(
+            list(JsonArrayReader(io.StringIO(data), chunk_size=2)),
+            [1, 23, 456, "a,]b", {"x": [1, 2]}, [], None],
+        )
+
+    def test_iter_empty_array(self):
+        # Test case: empty array
+        self.assertEqual(list(JsonArrayReader(io.StringIO("[ ]"))), [])
+
+    def test_iter_invalid_data(self):
+        # Test case: data is not an array
+        with self.assertRaises(ValueError):
+            list(JsonArrayReader(io.StringIO('{"firstname": "Test"}')))
+
+        # Test case: array not closed
+        with self.assertRaises(ValueError):
+            list(JsonArrayReader(io.StringIO('[{"firstname": "Test"}'), chunk_size=4))
+
+        # Test case: missing separator between values
+        with self.assertRaises(ValueError):
+            list(JsonArrayReader(io.StringIO("[1 2]")))
+
 
 if __name__ == "__main__":
     unittest.main()
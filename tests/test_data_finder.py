@@ -0,0 +1,100 @@
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+from users_data_processor import process_users_data
+from users_data_utils import DataFile, UsersDataFinder
+
+
+class TestUsersDataFinder(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.data_dir, "a", "b"))
+        shutil.copy("./data/test_data.xml", os.path.join(self.data_dir, "users.xml"))
+        shutil.copy(
+            "./data/test_data.csv", os.path.join(self.data_dir, "a", "users.csv")
+        )
+        shutil.copy(
+            "./data/test_data.json", os.path.join(self.data_dir, "a", "b", "users")
+        )
+        shutil.copy("./data/test_data.txt", os.path.join(self.data_dir, "notes.txt"))
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir)
+
+    def test_find_data_files(self):
+        # Test case: files found recursively, format detected, largest first
+        data_files = UsersDataFinder(self.data_dir).find_data_files()
+        self.assertEqual(
+            [
+                (os.path.relpath(data_file.path, self.data_dir), data_file.data_format)
+                for data_file in data_files
+            ],
+            [
+                ("users.xml", "xml"),
+                (os.path.join("a", "b", "users"), "json"),
+                (os.path.join("a", "users.csv"), "csv"),
+            ],
+        )
+        sizes = [data_file.size for data_file in data_files]
+        self.assertEqual(sizes, sorted(sizes, reverse=True))
+        for data_file in data_files:
+            self.assertIsInstance(data_file, DataFile)
+            self.assertEqual(data_file.mtime_ns, os.stat(data_file.path).st_mtime_ns)
+
+    def test_find_data_files_include_exclude(self):
+        # Test case: include and exclude globs on path relative to data dir
+        data_files = UsersDataFinder(
+            self.data_dir, include=["a/*"], exclude=["a/b/*"]
+        ).find_data_files()
+        self.assertEqual(
+            [data_file.path for data_file in data_files],
+            [os.path.join(self.data_dir, "a", "users.csv")],
+        )
+
+    def test_sniff_data_format(self):
+        # Test case: format detected from content
+        self.assertEqual(
+            UsersDataFinder.sniff_data_format("./data/test_data.xml"), "xml"
+        )
+        self.assertEqual(
+            UsersDataFinder.sniff_data_format("./data/test_data.json"), "json"
+        )
+        self.assertEqual(
+            UsersDataFinder.sniff_data_format("./data/test_data.csv"), "csv"
+        )
+        self.assertIs(UsersDataFinder.sniff_data_format("./data/test_data.txt"), None)
+
+    def test_detect_data_format_compressed(self):
+        # Test case: format detected from extension before compression suffix
+        self.assertEqual(UsersDataFinder.detect_data_format("users.xml.gz"), "xml")
+        self.assertEqual(UsersDataFinder.detect_data_format("users.csv.bz2"), "csv")
+        self.assertEqual(UsersDataFinder.detect_data_format("users.json.xz"), "json")
+
+    def test_find_compressed_file_without_extension(self):
+        # Test case: format sniffed from decompressed content
+        with open("./data/test_data.json", "rb") as source, gzip.open(
+            os.path.join(self.data_dir, "a", "b", "backup.gz"), "wb"
+        ) as target:
+            shutil.copyfileobj(source, target)
+        data_files = UsersDataFinder(self.data_dir, ["a/b/*"]).find_data_files()
+        self.assertEqual(
+            [
+                (os.path.relpath(data_file.path, self.data_dir), data_file.data_format)
+                for data_file in data_files
+            ],
+            [
+                (os.path.join("a", "b", "users"), "json"),
+                (os.path.join("a", "b", "backup.gz"), "json"),
+            ],
+        )
+        # Test case: loaded like the uncompressed copy
+        self.assertEqual(
+            process_users_data(data_files[:1]).to_dict(orient="records"),
+            process_users_data(data_files[1:]).to_dict(orient="records"),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
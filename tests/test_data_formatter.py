@@ -1,5 +1,17 @@
+import json
+import os
+import tempfile
 import unittest
-from users_data_utils import UsersDataFormatter
+from unittest.mock import patch
+from pandas import DataFrame
+from users_data_utils import (
+    ChunkedCsvUsersDataFormatter,
+    RejectionCollector,
+    UsersDataFormatter,
+    CsvUsersDataFormatter,
+    JsonUsersDataFormatter,
+    XmlUsersDataFormatter,
+)
 
 
 class TestUsersDataFormatter(unittest.TestCase):
@@ -229,6 +241,47 @@ class TestUsersDataFormatter(unittest.TestCase):
             ],
         )
 
+    def test_for_data_format(self):
+        # Test case: formatter routed by extracted data format
+        self.assertIs(UsersDataFormatter.for_data_format("csv"), CsvUsersDataFormatter)
+        self.assertIs(
+            UsersDataFormatter.for_data_format("json"), JsonUsersDataFormatter
+        )
+        self.assertIs(UsersDataFormatter.for_data_format("xml"), XmlUsersDataFormatter)
+
+        # Test case: unknown format falls back to generic formatter
+        self.assertIs(UsersDataFormatter.for_data_format(None), UsersDataFormatter)
+
+    def test_get_info_on_user_children_csv_formatter(self):
+        # Test case: User with no children
+        self.assertIs(
+            CsvUsersDataFormatter.get_info_on_user_children({"children": ""}), None
+        )
+
+        # Test case: User with three children, spaces around names and ages
+        user_three_children = {"children": "Adam (1), Hellen ( 3 ),Peter (13)"}
+        self.assertEqual(
+            CsvUsersDataFormatter.get_info_on_user_children(user_three_children),
+            [
+                {"name": "Adam", "age": "1"},
+                {"name": "Hellen", "age": "3"},
+                {"name": "Peter", "age": "13"},
+            ],
+        )
+
+    def test_get_info_on_user_children_xml_formatter(self):
+        # Test case: User with children already extracted as list of dicts
+        user_children = {"children": [{"name": "Teresa", "age": "4"}]}
+        self.assertEqual(
+            XmlUsersDataFormatter.get_info_on_user_children(user_children),
+            [{"name": "Teresa", "age": "4"}],
+        )
+
+        # Test case: User with no children
+        self.assertIs(
+            XmlUsersDataFormatter.get_info_on_user_children({"children": []}), None
+        )
+
     def test_children_age_to_int(self):
         # Test case: one child,  age as str
         test_children_data_one = [{"name": "Adam", "age": "11"}]
@@ -289,6 +342,24 @@ class TestUsersDataFormatter(unittest.TestCase):
             },
         )
 
+        # Test case: valid user data, children not in projected columns
+        user_valid_without_children = {
+            "telephone_number": "+48123123123",
+            "email": "example@gmail.com",
+            "children": "Michael (12),Theresa (6),Judith (1)",
+        }
+        result_user_without_children = UsersDataFormatter.format_user_data(
+            user_valid_without_children, ["telephone_number", "email"]
+        )
+        self.assertEqual(
+            result_user_without_children,
+            {
+                "telephone_number": "123123123",
+                "email": "example@gmail.com",
+                "children": "Michael (12),Theresa (6),Judith (1)",
+            },
+        )
+
         # Test case: invalid user data, no tel number
         user_invalid_no_tel = {
             "firstname": "Test",
@@ -319,6 +390,114 @@ class TestUsersDataFormatter(unittest.TestCase):
         )
         self.assertIs(result_user_invalid_email, None)
 
+    def test_process_data_rejections(self):
+        test_data = [
+            {
+                "telephone_number": "123123123",
+                "email": "a@example.com",
+                "children": "Adam (x)",
+            },
+            {"telephone_number": "", "email": "b@example.com", "children": ""},
+            {
+                "telephone_number": "123123124",
+                "email": "c@@example.com",
+                "children": "",
+            },
+            {"telephone_number": "123123125", "email": "d@example.com", "children": ""},
+        ]
+        rejections = RejectionCollector()
+        # Test case: rejected rows are counted by reason and source, without printing
+        with patch("builtins.print") as mock_print:
+            result = UsersDataFormatter(
+                test_data, rejections=rejections, source="users.csv"
+            ).process_data()
+        mock_print.assert_not_called()
+        self.assertEqual(len(result), 2)
+        self.assertEqual(
+            rejections.counts,
+            {
+                ("incorrect format of child age", "users.csv"): 1,
+                ("missing telephone number", "users.csv"): 1,
+                ("invalid email", "users.csv"): 1,
+            },
+        )
+        self.assertEqual(rejections.total(), 3)
+
+    def test_csv_children_without_age_rejected(self):
+        users = [
+            {
+                "telephone_number": "123123123",
+                "email": "a@example.com",
+                "children": "Bob, Adam (1),Carl,Dan (4), Eve",
+            }
+        ]
+        # Test case: children without age reported, the others kept
+        for formatter, data in [
+            (CsvUsersDataFormatter, [dict(user) for user in users]),
+            (ChunkedCsvUsersDataFormatter, [DataFrame(users)]),
+        ]:
+            rejections = RejectionCollector(quarantine_path="quarantine.jsonl")
+            result = formatter(
+                data, rejections=rejections, source="users.csv"
+            ).process_data()
+            if isinstance(result, DataFrame):
+                result = result.to_dict(orient="records")
+            self.assertEqual(
+                result[0]["children"],
+                [{"name": "Adam", "age": 1}, {"name": "Dan", "age": 4}],
+            )
+            self.assertEqual(rejections.counts, {("missing child age", "users.csv"): 3})
+            self.assertEqual(
+                [sample["row"] for sample in rejections.samples],
+                [{"child": "Bob"}, {"child": "Carl"}, {"child": "Eve"}],
+            )
+
+
+class TestRejectionCollector(unittest.TestCase):
+    def test_summary(self):
+        rejections = RejectionCollector()
+        rejections.reject("users.csv", "invalid email")
+        rejections.reject("users.csv", "invalid email")
+        rejections.reject("users.json", "missing telephone number")
+        self.assertEqual(
+            rejections.summary(),
+            [
+                "invalid email in users.csv: 2",
+                "missing telephone number in users.json: 1",
+            ],
+        )
+
+    def test_write_quarantine(self):
+        with tempfile.TemporaryDirectory() as directory:
+            quarantine_path = os.path.join(directory, "quarantine.jsonl")
+            rejections = RejectionCollector(quarantine_path, sample_size=2)
+            for number in range(3):
+                rejections.reject(
+                    "users.csv",
+                    "invalid email",
+                    {"email": f"{number}@", "password": "x"},
+                )
+            rejections.write_quarantine()
+            with open(quarantine_path) as quarantine_file:
+                samples = [json.loads(line) for line in quarantine_file]
+        # Test case: only sample size rows written, passwords left out
+        self.assertEqual(
+            samples,
+            [
+                {
+                    "source": "users.csv",
+                    "reason": "invalid email",
+                    "row": {"email": "0@"},
+                },
+                {
+                    "source": "users.csv",
+                    "reason": "invalid email",
+                    "row": {"email": "1@"},
+                },
+            ],
+        )
+        self.assertEqual(rejections.counts[("invalid email", "users.csv")], 3)
+
 
 if __name__ == "__main__":
     unittest.main()
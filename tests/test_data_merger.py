@@ -0,0 +1,250 @@
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import Future
+from unittest.mock import patch
+from metrics import MetricsRegistry
+from users_data_processor import process_users_data
+from users_data_utils import (
+    ChunkedCsvUsersDataExtractor,
+    RejectionCollector,
+    UsersDataExtractor,
+    UsersDataFormatter,
+    UsersDataMerger,
+)
+
+paths = ["./data/test_data.xml", "./data/test_data.csv", "./data/test_data.json"]
+
+
+class TestUsersDataMerger(unittest.TestCase):
+    def test_merge_data(self):
+        # Test case: valid users from every file merged in files order
+        merged_data = UsersDataMerger.merge_data(
+            paths, UsersDataExtractor, UsersDataFormatter
+        )
+        self.assertEqual(
+            [user["email"] for user in merged_data],
+            [
+                "test@gmail.com",
+                "test@example.net",
+                "test@example.com",
+                "test@example.org",
+                "test2@example.com",
+                "test2@example.net",
+            ],
+        )
+
+    def test_merge_data_workers(self):
+        # Test case: parallel workers give the same result and rejections
+        rejections = RejectionCollector()
+        parallel_rejections = RejectionCollector()
+        merged_data = UsersDataMerger.merge_data(
+            paths, UsersDataExtractor, UsersDataFormatter, rejections=rejections
+        )
+        parallel_merged_data = UsersDataMerger.merge_data(
+            paths,
+            UsersDataExtractor,
+            UsersDataFormatter,
+            rejections=parallel_rejections,
+            workers=2,
+        )
+        self.assertEqual(parallel_merged_data, merged_data)
+        self.assertEqual(parallel_rejections.counts, rejections.counts)
+        self.assertEqual(
+            rejections.counts, {("missing telephone number", "./data/test_data.csv"): 1}
+        )
+
+    def test_merge_data_chunked_csv(self):
+        # Test case: chunked csv path gives the same users and rejections
+        rejections = RejectionCollector()
+        chunked_rejections = RejectionCollector()
+        merged_data = UsersDataMerger.merge_data(
+            paths, UsersDataExtractor, UsersDataFormatter, rejections=rejections
+        )
+        chunked_merged_data = UsersDataMerger.merge_data(
+            paths,
+            ChunkedCsvUsersDataExtractor,
+            UsersDataFormatter,
+            rejections=chunked_rejections,
+        )
+        self.assertEqual(chunked_merged_data.to_dict(orient="records"), merged_data)
+        self.assertEqual(chunked_rejections.counts, rejections.counts)
+
+    @patch.object(UsersDataMerger, "BATCH_SIZE", 1)
+    def test_merge_data_split_files(self):
+        # Test case: files split into parts give the same result, in same order
+        with tempfile.TemporaryDirectory() as directory:
+            split_paths = paths + ["./data/final_test_data.csv"]
+            for path in ["./data/test_data.csv", "./data/test_data.xml"]:
+                compressed_path = os.path.join(
+                    directory, f"{os.path.basename(path)}.gz"
+                )
+                with open(path, "rb") as file, gzip.open(compressed_path, "wb") as gz:
+                    shutil.copyfileobj(file, gz)
+                split_paths.append(compressed_path)
+            for data_extractor in [UsersDataExtractor, ChunkedCsvUsersDataExtractor]:
+                results = []
+                for workers, split_size in [(1, UsersDataMerger.SPLIT_SIZE), (2, 64)]:
+                    rejections = RejectionCollector()
+                    metrics = MetricsRegistry()
+                    merged_data = UsersDataMerger.merge_data(
+                        split_paths,
+                        data_extractor,
+                        UsersDataFormatter,
+                        rejections=rejections,
+                        workers=workers,
+                        metrics=metrics,
+                        split_size=split_size,
+                    )
+                    if data_extractor is ChunkedCsvUsersDataExtractor:
+                        merged_data = merged_data.to_dict(orient="records")
+                    results.append((merged_data, rejections.counts, metrics.samples))
+                self.assertEqual(results[1], results[0])
+
+    @patch.object(UsersDataMerger, "BATCH_SIZE", 1)
+    def test_merge_data_pending_parts(self):
+        # Test case: batches are submitted while earlier parts are merged
+        executors = []
+
+        class DeferredExecutor:
+            def __init__(self, max_workers: int):
+                self.pending = 0
+                self.max_pending = 0
+                executors.append(self)
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *args):
+                pass
+
+            def submit(self, fn, *args) -> Future:
+                executor = self
+                self.pending += 1
+                self.max_pending = max(self.max_pending, self.pending)
+
+                class DeferredFuture(Future):
+                    def result(self, timeout=None):
+                        executor.pending -= 1
+                        return fn(*args)
+
+                return DeferredFuture()
+
+        merged_data = UsersDataMerger.merge_data(
+            paths, UsersDataExtractor, UsersDataFormatter
+        )
+        with patch("users_data_utils.ProcessPoolExecutor", DeferredExecutor):
+            parallel_merged_data = UsersDataMerger.merge_data(
+                paths, UsersDataExtractor, UsersDataFormatter, workers=2, split_size=0
+            )
+        self.assertEqual(parallel_merged_data, merged_data)
+        self.assertEqual(executors[0].pending, 0)
+        self.assertEqual(executors[0].max_pending, 4)
+
+    @patch.object(UsersDataMerger, "BATCH_SIZE", 1)
+    def test_merge_data_malformed_file(self):
+        # Test case: a file failing to parse is dropped, the others kept
+        with tempfile.TemporaryDirectory() as directory:
+            malformed_paths = []
+            for path in ["./data/test_data.json", "./data/test_data.xml"]:
+                with open(path) as file:
+                    data = file.read()
+                malformed_path = os.path.join(directory, os.path.basename(path))
+                with open(malformed_path, "w") as file:
+                    file.write(data[: len(data) * 2 // 3])
+                malformed_paths.append(malformed_path)
+            for malformed_path in malformed_paths:
+                results = []
+                for workers in [1, 2]:
+                    rejections = RejectionCollector()
+                    merged_data = UsersDataMerger.merge_data(
+                        ["./data/test_data.csv", malformed_path],
+                        UsersDataExtractor,
+                        UsersDataFormatter,
+                        rejections=rejections,
+                        workers=workers,
+                        split_size=64,
+                    )
+                    results.append((merged_data, rejections.counts))
+                self.assertEqual(results[1], results[0])
+                self.assertEqual(
+                    merged_data,
+                    UsersDataMerger.merge_data(
+                        ["./data/test_data.csv"], UsersDataExtractor, UsersDataFormatter
+                    ),
+                )
+                self.assertEqual(
+                    rejections.counts[("error while processing data", malformed_path)],
+                    1,
+                )
+
+    def test_process_users_data_csv_engines(self):
+        # Test case: final data equal for both csv engines
+        for path in ["./data/test_data.csv", "./data/final_test_data.csv"]:
+            self.assertTrue(
+                process_users_data([path]).equals(
+                    process_users_data([path], csv_engine="pandas")
+                )
+            )
+
+    def test_merge_data_metrics(self):
+        # Test case: rows read per file, same for workers and chunked csv
+        rows_read = {}
+        for data_extractor, workers in [
+            (UsersDataExtractor, 1),
+            (UsersDataExtractor, 2),
+            (ChunkedCsvUsersDataExtractor, 1),
+        ]:
+            metrics = MetricsRegistry()
+            UsersDataMerger.merge_data(
+                paths,
+                data_extractor,
+                UsersDataFormatter,
+                workers=workers,
+                metrics=metrics,
+            )
+            rows_read[(data_extractor, workers)] = metrics.samples
+        self.assertEqual(
+            rows_read[(UsersDataExtractor, 1)],
+            {
+                ("users_data_rows_read_total", "", (("source", path),)): rows_count
+                for path, rows_count in zip(paths, [2, 2, 3])
+            },
+        )
+        self.assertEqual(
+            rows_read[(UsersDataExtractor, 2)], rows_read[(UsersDataExtractor, 1)]
+        )
+        self.assertEqual(
+            rows_read[(ChunkedCsvUsersDataExtractor, 1)],
+            rows_read[(UsersDataExtractor, 1)],
+        )
+
+    def test_process_users_data_metrics(self):
+        metrics = MetricsRegistry()
+        with patch("sys.stderr"):
+            final_data = process_users_data(paths, metrics=metrics)
+        self.assertEqual(
+            metrics.samples[
+                (
+                    "users_data_rows_rejected_total",
+                    "",
+                    (
+                        ("reason", "missing telephone number"),
+                        ("source", "./data/test_data.csv"),
+                    ),
+                )
+            ],
+            1,
+        )
+        dropped = sum(
+            value
+            for (name, _, _), value in metrics.samples.items()
+            if name == "users_data_duplicates_dropped_total"
+        )
+        self.assertEqual(dropped, 6 - len(final_data))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+import json
+import os
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from metrics import MetricsRegistry
+
+
+def write_increments(path: str):
+    for _ in range(10):
+        metrics = MetricsRegistry()
+        metrics.inc("users_result_cache_total", result="hit")
+        metrics.write(path)
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    def get_metrics(self) -> MetricsRegistry:
+        metrics = MetricsRegistry()
+        metrics.inc("users_data_rows_read_total", 3, source="users.csv")
+        metrics.inc("users_data_rows_read_total", 2, source='a "b"\\c\n.xml')
+        metrics.observe(
+            "users_command_duration_seconds",
+            0.3,
+            buckets=[0.1, 0.5],
+            command="print_all_accounts",
+            backend="db",
+        )
+        return metrics
+
+    def test_to_prometheus(self):
+        self.assertEqual(
+            self.get_metrics().to_prometheus(),
+            "# TYPE users_command_duration_seconds histogram\n"
+            'users_command_duration_seconds_bucket{backend="db",'
+            'command="print_all_accounts",le="0.1"} 0\n'
+            'users_command_duration_seconds_bucket{backend="db",'
+            'command="print_all_accounts",le="0.5"} 1\n'
+            'users_command_duration_seconds_bucket{backend="db",'
+            'command="print_all_accounts",le="+Inf"} 1\n'
+            'users_command_duration_seconds_sum{backend="db",'
+            'command="print_all_accounts"} 0.3\n'
+            'users_command_duration_seconds_count{backend="db",'
+            'command="print_all_accounts"} 1\n'
+            "# TYPE users_data_rows_read_total counter\n"
+            'users_data_rows_read_total{source="users.csv"} 3\n'
+            'users_data_rows_read_total{source="a \\"b\\"\\\\c\\n.xml"} 2\n',
+        )
+
+    def test_round_trip(self):
+        metrics = self.get_metrics()
+        for parsed_metrics in [
+            MetricsRegistry.from_prometheus(metrics.to_prometheus()),
+            MetricsRegistry.from_json(json.loads(json.dumps(metrics.to_json()))),
+        ]:
+            self.assertEqual(parsed_metrics.types, metrics.types)
+            self.assertEqual(parsed_metrics.samples, metrics.samples)
+
+    def test_merge(self):
+        # Test case: counters and histogram buckets are added
+        metrics = self.get_metrics()
+        metrics.merge(self.get_metrics())
+        self.assertEqual(
+            metrics.samples[
+                ("users_data_rows_read_total", "", (("source", "users.csv"),))
+            ],
+            6,
+        )
+        self.assertEqual(
+            metrics.samples[
+                (
+                    "users_command_duration_seconds",
+                    "_count",
+                    (("backend", "db"), ("command", "print_all_accounts")),
+                )
+            ],
+            2,
+        )
+
+    def test_write_adds_to_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for file_name in ["metrics.prom", "metrics.json"]:
+                path = os.path.join(directory, file_name)
+                self.get_metrics().write(path)
+                self.get_metrics().write(path)
+                metrics = self.get_metrics()
+                metrics.merge(self.get_metrics())
+                self.assertEqual(MetricsRegistry.load(path).samples, metrics.samples)
+
+    def test_concurrent_writes(self):
+        # Test case: runs writing the same file at once keep every increment
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "metrics.prom")
+            with ProcessPoolExecutor(max_workers=4) as executor:
+                list(executor.map(write_increments, [path] * 8))
+            self.assertEqual(
+                MetricsRegistry.load(path).samples,
+                {("users_result_cache_total", "", (("result", "hit"),)): 8 * 10},
+            )
+            self.assertEqual(
+                sorted(os.listdir(directory)), ["metrics.prom", "metrics.prom.lock"]
+            )
+
+    def test_time(self):
+        metrics = MetricsRegistry()
+        with self.assertRaises(ValueError):
+            with metrics.time("users_command_duration_seconds", command="failed"):
+                raise ValueError
+        self.assertEqual(
+            metrics.samples[
+                ("users_command_duration_seconds", "_count", (("command", "failed"),))
+            ],
+            1,
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import os
+import stat
+import tempfile
+import unittest
+from result_cache import ResultCache
+from users_data_utils import DataFile
+
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.cache_dir = os.path.join(self.directory, "results")
+        self.result_cache = ResultCache(self.cache_dir, max_entries=3)
+
+    def get_entries(self) -> list:
+        return sorted(os.listdir(self.cache_dir))
+
+    def test_get_and_put(self):
+        # Test case: not cached
+        self.assertIs(self.result_cache.get("v1", ["count"]), ResultCache.MISSING)
+
+        self.result_cache.put("v1", ["count"], 10)
+        self.result_cache.put("v1", ["oldest"], None)
+        self.result_cache.put("v1", ["children", "888888888"], [{"name": "Alex"}])
+        self.assertEqual(self.result_cache.get("v1", ["count"]), 10)
+        self.assertIsNone(self.result_cache.get("v1", ["oldest"]))
+        self.assertEqual(
+            self.result_cache.get("v1", ["children", "888888888"]), [{"name": "Alex"}]
+        )
+
+        # Test case: files readable by owner only
+        for entry in self.get_entries():
+            path = os.path.join(self.cache_dir, entry)
+            self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o600)
+        self.assertEqual(stat.S_IMODE(os.stat(self.cache_dir).st_mode), 0o700)
+
+        # Test case: invalid entry
+        with open(self.result_cache.get_path("v1", ["count"]), "w") as file:
+            file.write("not json")
+        self.assertIs(self.result_cache.get("v1", ["count"]), ResultCache.MISSING)
+
+    def test_other_fingerprint(self):
+        self.result_cache.put("v1", ["count"], 10)
+        self.assertIs(self.result_cache.get("v2", ["count"]), ResultCache.MISSING)
+
+        # Test case: results of other fingerprints kept within the limits
+        self.result_cache.put("v2", ["count"], 11)
+        self.assertEqual(self.result_cache.get("v1", ["count"]), 10)
+        self.assertEqual(self.result_cache.get("v2", ["count"]), 11)
+
+        # Test case: least recently used entry evicted, whatever its fingerprint
+        for number, fingerprint in enumerate(["v2", "v1"]):
+            path = self.result_cache.get_path(fingerprint, ["count"])
+            os.utime(path, ns=(number * 10**9, number * 10**9))
+        self.result_cache.put("v3", ["count"], 12)
+        self.result_cache.put("v3", ["oldest"], None)
+        self.assertIs(self.result_cache.get("v2", ["count"]), ResultCache.MISSING)
+        self.assertEqual(self.result_cache.get("v1", ["count"]), 10)
+        self.assertEqual(len(self.get_entries()), 3)
+
+    def test_least_recently_used_evicted(self):
+        for number in range(3):
+            self.result_cache.put("v1", [number], number)
+            path = self.result_cache.get_path("v1", [number])
+            os.utime(path, ns=(number * 10**9, number * 10**9))
+        # Test case: read entry is kept, least recently used one deleted
+        self.assertEqual(self.result_cache.get("v1", [0]), 0)
+        self.result_cache.put("v1", [3], 3)
+        self.assertEqual(len(self.get_entries()), 3)
+        self.assertEqual(self.result_cache.get("v1", [0]), 0)
+        self.assertIs(self.result_cache.get("v1", [1]), ResultCache.MISSING)
+
+        # Test case: size limit
+        result_cache = ResultCache(self.cache_dir, max_bytes=100)
+        result_cache.put("v1", [4], "x" * 80)
+        self.assertEqual(
+            self.get_entries(),
+            [os.path.basename(self.result_cache.get_path("v1", [4]))],
+        )
+        result_cache.put("v1", [5], "x" * 200)
+        self.assertIs(result_cache.get("v1", [5]), ResultCache.MISSING)
+
+    def test_hash_files(self):
+        path = os.path.join(self.directory, "users.csv")
+        with open(path, "w") as file:
+            file.write("firstname\nTest1\n")
+        os.utime(path, ns=(10**9, 10**9))
+        fingerprint = ResultCache.hash_files([DataFile(path)])
+        self.assertEqual(ResultCache.hash_files([DataFile(path)]), fingerprint)
+
+        # Test case: size and mtime found with the file are used
+        self.assertEqual(
+            ResultCache.hash_files([DataFile(path, size=16, mtime_ns=10**9)]),
+            fingerprint,
+        )
+        # Test case: other format, modified file of the same size
+        self.assertNotEqual(
+            ResultCache.hash_files([DataFile(path, "csv")]), fingerprint
+        )
+        with open(path, "w") as file:
+            file.write("firstname\nTest2\n")
+        self.assertNotEqual(ResultCache.hash_files([DataFile(path)]), fingerprint)
+
+
+if __name__ == "__main__":
+    unittest.main()
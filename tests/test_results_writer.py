@@ -0,0 +1,89 @@
+import io
+import json
+import unittest
+from results_writer import ResultsWriter
+
+COLUMNS = ["firstname", "children"]
+RECORDS = [
+    {"firstname": "Test1", "children": [{"name": "Adam", "age": 1}], "role": "user"},
+    {"firstname": "Test2", "children": [], "role": "admin"},
+    {
+        "firstname": "Test3",
+        "children": [{"name": "Anna", "age": 3}, {"name": "Mark", "age": 6}],
+        "role": "user",
+    },
+]
+
+
+def text_format(record: dict) -> str:
+    return f"{record['firstname']}: {len(record['children'])}"
+
+
+class TestResultsWriter(unittest.TestCase):
+    def write(self, records, *args) -> str:
+        stream = io.StringIO()
+        ResultsWriter(*args, stream=stream).write_records(records, COLUMNS, text_format)
+        return stream.getvalue()
+
+    def test_text(self):
+        self.assertEqual(self.write(RECORDS), "Test1: 1\nTest2: 0\nTest3: 2\n")
+
+    def test_json(self):
+        # Test case: columns not in projection are left out
+        self.assertEqual(
+            json.loads(self.write(RECORDS, "json")),
+            [
+                {"firstname": "Test1", "children": [{"name": "Adam", "age": 1}]},
+                {"firstname": "Test2", "children": []},
+                {
+                    "firstname": "Test3",
+                    "children": [
+                        {"name": "Anna", "age": 3},
+                        {"name": "Mark", "age": 6},
+                    ],
+                },
+            ],
+        )
+        # Test case: no results
+        self.assertEqual(json.loads(self.write([], "json")), [])
+
+    def test_jsonl(self):
+        lines = self.write(RECORDS, "jsonl").splitlines()
+        self.assertEqual(
+            [json.loads(line)["firstname"] for line in lines],
+            ["Test1", "Test2", "Test3"],
+        )
+
+    def test_csv(self):
+        # Test case: children written like in CSV data files
+        self.assertEqual(
+            self.write(RECORDS, "csv"),
+            "firstname;children\nTest1;Adam (1)\nTest2;\nTest3;Anna (3),Mark (6)\n",
+        )
+
+    def test_limit_offset(self):
+        self.assertEqual(self.write(RECORDS, "text", 1, 1), "Test2: 0\n")
+        self.assertEqual(self.write(RECORDS, "text", None, 2), "Test3: 2\n")
+        self.assertEqual(self.write(RECORDS, "text", 5, 3), "")
+
+    def test_limit_stops_reading_records(self):
+        consumed = []
+
+        def records():
+            for record in RECORDS:
+                consumed.append(record["firstname"])
+                yield record
+
+        self.write(records(), "text", 1)
+        self.assertEqual(consumed, ["Test1"])
+
+    def test_buffered_write(self):
+        stream = io.StringIO()
+        writes = []
+        stream.write = writes.append
+        ResultsWriter(stream=stream).write_records(RECORDS, COLUMNS, text_format)
+        self.assertEqual(writes, ["Test1: 1\nTest2: 0\nTest3: 2\n"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,322 @@
+import io
+import math
+import os
+import tempfile
+import time
+import tracemalloc
+import unittest
+from itertools import count
+from typing import Callable, NamedTuple
+from unittest.mock import patch
+from actions import Actions
+from benchmarks.synthetic_data import generate_users, write_users
+from results_writer import ResultsWriter
+from users_backends import InMemoryUsersBackend, SqliteUsersBackend
+from users_data_exporter import UsersDataExporter
+from users_data_processor import process_users_data
+from users_data_utils import UsersDataExtractor, UsersDataFormatter, UsersDataMerger
+from users_db_loader import UsersDbLoader
+
+# Every stage runs at n and SCALE * n users. Time (best of REPEAT runs) and
+# tracemalloc peak may grow by the declared complexity times the slack.
+SCALING_USERS = int(os.environ.get("SCALING_TEST_USERS", "2000"))
+SCALE = 4
+REPEAT = 3
+TIME_SLACK = 2.5
+MEMORY_SLACK = 1.5
+# Smaller measurements are dominated by fixed costs and noise, e.g. output
+# buffers of up to 1 MiB
+MIN_SECONDS = 0.01
+MIN_PEAK_BYTES = 4 * 1024 * 1024
+
+
+def get_growth(complexity: str, users: int, scale: int) -> float:
+    log_growth = math.log(users * scale) / math.log(users)
+    return {
+        "1": 1.0,
+        "log n": log_growth,
+        "n": scale,
+        "n log n": scale * log_growth,
+    }[complexity]
+
+
+class Stage(NamedTuple):
+    name: str
+    time_complexity: str
+    memory_complexity: str
+    # Untimed setup, its result is passed to run
+    setup: Callable[[dict], object]
+    run: Callable[[object], object]
+
+
+def get_formatting_stage(data_format: str) -> Stage:
+    return Stage(
+        f"format-{data_format}",
+        "n",
+        "n",
+        lambda context: UsersDataExtractor(context[data_format]).extract_data(),
+        lambda data: UsersDataFormatter.for_data_format(data_format)(
+            data
+        ).process_data(),
+    )
+
+
+def load_in_memory_backend(users_data) -> InMemoryUsersBackend:
+    backend = InMemoryUsersBackend(users_data)
+    # Indexes are built on first use
+    for index in ["children_age_index", "created_at_index", "prefix_index"]:
+        getattr(backend, index)
+    return backend
+
+
+def get_command_stage(name: str, complexity: str, command: Callable) -> Stage:
+    return Stage(
+        f"command-{name}",
+        complexity,
+        complexity,
+        lambda context: context["actions"],
+        command,
+    )
+
+
+STAGES = [
+    Stage(
+        "extract-csv",
+        "n",
+        "n",
+        lambda context: UsersDataExtractor(context["csv"]),
+        lambda extractor: extractor.read_csv(),
+    ),
+    Stage(
+        "extract-json",
+        "n",
+        "n",
+        lambda context: UsersDataExtractor(context["json"]),
+        lambda extractor: list(extractor.read_json()),
+    ),
+    Stage(
+        "extract-xml",
+        "n",
+        "n",
+        lambda context: UsersDataExtractor(context["xml"]),
+        lambda extractor: extractor.parse_xml(),
+    ),
+    get_formatting_stage("csv"),
+    get_formatting_stage("json"),
+    get_formatting_stage("xml"),
+    Stage(
+        "merge-deduplicate",
+        "n log n",
+        "n",
+        lambda context: context["formatted_users"],
+        UsersDataMerger.process_merged_users_data,
+    ),
+    Stage(
+        "in-memory-backend-load",
+        "n log n",
+        "n",
+        lambda context: context["users_data"],
+        load_in_memory_backend,
+    ),
+    Stage(
+        "sqlite-create",
+        "n log n",
+        "n",
+        lambda context: (context["new_db_path"](), context["users_data"]),
+        lambda arguments: SqliteUsersBackend.create(*arguments),
+    ),
+    Stage(
+        "db-load",
+        "n log n",
+        "1",
+        lambda context: (context["new_db_path"](), context["csv"]),
+        lambda arguments: UsersDbLoader(arguments[0], batch_size=500).load(
+            [arguments[1]]
+        ),
+    ),
+    Stage(
+        "sqlite-find-user",
+        "log n",
+        "1",
+        lambda context: (context["db_backend"], context["logins"]),
+        lambda arguments: [
+            arguments[0].find_user(login, password) for login, password in arguments[1]
+        ],
+    ),
+    Stage(
+        "sqlite-children-of-age",
+        "n",
+        "n",
+        lambda context: context["db_backend"],
+        lambda backend: list(backend.find_users_with_children_of_age([3, 7, 12])),
+    ),
+    Stage(
+        "sqlite-count-and-histogram",
+        "1",
+        "1",
+        lambda context: context["db_backend"],
+        lambda backend: (backend.count_users(), backend.get_children_ages_histogram()),
+    ),
+    Stage(
+        "sqlite-search",
+        "n log n",
+        "n",
+        lambda context: context["db_backend"],
+        lambda backend: list(backend.search_users("jo")),
+    ),
+    Stage(
+        "results-writer-json",
+        "n",
+        "1",
+        lambda context: (context["users"], context["devnull"]),
+        lambda arguments: ResultsWriter("json", stream=arguments[1]).write_records(
+            iter(arguments[0]), ["firstname", "email", "children"], str
+        ),
+    ),
+    Stage(
+        "export-csv",
+        "n",
+        "1",
+        lambda context: (context["new_export_path"](), context["users_data"]),
+        lambda arguments: UsersDataExporter(arguments[0], "csv").export(arguments[1]),
+    ),
+    get_command_stage("print-children", "1", lambda actions: actions.print_children()),
+    get_command_stage(
+        "find-similar-children-by-age",
+        "n",
+        lambda actions: actions.find_similar_children_by_age(),
+    ),
+    get_command_stage(
+        "find-matching-families",
+        "n",
+        lambda actions: actions.find_matching_families("superset"),
+    ),
+    get_command_stage(
+        "print-all-accounts", "1", lambda actions: actions.print_all_accounts()
+    ),
+    get_command_stage(
+        "print-oldest-account", "n", lambda actions: actions.print_oldest_account()
+    ),
+    get_command_stage(
+        "group-by-age", "1", lambda actions: actions.group_children_by_age()
+    ),
+    get_command_stage(
+        "print-accounts-created",
+        "n",
+        lambda actions: actions.print_accounts_created(
+            "2010-01-01 00:00:00", "2030-01-01 00:00:00"
+        ),
+    ),
+    get_command_stage(
+        "search-users", "n log n", lambda actions: actions.search_users("jo")
+    ),
+]
+
+
+@unittest.skipUnless(
+    os.environ.get("SCALING_TESTS"), "set SCALING_TESTS=1 to run scaling tests"
+)
+class TestScaling(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.devnull = open(os.devnull, "w")
+        cls.contexts = [
+            cls.get_context(users) for users in [SCALING_USERS, SCALING_USERS * SCALE]
+        ]
+
+    @classmethod
+    def tearDownClass(cls):
+        for context in cls.contexts:
+            context["db_backend"].close()
+        cls.devnull.close()
+        cls.directory.cleanup()
+
+    @classmethod
+    def get_context(cls, users_count: int) -> dict:
+        directory = os.path.join(cls.directory.name, str(users_count))
+        os.mkdir(directory)
+        users = generate_users(users_count)
+        context = {"users": users, "devnull": cls.devnull}
+        for data_format in ["csv", "json", "xml"]:
+            context[data_format] = os.path.join(directory, f"users.{data_format}")
+            write_users(users, context[data_format], data_format)
+        context["formatted_users"] = UsersDataFormatter.for_data_format("csv")(
+            UsersDataExtractor(context["csv"]).read_csv()
+        ).process_data()
+        context["users_data"] = process_users_data([context["csv"]])
+        file_numbers = count()
+        context["new_db_path"] = lambda: os.path.join(
+            directory, f"users_{next(file_numbers)}.db"
+        )
+        context["new_export_path"] = lambda: os.path.join(
+            directory, f"export_{next(file_numbers)}.csv"
+        )
+        db_path = context["new_db_path"]()
+        SqliteUsersBackend.create(db_path, context["users_data"])
+        context["db_backend"] = SqliteUsersBackend(db_path)
+        context["logins"] = [(user["email"], user["password"]) for user in users[:200]]
+        admin = next(
+            user
+            for user in users
+            if user["role"] == "admin" and len(user["children"]) > 1
+        )
+        backend = InMemoryUsersBackend(context["users_data"])
+        missing_path = os.path.join(directory, "missing")
+        with patch("actions.load_users_backend", lambda *args: backend), patch(
+            "actions.db", missing_path
+        ), patch("actions.db_manifest", missing_path), patch(
+            "actions.snapshot", missing_path
+        ):
+            context["actions"] = Actions(
+                login=admin["email"],
+                password=admin["password"],
+                output=ResultsWriter(stream=cls.devnull),
+            )
+        return context
+
+    @staticmethod
+    def measure(stage: Stage, context: dict) -> tuple:
+        seconds = []
+        for _ in range(REPEAT):
+            argument = stage.setup(context)
+            started = time.perf_counter()
+            stage.run(argument)
+            seconds.append(time.perf_counter() - started)
+        argument = stage.setup(context)
+        tracemalloc.start()
+        try:
+            stage.run(argument)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return max(min(seconds), MIN_SECONDS), max(peak, MIN_PEAK_BYTES)
+
+    def test_stages_within_complexity_budget(self):
+        for stage in STAGES:
+            with self.subTest(stage=stage.name), patch("sys.stdout", io.StringIO()):
+                (seconds, peak), (scaled_seconds, scaled_peak) = [
+                    self.measure(stage, context) for context in self.contexts
+                ]
+                time_budget = get_growth(stage.time_complexity, SCALING_USERS, SCALE)
+                memory_budget = get_growth(
+                    stage.memory_complexity, SCALING_USERS, SCALE
+                )
+                self.assertLessEqual(
+                    scaled_seconds / seconds,
+                    time_budget * TIME_SLACK,
+                    f"{stage.name}: time grew {scaled_seconds / seconds:.2f}x "
+                    f"({seconds:.3f} s to {scaled_seconds:.3f} s) for {SCALE}x users, "
+                    f"budget O({stage.time_complexity})",
+                )
+                self.assertLessEqual(
+                    scaled_peak / peak,
+                    memory_budget * MEMORY_SLACK,
+                    f"{stage.name}: memory peak grew {scaled_peak / peak:.2f}x "
+                    f"({peak} to {scaled_peak} bytes) for {SCALE}x users, "
+                    f"budget O({stage.memory_complexity})",
+                )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import base64
+import json
+import os
+import stat
+import tempfile
+import unittest
+from unittest.mock import patch
+from session_store import SessionStore
+
+
+class TestSessionStore(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.session_path = os.path.join(self.directory, "private", "session")
+        self.session_store = SessionStore(
+            self.session_path, os.path.join(self.directory, "private", "session.key")
+        )
+
+    def test_create_and_load(self):
+        session = self.session_store.create("222222222", "admin", "version1")
+        self.assertEqual(self.session_store.load("version1"), session)
+        self.assertEqual(session.login, "222222222")
+        self.assertEqual(session.role, "admin")
+
+        # Test case: files readable by owner only
+        for path in [self.session_path, self.session_store.key_path]:
+            self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o600)
+        self.assertEqual(
+            stat.S_IMODE(os.stat(os.path.dirname(self.session_path)).st_mode), 0o700
+        )
+
+    def test_load_invalid_session(self):
+        # Test case: no session
+        self.assertIsNone(self.session_store.load("version1"))
+
+        # Test case: other dataset version
+        self.session_store.create("222222222", "admin", "version1")
+        self.assertIsNone(self.session_store.load("version2"))
+
+        # Test case: role changed, signed with another key
+        self.session_store.create("888888888", "user", "version1")
+        forged_session = self.session_store.load("version1")._replace(role="admin")
+        forged_payload = base64.urlsafe_b64encode(
+            json.dumps(forged_session._asdict()).encode()
+        )
+        with open(self.session_path, "wb") as file:
+            file.write(
+                forged_payload
+                + b"."
+                + SessionStore.sign(b"0" * 32, forged_payload).encode()
+            )
+        self.assertIsNone(self.session_store.load("version1"))
+
+        # Test case: not a token
+        with open(self.session_path, "w") as file:
+            file.write("not a token")
+        self.assertIsNone(self.session_store.load("version1"))
+
+    def test_load_expired_session(self):
+        self.session_store.create("222222222", "admin", "version1")
+        with patch("time.time", lambda: 2**40):
+            self.assertIsNone(self.session_store.load("version1"))
+
+    def test_delete(self):
+        self.session_store.create("222222222", "admin", "version1")
+        self.session_store.delete()
+        self.assertIsNone(self.session_store.load("version1"))
+        self.session_store.delete()
+
+    def test_get_dataset_version(self):
+        path = os.path.join(self.directory, "users.csv")
+        missing_path = os.path.join(self.directory, "missing.csv")
+        with open(path, "w") as file:
+            file.write("firstname\n")
+        version = SessionStore.get_dataset_version([path, missing_path])
+        self.assertEqual(version, SessionStore.get_dataset_version([path]))
+        with open(path, "a") as file:
+            file.write("Test1\n")
+        self.assertNotEqual(version, SessionStore.get_dataset_version([path]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from snapshot_store import SnapshotError, UsersSnapshot
+from tests.data.users_test_data_processor import test_final_users_data
+
+
+class TestUsersSnapshot(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.path = os.path.join(cls.directory.name, "users_snapshot.bin")
+        UsersSnapshot.build(test_final_users_data, cls.path)
+        cls.snapshot = UsersSnapshot(cls.path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.snapshot.close()
+        cls.directory.cleanup()
+
+    def test_users(self):
+        # Test case: every user stored in the order of merged data
+        self.assertEqual(len(self.snapshot), len(test_final_users_data))
+        for user_id, user in enumerate(test_final_users_data.to_dict(orient="records")):
+            self.assertEqual(
+                self.snapshot.get_user(user_id),
+                {**user, "children": user["children"] or []},
+            )
+
+    def test_find_user_by_login(self):
+        # Test case: login with email and with telephone number
+        user_id = self.snapshot.find_user_by_login("test8@example.com", "dQbafj:B:&")
+        self.assertEqual(self.snapshot.get_string("firstname", user_id), "Test8")
+        self.assertEqual(
+            self.snapshot.find_user_by_login("888888888", "dQbafj:B:&"), user_id
+        )
+
+        # Test case: incorrect password, unknown login
+        self.assertIs(self.snapshot.find_user_by_login("888888888", "wrong"), None)
+        self.assertIs(self.snapshot.find_user_by_login("000000000", "dQbafj:B:&"), None)
+
+    def test_might_have_login(self):
+        self.assertTrue(self.snapshot.might_have_login("test8@example.com"))
+        self.assertFalse(self.snapshot.might_have_login("unknown@example.org"))
+
+        # Test case: snapshot built before the login filter
+        snapshot = UsersSnapshot(self.path)
+        self.addCleanup(snapshot.close)
+        snapshot.login_filter_hashes = None
+        self.assertTrue(snapshot.might_have_login("unknown@example.org"))
+
+    def test_get_oldest_user_id(self):
+        user_id = self.snapshot.get_oldest_user_id()
+        self.assertEqual(self.snapshot.get_string("firstname", user_id), "Test1")
+
+    def test_iter_created_between(self):
+        # Test case: bounds are inclusive, pages keep created_at order
+        pages = list(
+            self.snapshot.iter_created_between(
+                "2011-03-18 05:21:11", "2014-03-21 01:21:01", page_size=3
+            )
+        )
+        self.assertEqual([len(page) for page in pages], [3, 1])
+        self.assertEqual(
+            [
+                self.snapshot.get_string("firstname", user_id)
+                for page in pages
+                for user_id in page
+            ],
+            ["Test2", "Test3", "Test4", "Test5"],
+        )
+
+    def test_find_users_with_children_of_age(self):
+        user_ids = self.snapshot.find_users_with_children_of_age([14, 9])
+        self.assertEqual(
+            sorted(
+                self.snapshot.get_string("firstname", user_id) for user_id in user_ids
+            ),
+            ["Test10", "Test8", "Test9"],
+        )
+        self.assertEqual(self.snapshot.find_users_with_children_of_age([]), [])
+
+    def test_find_users_with_children_ages(self):
+        def get_firstnames() -> list:
+            return [
+                self.snapshot.get_string("firstname", user_id)
+                for user_id in self.snapshot.find_users_with_children_ages([6, 1])
+            ]
+
+        self.assertEqual(get_firstnames(), ["Test7", "Test5"])
+        # Test case: snapshot built before the signatures
+        with patch.dict(self.snapshot.sections):
+            del self.snapshot.sections["children_signature_order"]
+            self.assertEqual(get_firstnames(), ["Test7", "Test5"])
+
+    def test_get_children_ages_histogram(self):
+        self.assertEqual(
+            self.snapshot.get_children_ages_histogram(),
+            [(1, 4), (3, 2), (6, 3), (9, 3), (14, 2)],
+        )
+
+    def test_version(self):
+        path = os.path.join(self.directory.name, "rebuilt_snapshot.bin")
+        UsersSnapshot.build(test_final_users_data, path)
+        users_snapshot = UsersSnapshot(path)
+        version = users_snapshot.version
+        users_snapshot.close()
+
+        # Test case: rebuilt snapshot has another version
+        UsersSnapshot.build(test_final_users_data, path)
+        users_snapshot = UsersSnapshot(path)
+        self.addCleanup(users_snapshot.close)
+        self.assertNotEqual(users_snapshot.version, version)
+
+    def test_invalid_file(self):
+        # Test case: file that is not a snapshot
+        with self.assertRaises(SnapshotError):
+            UsersSnapshot("./data/test_data.csv")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,700 @@
+from contextlib import closing
+import itertools
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+from pandas import DataFrame
+from snapshot_store import UsersSnapshot
+from users_backends import (
+    BackendError,
+    Deadline,
+    InMemoryUsersBackend,
+    QueryTimeout,
+    ShardedSqliteUsersBackend,
+    SnapshotUsersBackend,
+    SqliteUsersBackend,
+)
+from users_data_index import get_children_ages_signature
+from tests.data.users_test_data_processor import test_final_users_data
+
+
+class UsersBackendTests:
+    # Same expectations for every backend, subclasses create self.backend
+    def test_find_user(self):
+        # Test case: login with telephone number and with email
+        user = self.backend.find_user("888888888", "dQbafj:B:&")
+        self.assertEqual(user["firstname"], "Test8")
+        self.assertEqual(user["role"], "user")
+        self.assertEqual(
+            self.backend.find_user("test8@example.com", "dQbafj:B:&")["email"],
+            "test8@example.com",
+        )
+
+        # Test case: incorrect password, unknown login
+        self.assertIs(self.backend.find_user("888888888", "wrong"), None)
+        self.assertIs(self.backend.find_user("000000000", "dQbafj:B:&"), None)
+
+    def test_might_have_login(self):
+        # Test case: every email and telephone number passes the login filter
+        for user in test_final_users_data.to_dict(orient="records"):
+            self.assertTrue(self.backend.might_have_login(user["email"]))
+            self.assertTrue(self.backend.might_have_login(user["telephone_number"]))
+
+        # Test case: unknown logins rejected up to the false positive rate
+        unknown_logins = [f"unknown{number}@example.org" for number in range(100)]
+        self.assertLess(sum(map(self.backend.might_have_login, unknown_logins)), 10)
+
+    def test_get_children(self):
+        children = self.backend.get_children("888888888", "dQbafj:B:&")
+        self.assertCountEqual(
+            children,
+            [
+                {"name": "Robert", "age": 14},
+                {"name": "Alex", "age": 6},
+                {"name": "Harry", "age": 9},
+            ],
+        )
+
+        # Test case: user without children, incorrect password
+        self.assertIs(self.backend.get_children("222222222", "7GRMc-fg42"), None)
+        self.assertIs(self.backend.get_children("888888888", "wrong"), None)
+
+    def test_find_users_with_children_of_age(self):
+        users = list(self.backend.find_users_with_children_of_age([14, 9]))
+        self.assertEqual(
+            sorted(user["firstname"] for user in users), ["Test10", "Test8", "Test9"]
+        )
+        for user in users:
+            self.assertTrue(any(child["age"] in [14, 9] for child in user["children"]))
+        self.assertEqual(list(self.backend.find_users_with_children_of_age([])), [])
+
+    def test_find_users_with_children_ages(self):
+        def get_firstnames(ages: list, superset: bool = False) -> list:
+            return [
+                user["firstname"]
+                for user in self.backend.find_users_with_children_ages(ages, superset)
+            ]
+
+        # Test case: same ages in any order, in merged data order
+        self.assertEqual(get_firstnames([9, 14]), ["Test10"])
+        self.assertEqual(get_firstnames([1, 6]), ["Test7", "Test5"])
+        self.assertEqual(get_firstnames([1]), ["Test1"])
+        self.assertEqual(get_firstnames([6]), [])
+        self.assertEqual(get_firstnames([]), [])
+
+        # Test case: superset, repeated ages counted
+        self.assertEqual(get_firstnames([6, 9], superset=True), ["Test8"])
+        self.assertEqual(
+            get_firstnames([1], superset=True), ["Test7", "Test5", "Test4", "Test1"]
+        )
+        self.assertEqual(get_firstnames([1, 1], superset=True), [])
+        user = next(self.backend.find_users_with_children_ages([6, 9], superset=True))
+        self.assertCountEqual([child["age"] for child in user["children"]], [14, 6, 9])
+
+    def test_get_children_ages_histogram(self):
+        self.assertEqual(
+            [tuple(bucket) for bucket in self.backend.get_children_ages_histogram()],
+            [(1, 4), (3, 2), (6, 3), (9, 3), (14, 2)],
+        )
+
+    def test_count_users(self):
+        self.assertEqual(self.backend.count_users(), 10)
+
+    def test_get_oldest_user(self):
+        oldest_user = self.backend.get_oldest_user()
+        self.assertEqual(oldest_user["firstname"], "Test1")
+        self.assertEqual(oldest_user["created_at"], "2010-01-21 21:21:01")
+
+    def test_iter_accounts_created(self):
+        # Test case: inclusive bounds, pages in created_at order
+        pages = list(
+            self.backend.iter_accounts_created(
+                "2011-03-18 05:21:11", "2014-03-21 01:21:01", page_size=3
+            )
+        )
+        self.assertEqual(
+            [account["firstname"] for page in pages for account in page],
+            ["Test2", "Test3", "Test4", "Test5"],
+        )
+        self.assertTrue(all(len(page) <= 3 for page in pages))
+
+        # Test case: role filter, empty range
+        pages = list(
+            self.backend.iter_accounts_created(
+                "2011-03-18 05:21:11", "2014-03-21 01:21:01", "user"
+            )
+        )
+        self.assertEqual(
+            [account["email"] for page in pages for account in page],
+            ["test4@example.com"],
+        )
+        self.assertEqual(
+            list(
+                self.backend.iter_accounts_created(
+                    "2000-01-01 00:00:00", "2001-01-01 00:00:00"
+                )
+            ),
+            [],
+        )
+
+    def test_search_users(self):
+        def search(query):
+            return [user["firstname"] for user in self.backend.search_users(query)]
+
+        # Test case: closest completions first, then merged data order
+        self.assertEqual(search("test1"), ["Test1", "Test10"])
+        self.assertEqual(
+            search("TEST"),
+            ["Test9", "Test8", "Test7", "Test6", "Test5"]
+            + ["Test4", "Test3", "Test2", "Test1", "Test10"],
+        )
+        # Test case: every word has to match, in any column
+        self.assertEqual(search("test8@example.com"), ["Test8"])
+        self.assertEqual(search("exam 12312"), ["Test10"])
+        self.assertEqual(search("test8 12312"), [])
+        # Test case: no words
+        self.assertEqual(search(" @. "), [])
+        # Test case: only the best matches up to the limit
+        self.assertEqual(
+            [user["firstname"] for user in self.backend.search_users("test", 3)],
+            ["Test9", "Test8", "Test7"],
+        )
+        self.assertEqual(
+            [user["firstname"] for user in self.backend.search_users("test1", 1)],
+            ["Test1"],
+        )
+        user = next(self.backend.search_users("999999999"))
+        self.assertEqual(
+            {key: user[key] for key in ["email", "role", "created_at"]},
+            {
+                "email": "test9@example.com",
+                "role": "user",
+                "created_at": "2021-07-21 21:21:01",
+            },
+        )
+
+    def test_expired_deadline(self):
+        self.backend.set_deadline(Deadline(0))
+        with self.assertRaises(QueryTimeout):
+            list(self.backend.find_users_with_children_of_age([6]))
+        with self.assertRaises(QueryTimeout):
+            list(self.backend.search_users("test"))
+        with self.assertRaises(QueryTimeout):
+            list(
+                self.backend.iter_accounts_created(
+                    "2000-01-01 00:00:00", "2030-01-01 00:00:00"
+                )
+            )
+        # Test case: queries run again without deadline
+        self.backend.set_deadline(None)
+        self.assertEqual(len(list(self.backend.search_users("test"))), 10)
+
+
+class TestInMemoryUsersBackend(UsersBackendTests, unittest.TestCase):
+    def setUp(self):
+        self.backend = InMemoryUsersBackend(test_final_users_data)
+
+    def test_empty_users_data(self):
+        backend = InMemoryUsersBackend(DataFrame())
+        self.assertEqual(backend.count_users(), 0)
+        self.assertIs(backend.get_oldest_user(), None)
+        self.assertIs(backend.find_user("888888888", "dQbafj:B:&"), None)
+        self.assertEqual(backend.get_children_ages_histogram(), [])
+
+
+class TestSqliteUsersBackend(UsersBackendTests, unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.db_path = os.path.join(cls.directory.name, "users_db.db")
+        SqliteUsersBackend.create(cls.db_path, test_final_users_data)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def setUp(self):
+        self.backend = SqliteUsersBackend(self.db_path)
+        self.addCleanup(self.backend.close)
+
+    def test_failed_load_rolled_back(self):
+        # Test case: an invalid user rolls back every user
+        db_path = os.path.join(self.directory.name, "failed_users_db.db")
+        users_data = test_final_users_data.copy()
+        users_data.loc[users_data.index[3], "firstname"] = None
+        with self.assertRaises(BackendError):
+            SqliteUsersBackend.create(db_path, users_data)
+        with closing(sqlite3.connect(db_path)) as db_conn:
+            for table in ["users_data", "users_children"]:
+                self.assertEqual(
+                    db_conn.execute(f"SELECT COUNT(*) FROM {table};").fetchone()[0], 0
+                )
+
+    def test_created_in_wal_mode(self):
+        with closing(sqlite3.connect(self.db_path)) as db_conn:
+            journal_mode = db_conn.execute("PRAGMA journal_mode;").fetchone()[0]
+        self.assertEqual(journal_mode, "wal")
+
+    def test_read_only_connection(self):
+        cursor = self.backend.get_cursor()
+        self.assertEqual(
+            cursor.execute("PRAGMA busy_timeout;").fetchone()[0],
+            SqliteUsersBackend.BUSY_TIMEOUT,
+        )
+        with self.assertRaises(sqlite3.OperationalError):
+            cursor.execute("DELETE FROM users_data;")
+
+    def test_progress_handler_interrupts_query(self):
+        self.backend.PROGRESS_STEPS = 1
+        self.backend.set_deadline(Deadline(0))
+        with self.assertRaises(QueryTimeout):
+            self.backend.get_children_ages_histogram()
+        # Test case: deadline set before connecting
+        backend = SqliteUsersBackend(self.db_path)
+        self.addCleanup(backend.close)
+        backend.set_deadline(Deadline(0.05))
+        with self.assertRaisesRegex(sqlite3.OperationalError, "interrupted"):
+            backend.get_cursor().execute(
+                "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) "
+                "SELECT count(*) FROM n;"
+            )
+        # Test case: queries run again without deadline
+        self.backend.set_deadline(None)
+        self.assertEqual(self.backend.count_users(), 10)
+
+    def test_read_during_write_transaction(self):
+        # Test case: open write transaction doesn't block or fail readers
+        with closing(SqliteUsersBackend.connect(self.db_path)) as writer:
+            writer.execute("BEGIN IMMEDIATE;")
+            writer.execute("DELETE FROM users_children;")
+            writer.execute("DELETE FROM users_data;")
+            self.assertEqual(self.backend.count_users(), 10)
+            self.assertEqual(
+                len(self.backend.get_children("888888888", "dQbafj:B:&")), 3
+            )
+            writer.rollback()
+
+
+class TestSqliteSummaryTables(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.db_path = os.path.join(directory.name, "users_db.db")
+        SqliteUsersBackend.create(self.db_path, test_final_users_data)
+        self.writer = SqliteUsersBackend.connect(self.db_path)
+        self.addCleanup(self.writer.close)
+
+    def get_aggregates(self, backend: SqliteUsersBackend) -> tuple:
+        oldest_user = backend.get_oldest_user()
+        return (
+            backend.count_users(),
+            backend.get_children_ages_histogram(),
+            oldest_user["created_at"] if oldest_user else None,
+        )
+
+    def assert_summaries_match_tables(self):
+        backend = SqliteUsersBackend(self.db_path)
+        self.addCleanup(backend.close)
+        full_scan_backend = SqliteUsersBackend(self.db_path)
+        full_scan_backend.summary_tables_available = False
+        self.addCleanup(full_scan_backend.close)
+        self.assertEqual(
+            self.get_aggregates(backend), self.get_aggregates(full_scan_backend)
+        )
+
+    def test_summary_tables_follow_changes(self):
+        self.assert_summaries_match_tables()
+
+        # Test case: new oldest user with children
+        with self.writer:
+            cursor = self.writer.execute("""INSERT INTO users_data
+                    (email, firstname, telephone_number, password, role, created_at)
+                    VALUES ('new@example.com', 'New', '101010101', 'pass', 'user',
+                    '2000-01-01 00:00:00');""")
+            self.writer.executemany(
+                """INSERT INTO users_children (parent_id, child_name, child_age)
+                    VALUES (?, ?, ?);""",
+                [(cursor.lastrowid, "Ann", 1), (cursor.lastrowid, "Tom", 17)],
+            )
+        self.assert_summaries_match_tables()
+        backend = SqliteUsersBackend(self.db_path)
+        self.addCleanup(backend.close)
+        self.assertEqual(backend.get_oldest_user()["firstname"], "New")
+
+        # Test case: updated and deleted children, deleted oldest user
+        with self.writer:
+            self.writer.execute(
+                "UPDATE users_children SET child_age = 2 WHERE child_age = 3;"
+            )
+            self.writer.execute("DELETE FROM users_children WHERE child_age = 17;")
+            self.writer.execute(
+                "DELETE FROM users_data WHERE email = 'new@example.com';"
+            )
+        self.assert_summaries_match_tables()
+
+        # Test case: created_at updated
+        with self.writer:
+            self.writer.execute(
+                """UPDATE users_data SET created_at = '1999-01-01 00:00:00'
+                    WHERE telephone_number = '999999999';"""
+            )
+        self.assert_summaries_match_tables()
+
+    def test_check_summary_tables(self):
+        backend = SqliteUsersBackend(self.db_path, read_only=False)
+        self.addCleanup(backend.close)
+        self.assertEqual(backend.check_summary_tables(), [])
+
+        # Test case: summaries out of step with users tables
+        with self.writer:
+            self.writer.execute("UPDATE users_summary SET total_accounts = 3;")
+            self.writer.execute("UPDATE users_summary SET oldest_user_id = 5;")
+            self.writer.execute("DELETE FROM children_ages_summary;")
+        self.assertEqual(
+            backend.check_summary_tables(),
+            ["accounts count", "children ages histogram", "oldest account"],
+        )
+        self.assertEqual(backend.check_summary_tables(), [])
+        self.assert_summaries_match_tables()
+
+    def test_login_filter_follows_changes(self):
+        backend = SqliteUsersBackend(self.db_path, read_only=False)
+        self.addCleanup(backend.close)
+        self.assertFalse(backend.might_have_login("new@example.com"))
+
+        # Test case: new login deletes the filter, check-database rebuilds it
+        with self.writer:
+            self.writer.execute(
+                "INSERT INTO users_data (email, firstname, telephone_number, "
+                "password, role, created_at) VALUES ('new@example.com', 'New', "
+                "'101010101', 'pass', 'user', '2000-01-01 00:00:00');"
+            )
+        new_backend = SqliteUsersBackend(self.db_path)
+        self.addCleanup(new_backend.close)
+        self.assertTrue(new_backend.might_have_login("new@example.com"))
+        self.assertTrue(new_backend.might_have_login("unknown@example.org"))
+        self.assertIn("login filter", backend.check_summary_tables())
+        self.assertEqual(backend.check_summary_tables(), [])
+        self.assertTrue(backend.might_have_login("new@example.com"))
+        self.assertFalse(backend.might_have_login("unknown@example.org"))
+
+    def test_data_version_follows_changes(self):
+        backend = SqliteUsersBackend(self.db_path)
+        self.addCleanup(backend.close)
+        data_version = backend.get_data_version()
+        self.assertIsNotNone(data_version)
+        self.assertEqual(backend.get_data_version(), data_version)
+
+        # Test case: any change of users or children bumps the version
+        with self.writer:
+            self.writer.execute(
+                "UPDATE users_children SET child_age = 2 WHERE child_age = 1;"
+            )
+        self.assertNotEqual(backend.get_data_version(), data_version)
+
+        # Test case: database created again from the same data
+        other_path = os.path.join(os.path.dirname(self.db_path), "other_db.db")
+        SqliteUsersBackend.create(other_path, test_final_users_data)
+        other_backend = SqliteUsersBackend(other_path)
+        self.addCleanup(other_backend.close)
+        self.assertNotEqual(
+            other_backend.get_data_version().split(":")[0], data_version.split(":")[0]
+        )
+
+        # Test case: database created before the version table
+        with self.writer:
+            self.writer.execute("DROP TABLE users_data_version;")
+        self.assertIsNone(backend.get_data_version())
+        writable_backend = SqliteUsersBackend(self.db_path, read_only=False)
+        self.addCleanup(writable_backend.close)
+        writable_backend.check_summary_tables()
+        self.assertIsNotNone(backend.get_data_version())
+
+    def test_children_signatures_follow_changes(self):
+        def get_signatures() -> list:
+            return self.writer.execute(
+                "SELECT user_id, signature FROM users_children_signature "
+                "ORDER BY user_id;"
+            ).fetchall()
+
+        # Test case: new, changed and deleted children, ages in any order
+        with self.writer:
+            self.writer.execute(
+                "INSERT INTO users_children (parent_id, child_name, child_age) "
+                "VALUES (1, 'New', 2), (2, 'Other', 10);"
+            )
+            self.writer.execute(
+                "UPDATE users_children SET child_age = 4, parent_id = 6 "
+                "WHERE parent_id = 3 AND child_age = 14;"
+            )
+            self.writer.execute("DELETE FROM users_children WHERE parent_id = 4;")
+        children_ages = {}
+        for parent_id, child_age in self.writer.execute(
+            "SELECT parent_id, child_age FROM users_children;"
+        ):
+            children_ages.setdefault(parent_id, []).append(child_age)
+        expected_signatures = [
+            (user_id, get_children_ages_signature(ages))
+            for user_id, ages in sorted(children_ages.items())
+        ]
+        self.assertEqual(get_signatures(), expected_signatures)
+        backend = SqliteUsersBackend(self.db_path, read_only=False)
+        self.addCleanup(backend.close)
+        self.assertEqual(backend.check_summary_tables(), [])
+
+        # Test case: stale signatures recomputed by the consistency check
+        with self.writer:
+            self.writer.execute("DELETE FROM users_children_signature;")
+        self.assertEqual(backend.check_summary_tables(), ["children ages signatures"])
+        self.assertEqual(get_signatures(), expected_signatures)
+
+    def test_children_signature_in_age_order(self):
+        # Test case: triggers of older databases replaced by the consistency check
+        with self.writer:
+            self.writer.execute("DROP TRIGGER users_children_signature_after_insert;")
+            self.writer.execute(
+                "CREATE TRIGGER users_children_signature_after_insert "
+                "AFTER INSERT ON users_children BEGIN SELECT 1; END;"
+            )
+        writable_backend = SqliteUsersBackend(self.db_path, read_only=False)
+        self.addCleanup(writable_backend.close)
+        writable_backend.check_summary_tables()
+        # Test case: children added oldest first get an ascending signature
+        with self.writer:
+            self.writer.execute("DELETE FROM users_children WHERE parent_id = 5;")
+            for child_age in [12, 7, 7, 3]:
+                self.writer.execute(
+                    "INSERT INTO users_children (parent_id, child_name, child_age) "
+                    "VALUES (5, 'Child', ?);",
+                    (child_age,),
+                )
+        self.assertEqual(
+            self.writer.execute(
+                "SELECT signature FROM users_children_signature WHERE user_id = 5;"
+            ).fetchone(),
+            ("3,7,7,12",),
+        )
+        backend = SqliteUsersBackend(self.db_path)
+        self.addCleanup(backend.close)
+        self.assertEqual(
+            [
+                user["telephone_number"]
+                for user in backend.find_users_with_children_ages([7, 12, 3, 7])
+            ],
+            [
+                telephone_number
+                for telephone_number, in self.writer.execute(
+                    "SELECT telephone_number FROM users_data WHERE user_id = 5;"
+                )
+            ],
+        )
+
+    def test_database_without_children_signatures(self):
+        with self.writer:
+            self.writer.execute("DROP TABLE users_children_signature;")
+            for event in ["insert", "update", "delete"]:
+                self.writer.execute(
+                    f"DROP TRIGGER users_children_signature_after_{event};"
+                )
+            self.writer.execute(
+                "DROP TRIGGER users_data_children_signature_after_delete;"
+            )
+        backend = SqliteUsersBackend(self.db_path)
+        self.addCleanup(backend.close)
+        # Test case: exact profiles found by full scan
+        self.assertEqual(
+            [
+                user["firstname"]
+                for user in backend.find_users_with_children_ages([6, 1])
+            ],
+            ["Test7", "Test5"],
+        )
+
+    def test_database_without_summary_tables(self):
+        # Test case: database created before summary tables and triggers
+        with self.writer:
+            triggers = self.writer.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger';"
+            ).fetchall()
+            for (trigger,) in triggers:
+                self.writer.execute(f"DROP TRIGGER {trigger};")
+            for table in [
+                "users_summary",
+                "children_ages_summary",
+                "users_login_filter",
+            ]:
+                self.writer.execute(f"DROP TABLE {table};")
+        backend = SqliteUsersBackend(self.db_path)
+        self.addCleanup(backend.close)
+        self.assertEqual(
+            self.get_aggregates(backend),
+            (10, [(1, 4), (3, 2), (6, 3), (9, 3), (14, 2)], "2010-01-21 21:21:01"),
+        )
+
+        # Test case: consistency check creates and fills missing summaries
+        writable_backend = SqliteUsersBackend(self.db_path, read_only=False)
+        self.addCleanup(writable_backend.close)
+        self.assertTrue(backend.might_have_login("unknown@example.org"))
+        self.assertEqual(
+            writable_backend.check_summary_tables(),
+            [
+                "accounts count",
+                "children ages histogram",
+                "oldest account",
+                "login filter",
+            ],
+        )
+        self.assert_summaries_match_tables()
+
+
+class TestSqliteSearchTable(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.db_path = os.path.join(directory.name, "users_db.db")
+        SqliteUsersBackend.create(self.db_path, test_final_users_data)
+        self.writer = SqliteUsersBackend.connect(self.db_path)
+        self.addCleanup(self.writer.close)
+
+    def search(self, backend: SqliteUsersBackend, query: str) -> list:
+        return [user["email"] for user in backend.search_users(query)]
+
+    def test_search_table_follows_changes(self):
+        with self.writer:
+            self.writer.execute(
+                "UPDATE users_data SET firstname = 'Zofia' WHERE firstname = 'Test3';"
+            )
+            self.writer.execute("DELETE FROM users_data WHERE firstname = 'Test4';")
+        backend = SqliteUsersBackend(self.db_path)
+        self.addCleanup(backend.close)
+        self.assertEqual(self.search(backend, "zof"), ["test3@example.com"])
+        self.assertEqual(self.search(backend, "test4"), [])
+        self.assertEqual(len(self.search(backend, "test")), 9)
+        with self.writer:
+            self.writer.execute(
+                "INSERT INTO users_search (users_search) VALUES ('integrity-check');"
+            )
+
+    def test_database_without_search_table(self):
+        # Test case: database created before the search table is scanned
+        with self.writer:
+            for trigger in ["insert", "delete", "update"]:
+                self.writer.execute(f"DROP TRIGGER users_data_search_after_{trigger};")
+            self.writer.execute("DROP TABLE users_search;")
+        backend = SqliteUsersBackend(self.db_path)
+        self.addCleanup(backend.close)
+        self.assertEqual(
+            self.search(backend, "test1"), ["test1@example.com", "test10@example.com"]
+        )
+        self.assertFalse(backend.search_table_available)
+
+
+class TestShardedSqliteUsersBackend(UsersBackendTests, unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.manifest_path = os.path.join(cls.directory.name, "users_db.manifest.json")
+        ShardedSqliteUsersBackend.create(cls.manifest_path, test_final_users_data, 3)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def setUp(self):
+        self.backend = ShardedSqliteUsersBackend(self.manifest_path)
+        self.addCleanup(self.backend.close)
+
+    def test_manifest(self):
+        with open(self.manifest_path) as file:
+            manifest = json.load(file)
+        self.assertEqual(manifest["partition_key"], "telephone_number")
+        self.assertEqual(
+            [shard["path"] for shard in manifest["shards"]],
+            ["users_db-shard0.db", "users_db-shard1.db", "users_db-shard2.db"],
+        )
+        # Test case: users inserted into every shard
+        self.assertEqual(
+            [shard["users"] for shard in manifest["shards"]],
+            [shard.count_users() for shard in self.backend.shards],
+        )
+        self.assertEqual(sum(shard["users"] for shard in manifest["shards"]), 10)
+
+    def test_users_partitioned_by_telephone_number(self):
+        for shard_number, shard in enumerate(self.backend.shards):
+            for account in itertools.chain.from_iterable(
+                shard.iter_accounts_created("0", "9")
+            ):
+                self.assertEqual(
+                    ShardedSqliteUsersBackend.get_shard_number(
+                        account["telephone_number"], 3
+                    ),
+                    shard_number,
+                )
+
+    def test_same_order_as_single_database(self):
+        single_backend = InMemoryUsersBackend(test_final_users_data)
+        self.assertEqual(
+            [
+                user["telephone_number"]
+                for user in self.backend.find_users_with_children_of_age([1, 6, 14])
+            ],
+            [
+                user["telephone_number"]
+                for user in single_backend.find_users_with_children_of_age([1, 6, 14])
+            ],
+        )
+
+    def test_login_filter_skips_shards(self):
+        # Test case: email logins are looked up only in shards that have them
+        self.assertEqual(
+            self.backend.get_login_shards("test8@example.com"),
+            [
+                self.backend.shards[
+                    ShardedSqliteUsersBackend.get_shard_number("888888888", 3)
+                ]
+            ],
+        )
+        self.assertEqual(self.backend.get_login_shards("unknown@example.org"), [])
+
+    def test_data_version(self):
+        self.assertEqual(
+            self.backend.get_data_version().split(","),
+            [shard.get_data_version() for shard in self.backend.shards],
+        )
+
+    def test_invalid_manifest(self):
+        with self.assertRaises(BackendError):
+            ShardedSqliteUsersBackend("./data/final_test_data.csv")
+
+    def test_failed_shard_load(self):
+        # Test case: an invalid user fails the load, no shards nor manifest left
+        with tempfile.TemporaryDirectory() as directory:
+            manifest_path = os.path.join(directory, "users_db.manifest.json")
+            users_data = test_final_users_data.copy()
+            users_data.loc[users_data.index[3], "firstname"] = None
+            with self.assertRaises(BackendError):
+                ShardedSqliteUsersBackend.create(manifest_path, users_data, 3)
+            self.assertEqual(os.listdir(directory), [])
+
+
+class TestSnapshotUsersBackend(UsersBackendTests, unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        snapshot_path = os.path.join(cls.directory.name, "users_snapshot.bin")
+        UsersSnapshot.build(test_final_users_data, snapshot_path)
+        cls.snapshot = UsersSnapshot(snapshot_path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.snapshot.close()
+        cls.directory.cleanup()
+
+    def setUp(self):
+        self.backend = SnapshotUsersBackend(self.snapshot)
+
+
+if __name__ == "__main__":
+    unittest.main()
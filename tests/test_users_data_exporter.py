@@ -0,0 +1,120 @@
+from contextlib import closing
+import gzip
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import patch
+from pandas import DataFrame
+from users_data_exporter import UsersDataExporter
+from users_data_processor import process_users_data
+from tests.data.users_test_data_processor import test_final_users_data
+
+expected_users = [
+    {key: user[key] for key in user if key != "password"}
+    for user in test_final_users_data.to_dict(orient="records")
+]
+
+
+class TestUsersDataExporter(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def export(self, file_name: str, export_format: str, columns=None) -> str:
+        path = os.path.join(self.directory, file_name)
+        users_count = UsersDataExporter(path, export_format, columns).export(
+            test_final_users_data
+        )
+        self.assertEqual(users_count, len(test_final_users_data))
+        self.assertFalse(os.path.exists(f"{path}.tmp"))
+        return path
+
+    def test_export_read_back(self):
+        # Test case: CSV and XML exports are valid data files, without passwords
+        for file_name, export_format in [
+            ("users.csv", "csv"),
+            ("users.xml", "xml"),
+            ("users.csv.gz", "csv"),
+            ("users.xml.xz", "xml"),
+        ]:
+            path = self.export(file_name, export_format)
+            self.assertEqual(
+                process_users_data([path]).to_dict(orient="records"), expected_users
+            )
+
+    def test_export_jsonl(self):
+        path = self.export("users.jsonl.gz", "jsonl", ["email", "children"])
+        with gzip.open(path, "rt") as file:
+            users = [json.loads(line) for line in file]
+        # Test case: only projected columns
+        self.assertEqual(
+            users,
+            [
+                {"email": user["email"], "children": user["children"]}
+                for user in expected_users
+            ],
+        )
+
+    def test_export_sqlite(self):
+        path = self.export("users.db", "sqlite", ["email", "created_at", "children"])
+        with closing(sqlite3.connect(path)) as db_conn:
+            self.assertEqual(
+                db_conn.execute(
+                    "SELECT email, created_at FROM users ORDER BY user_id;"
+                ).fetchall(),
+                [(user["email"], user["created_at"]) for user in expected_users],
+            )
+            self.assertEqual(
+                db_conn.execute(
+                    "SELECT name, age FROM users_children JOIN users USING (user_id) "
+                    "WHERE email = 'test8@example.com' ORDER BY name;"
+                ).fetchall(),
+                [("Alex", 6), ("Harry", 9), ("Robert", 14)],
+            )
+        with self.assertRaises(ValueError):
+            UsersDataExporter(path + ".gz", "sqlite")
+
+    def test_missing_values(self):
+        # Test case: columns missing in some data files are written empty
+        users_data = DataFrame(
+            [
+                {"firstname": "A", "email": "a@example.com"},
+                {"email": "b@example.com", "children": [{"name": "C", "age": 1}]},
+            ]
+        )
+        path = os.path.join(self.directory, "users.xml")
+        UsersDataExporter(path, "xml", ["firstname", "email", "children"]).export(
+            users_data
+        )
+        with open(path) as file:
+            self.assertEqual(
+                file.read().splitlines()[2:],
+                [
+                    "<user><firstname>A</firstname><email>a@example.com</email>"
+                    "<children></children></user>",
+                    "<user><firstname /><email>b@example.com</email><children>"
+                    "<child><name>C</name><age>1</age></child></children></user>",
+                    "</users>",
+                ],
+            )
+
+    def test_failed_export_keeps_output(self):
+        # Test case: existing output replaced only by a complete export
+        path = os.path.join(self.directory, "users.csv")
+        with open(path, "w") as file:
+            file.write("previous\n")
+        with patch.object(
+            UsersDataExporter, "iter_users", side_effect=OSError("disk full")
+        ):
+            with self.assertRaises(OSError):
+                UsersDataExporter(path, "csv").export(test_final_users_data)
+        with open(path) as file:
+            self.assertEqual(file.read(), "previous\n")
+        self.assertFalse(os.path.exists(f"{path}.tmp"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+import unittest
+from users_data_index import (
+    CreatedAtIndex,
+    LoginsBloomFilter,
+    UsersPrefixIndex,
+    get_search_score,
+    get_search_terms,
+)
+from tests.data.users_test_data_processor import test_final_users_data
+from pandas import DataFrame
+
+
+class TestCreatedAtIndex(unittest.TestCase):
+    def test_get_range_bounds(self):
+        index = CreatedAtIndex(test_final_users_data)
+        # Test case: range covering all accounts
+        self.assertEqual(
+            index.get_range_bounds("2000-01-01 00:00:00", "2030-01-01 00:00:00"),
+            (0, 10),
+        )
+        # Test case: bounds equal to created_at of accounts are inclusive
+        self.assertEqual(
+            index.get_range_bounds("2011-03-18 05:21:11", "2012-01-21 21:21:01"),
+            (1, 3),
+        )
+        # Test case: reversed range is empty
+        start, stop = index.get_range_bounds(
+            "2020-01-01 00:00:00", "2010-01-01 00:00:00"
+        )
+        self.assertEqual(start, stop)
+
+    def test_iter_pages(self):
+        index = CreatedAtIndex(test_final_users_data)
+        # Test case: pages keep created_at order and respect page size
+        pages = list(
+            index.iter_pages("2000-01-01 00:00:00", "2030-01-01 00:00:00", page_size=4)
+        )
+        self.assertEqual([len(page) for page in pages], [4, 4, 2])
+        created_at = [user["created_at"] for page in pages for user in page]
+        self.assertEqual(created_at, sorted(created_at))
+
+        # Test case: role filter
+        admins = [
+            user["firstname"]
+            for page in index.iter_pages(
+                "2000-01-01 00:00:00", "2030-01-01 00:00:00", role="admin"
+            )
+            for user in page
+        ]
+        self.assertEqual(admins, ["Test2", "Test3", "Test5", "Test7"])
+
+    def test_empty_data(self):
+        # Test case: index on empty data
+        index = CreatedAtIndex(DataFrame())
+        self.assertEqual(
+            list(index.iter_pages("2000-01-01 00:00:00", "2030-01-01 00:00:00")), []
+        )
+
+
+class TestUsersPrefixIndex(unittest.TestCase):
+    def test_get_search_terms(self):
+        self.assertEqual(
+            get_search_terms("Anna-Maria anna_maria@example.com"),
+            ["anna", "maria", "example", "com"],
+        )
+        self.assertEqual(get_search_terms(None), [])
+
+    def test_get_search_score(self):
+        self.assertEqual(get_search_score(["ann"], ["anna", "annabelle"]), 1)
+        self.assertEqual(get_search_score(["ann", "ex"], ["anna", "example"]), 6)
+        self.assertIsNone(get_search_score(["ann", "bob"], ["anna", "example"]))
+
+    def test_search(self):
+        users_terms = [
+            ["annabelle", "example"],
+            ["anna", "example", "com"],
+            ["bob", "example"],
+            ["ann", "test"],
+        ]
+        index = UsersPrefixIndex(enumerate(users_terms))
+        # Test case: (score, user id) pairs, exact match first
+        self.assertEqual(
+            index.search("ann", users_terms.__getitem__), [(0, 3), (1, 1), (6, 0)]
+        )
+        self.assertEqual(
+            index.search("Ann EXAMPLE", users_terms.__getitem__), [(1, 1), (6, 0)]
+        )
+        # Test case: best pairs up to the limit
+        self.assertEqual(
+            index.search("ann", users_terms.__getitem__, 2), [(0, 3), (1, 1)]
+        )
+        self.assertEqual(
+            index.search("Ann EXAMPLE", users_terms.__getitem__, 1), [(1, 1)]
+        )
+        self.assertEqual(index.search("ann bob", users_terms.__getitem__), [])
+        self.assertEqual(index.search("zed", users_terms.__getitem__), [])
+        self.assertEqual(index.search("", users_terms.__getitem__), [])
+        self.assertEqual(
+            UsersPrefixIndex([]).search("ann", users_terms.__getitem__), []
+        )
+
+    def test_get_prefix_users(self):
+        index = UsersPrefixIndex([(0, ["ann", "bob"]), (1, ["anna"]), (2, ["annb"])])
+        self.assertEqual(sorted(index.get_prefix_users("ann").tolist()), [0, 1, 2])
+        self.assertEqual(index.get_prefix_users("anna").tolist(), [1])
+        self.assertEqual(index.get_prefix_users("c").tolist(), [])
+
+
+class TestLoginsBloomFilter(unittest.TestCase):
+    def test_no_false_negatives(self):
+        logins = [f"user{number}@example.com" for number in range(2000)] + [
+            str(100000000 + number) for number in range(2000)
+        ]
+        login_filter = LoginsBloomFilter.from_logins(logins, 0.01)
+        for login in logins:
+            self.assertIn(login, login_filter)
+        # Test case: logins are normalized
+        self.assertIn(" USER1@Example.com ", login_filter)
+
+        # Test case: unknown logins pass at about the false positive rate
+        false_positives = sum(
+            f"user{number}@example.org" in login_filter for number in range(10000)
+        )
+        self.assertLess(false_positives, 200)
+
+    def test_empty_filter(self):
+        login_filter = LoginsBloomFilter.from_logins([])
+        self.assertNotIn("test1@example.com", login_filter)
+
+    def test_size(self):
+        # Test case: lower false positive rate takes more bits and hashes
+        logins = [str(number) for number in range(1000)]
+        coarse_filter = LoginsBloomFilter.from_logins(logins, 0.1)
+        fine_filter = LoginsBloomFilter.from_logins(logins, 0.001)
+        self.assertEqual(coarse_filter.bits_count, 4800)
+        self.assertEqual(coarse_filter.hashes_count, 3)
+        self.assertEqual(fine_filter.bits_count, 14384)
+        self.assertEqual(fine_filter.hashes_count, 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+from contextlib import closing
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import patch
+from metrics import MetricsRegistry
+from users_backends import BackendError, SqliteUsersBackend
+from users_data_processor import process_users_data
+from users_data_utils import ChunkedCsvUsersDataExtractor, RejectionCollector
+from users_db_loader import UsersDbLoader
+
+paths = ["./data/test_data.xml", "./data/test_data.csv", "./data/test_data.json"]
+
+
+def get_expected_users(data_paths: list) -> list:
+    return sorted(
+        (
+            user["email"],
+            user["telephone_number"],
+            user["created_at"],
+            [(child["name"], child["age"]) for child in user["children"] or []],
+        )
+        for user in process_users_data(data_paths).to_dict(orient="records")
+    )
+
+
+class TestUsersDbLoader(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.db_path = os.path.join(directory.name, "users_db.db")
+
+    def get_users(self) -> list:
+        with closing(sqlite3.connect(self.db_path)) as db_conn:
+            users = db_conn.execute(
+                "SELECT user_id, email, telephone_number, created_at FROM users_data "
+                "ORDER BY user_id;"
+            ).fetchall()
+            return [
+                (
+                    email,
+                    telephone_number,
+                    created_at,
+                    db_conn.execute(
+                        "SELECT child_name, child_age FROM users_children "
+                        "WHERE parent_id = ? ORDER BY rowid;",
+                        (user_id,),
+                    ).fetchall(),
+                )
+                for user_id, email, telephone_number, created_at in users
+            ]
+
+    def assert_loaded(self, loader: UsersDbLoader, data_paths: list):
+        self.assertEqual(loader.load(data_paths), len(get_expected_users(data_paths)))
+        users = self.get_users()
+        # Test case: same users as merged data, newest first
+        self.assertEqual(sorted(users), get_expected_users(data_paths))
+        created_at = [user[2] for user in users]
+        self.assertEqual(created_at, sorted(created_at, reverse=True))
+
+    def test_load(self):
+        rejections = RejectionCollector()
+        metrics = MetricsRegistry()
+        loader = UsersDbLoader(self.db_path, rejections=rejections, metrics=metrics)
+        self.assert_loaded(loader, paths)
+        self.assertEqual(rejections.total(), 1)
+
+        # Test case: summary tables and login filter are built
+        backend = SqliteUsersBackend(self.db_path)
+        self.addCleanup(backend.close)
+        self.assertEqual(backend.count_users(), len(self.get_users()))
+        self.assertTrue(backend.might_have_login("test@gmail.com"))
+        self.assertFalse(backend.might_have_login("unknown@example.org"))
+
+        # Test case: throughput of every stage
+        for stage in UsersDbLoader.STAGES:
+            self.assertGreater(
+                metrics.samples[("users_db_load_rows_total", "", (("stage", stage),))],
+                0,
+            )
+        self.assertEqual(
+            [line.split(":")[0] for line in loader.throughput_summary()],
+            UsersDbLoader.STAGES,
+        )
+
+    def test_malformed_files(self):
+        # Test case: malformed files rejected, the other files loaded
+        directory = os.path.dirname(self.db_path)
+        malformed_paths = []
+        for file_name, data in [
+            ("users.json", '[{"firstname": "Te'),
+            ("users.xml", "<users><user><firstname>Te"),
+        ]:
+            malformed_path = os.path.join(directory, file_name)
+            with open(malformed_path, "w") as file:
+                file.write(data)
+            malformed_paths.append(malformed_path)
+        rejections = RejectionCollector()
+        loader = UsersDbLoader(self.db_path, rejections=rejections)
+        loader.load(["./data/test_data.csv"] + malformed_paths)
+        self.assertEqual(
+            sorted(self.get_users()), get_expected_users(["./data/test_data.csv"])
+        )
+        for malformed_path in malformed_paths:
+            self.assertEqual(
+                rejections.counts[("error while processing data", malformed_path)], 1
+            )
+
+    def test_small_batches_and_queues(self):
+        # Test case: stages wait on full queues, rows split across batches
+        loader = UsersDbLoader(self.db_path, batch_size=1, queue_size=1)
+        self.assert_loaded(loader, paths + ["./data/final_test_data.csv"])
+
+    def test_workers(self):
+        loader = UsersDbLoader(
+            self.db_path, ChunkedCsvUsersDataExtractor, workers=2, batch_size=2
+        )
+        self.assert_loaded(loader, paths)
+        # Test case: rows of chunked CSV frames counted
+        self.assertEqual(loader.rows["read"], loader.rows["format"])
+        self.assertGreater(loader.rows["read"], loader.rows["finalize"])
+
+    def test_failed_load(self):
+        # Test case: error of the writer stops the pipeline, no database is left
+        loader = UsersDbLoader(self.db_path, batch_size=1, queue_size=1)
+        with patch.object(
+            UsersDbLoader, "finalize", side_effect=sqlite3.OperationalError("full")
+        ):
+            with self.assertRaises(BackendError):
+                loader.load(paths)
+        self.assertFalse(os.path.exists(self.db_path))
+
+
+if __name__ == "__main__":
+    unittest.main()
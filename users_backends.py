@@ -0,0 +1,1521 @@
+from users_data_index import (
+    SEARCH_COLUMNS,
+    CreatedAtIndex,
+    LoginsBloomFilter,
+    UsersPrefixIndex,
+    get_children_ages_signature,
+    get_search_score,
+    get_search_terms,
+    get_user_search_terms,
+)
+from snapshot_store import UsersSnapshot
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+from functools import cached_property, wraps
+import heapq
+import itertools
+import json
+import os
+from pathlib import Path
+import sqlite3
+from sqlite3 import Connection, Cursor
+import time
+import zlib
+from typing import Iterator, List, Optional, Protocol, Tuple
+import numpy as np
+from pandas import DataFrame
+
+
+class BackendError(Exception):
+    pass
+
+
+class QueryTimeout(Exception):
+    pass
+
+
+class Deadline:
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self.expires_at = time.monotonic() + timeout
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def check(self):
+        if self.expired():
+            raise QueryTimeout(f"Time budget of {self.timeout:g} s expired.")
+
+
+def check_deadline(deadline: Optional[Deadline]):
+    if deadline is not None:
+        deadline.check()
+
+
+class UsersBackend(Protocol):
+    # Children are returned as {"name", "age"} dicts, histogram as (age, count)
+    # pairs sorted by age, accounts created in range as pages of user dicts.
+    # Users with children of age are yielded lazily, in merged data order.
+    # Password None skips the password check, for a login verified by a session.
+    # Queries and result generators raise QueryTimeout once a set deadline passed.
+    def set_deadline(self, deadline: Optional[Deadline]): ...
+
+    # False only for logins of no user, so they are rejected without a lookup
+    def might_have_login(self, login: str) -> bool: ...
+
+    # Changes with any change of users data, None if the backend can't tell
+    def get_data_version(self) -> Optional[str]: ...
+
+    def find_user(self, login: str, password: Optional[str]) -> Optional[dict]: ...
+
+    def get_children(
+        self, login: str, password: Optional[str]
+    ) -> Optional[List[dict]]: ...
+
+    def find_users_with_children_of_age(self, ages: List[int]) -> Iterator[dict]: ...
+
+    # Users whose children ages are the given multiset, or with superset True
+    # contain it (each age at least as many times), in merged data order
+    def find_users_with_children_ages(
+        self, ages: List[int], superset: bool = False
+    ) -> Iterator[dict]: ...
+
+    def get_children_ages_histogram(self) -> List[Tuple[int, int]]: ...
+
+    def count_users(self) -> int: ...
+
+    def get_oldest_user(self) -> Optional[dict]: ...
+
+    def iter_accounts_created(
+        self, since: str, until: str, role: Optional[str] = None, page_size: int = 1000
+    ) -> Iterator[List[dict]]: ...
+
+    # Users with every query word prefixing a word of their name, email or
+    # telephone number, best match first (see users_data_index.get_search_score).
+    # With a limit only that many best matches are ranked and returned.
+    def search_users(
+        self, query: str, limit: Optional[int] = None
+    ) -> Iterator[dict]: ...
+
+
+class InMemoryUsersBackend:
+    def __init__(self, users_data: DataFrame):
+        self.users_data = users_data
+        self.deadline = None
+        self.users = users_data.to_dict(orient="records")
+        self.login_index = defaultdict(list)
+        for user_id, user in enumerate(self.users):
+            for column in ["email", "telephone_number"]:
+                if user.get(column) is not None:
+                    self.login_index[user[column]].append(user_id)
+
+    def set_deadline(self, deadline: Optional[Deadline]):
+        self.deadline = deadline
+
+    @staticmethod
+    def get_valid_children(user: dict) -> List[dict]:
+        children = user.get("children")
+        if not isinstance(children, list):
+            return []
+        return [
+            child
+            for child in children
+            if isinstance(child, dict) and isinstance(child["age"], int)
+        ]
+
+    @cached_property
+    def children_age_index(self) -> dict:
+        children_age_index = defaultdict(set)
+        for user_id, user in enumerate(self.users):
+            for child in self.get_valid_children(user):
+                children_age_index[child["age"]].add(user_id)
+        return children_age_index
+
+    @cached_property
+    def children_signature_index(self) -> dict:
+        children_signature_index = defaultdict(list)
+        for user_id, user in enumerate(self.users):
+            children = self.get_valid_children(user)
+            if children:
+                children_signature_index[
+                    get_children_ages_signature(child["age"] for child in children)
+                ].append(user_id)
+        return children_signature_index
+
+    @cached_property
+    def created_at_index(self) -> CreatedAtIndex:
+        return CreatedAtIndex(self.users_data)
+
+    @cached_property
+    def prefix_index(self) -> UsersPrefixIndex:
+        return UsersPrefixIndex(
+            (user_id, get_user_search_terms(user))
+            for user_id, user in enumerate(self.users)
+        )
+
+    def might_have_login(self, login: str) -> bool:
+        # The login index is already an exact O(1) lookup
+        return login in self.login_index
+
+    def get_data_version(self) -> Optional[str]:
+        # Loaded data files are fingerprinted by their callers
+        return None
+
+    def find_user(self, login: str, password: Optional[str]) -> Optional[dict]:
+        for user_id in self.login_index.get(login, []):
+            if password is None or self.users[user_id].get("password") == password:
+                return self.users[user_id]
+        return None
+
+    def get_children(self, login: str, password: Optional[str]) -> Optional[List[dict]]:
+        user = self.find_user(login, password)
+        if user and isinstance(user.get("children"), list):
+            return user["children"]
+        return None
+
+    def find_users_with_children_of_age(self, ages: List[int]) -> Iterator[dict]:
+        user_ids = set()
+        for age in set(ages):
+            user_ids.update(self.children_age_index.get(age, ()))
+        for user_id in sorted(user_ids):
+            check_deadline(self.deadline)
+            yield self.users[user_id]
+
+    def find_users_with_children_ages(
+        self, ages: List[int], superset: bool = False
+    ) -> Iterator[dict]:
+        if not ages:
+            return
+        if not superset:
+            # Exact profiles are one lookup of the canonical signature
+            user_ids = self.children_signature_index.get(
+                get_children_ages_signature(ages), []
+            )
+        else:
+            # Candidates have every age, their age counts are checked after
+            required_ages = Counter(ages)
+            user_ids = sorted(
+                set.intersection(
+                    *(self.children_age_index.get(age, set()) for age in required_ages)
+                )
+            )
+        for user_id in user_ids:
+            check_deadline(self.deadline)
+            user = self.users[user_id]
+            if superset:
+                user_ages = Counter(
+                    child["age"] for child in self.get_valid_children(user)
+                )
+                if any(user_ages[age] < count for age, count in required_ages.items()):
+                    continue
+            yield user
+
+    @cached_property
+    def children_ages_histogram(self) -> List[Tuple[int, int]]:
+        ages = Counter(
+            child["age"]
+            for user in self.users
+            for child in self.get_valid_children(user)
+        )
+        return sorted(ages.items())
+
+    def get_children_ages_histogram(self) -> List[Tuple[int, int]]:
+        return list(self.children_ages_histogram)
+
+    def count_users(self) -> int:
+        return len(self.users)
+
+    def get_oldest_user(self) -> Optional[dict]:
+        if not self.users:
+            return None
+        return self.users[int(self.users_data["created_at"].to_numpy().argmin())]
+
+    def iter_accounts_created(
+        self, since: str, until: str, role: Optional[str] = None, page_size: int = 1000
+    ) -> Iterator[List[dict]]:
+        for accounts_page in self.created_at_index.iter_pages(
+            since, until, role, page_size
+        ):
+            check_deadline(self.deadline)
+            yield accounts_page
+
+    def get_user_search_terms(self, user_id: int) -> List[str]:
+        check_deadline(self.deadline)
+        return get_user_search_terms(self.users[user_id])
+
+    def search_users(self, query: str, limit: Optional[int] = None) -> Iterator[dict]:
+        for _, user_id in self.prefix_index.search(
+            query, self.get_user_search_terms, limit
+        ):
+            check_deadline(self.deadline)
+            yield self.users[user_id]
+
+
+class SnapshotUsersBackend:
+    SIMILAR_USERS_COLUMNS = ["firstname", "telephone_number", "email", "children"]
+    CREATED_ACCOUNTS_COLUMNS = ["firstname", "email", "role", "created_at"]
+    SEARCH_RESULTS_COLUMNS = [
+        "firstname",
+        "email",
+        "telephone_number",
+        "role",
+        "created_at",
+    ]
+
+    def __init__(self, snapshot: UsersSnapshot, columns: Optional[List[str]] = None):
+        self.snapshot = snapshot
+        self.columns = columns
+        self.deadline = None
+
+    def set_deadline(self, deadline: Optional[Deadline]):
+        self.deadline = deadline
+
+    @cached_property
+    def prefix_index(self) -> UsersPrefixIndex:
+        return UsersPrefixIndex(
+            (user_id, self.get_user_search_terms(user_id))
+            for user_id in range(len(self.snapshot))
+        )
+
+    def get_user_search_terms(self, user_id: int) -> List[str]:
+        check_deadline(self.deadline)
+        return get_user_search_terms(self.snapshot.get_user(user_id, SEARCH_COLUMNS))
+
+    def might_have_login(self, login: str) -> bool:
+        return self.snapshot.might_have_login(login)
+
+    def get_data_version(self) -> Optional[str]:
+        return f"snapshot:{self.snapshot.version}"
+
+    def find_user(self, login: str, password: Optional[str]) -> Optional[dict]:
+        user_id = self.snapshot.find_user_by_login(login, password)
+        if user_id is None:
+            return None
+        return self.snapshot.get_user(user_id, self.columns)
+
+    def get_children(self, login: str, password: Optional[str]) -> Optional[List[dict]]:
+        user_id = self.snapshot.find_user_by_login(login, password)
+        if user_id is None:
+            return None
+        return self.snapshot.get_children(user_id) or None
+
+    def find_users_with_children_of_age(self, ages: List[int]) -> Iterator[dict]:
+        for user_id in self.snapshot.find_users_with_children_of_age(ages):
+            check_deadline(self.deadline)
+            yield self.snapshot.get_user(user_id, self.SIMILAR_USERS_COLUMNS)
+
+    def find_users_with_children_ages(
+        self, ages: List[int], superset: bool = False
+    ) -> Iterator[dict]:
+        for user_id in self.snapshot.find_users_with_children_ages(ages, superset):
+            check_deadline(self.deadline)
+            yield self.snapshot.get_user(user_id, self.SIMILAR_USERS_COLUMNS)
+
+    def get_children_ages_histogram(self) -> List[Tuple[int, int]]:
+        return self.snapshot.get_children_ages_histogram()
+
+    def count_users(self) -> int:
+        return len(self.snapshot)
+
+    def get_oldest_user(self) -> Optional[dict]:
+        user_id = self.snapshot.get_oldest_user_id()
+        if user_id is None:
+            return None
+        return self.snapshot.get_user(user_id, self.CREATED_ACCOUNTS_COLUMNS)
+
+    def iter_accounts_created(
+        self, since: str, until: str, role: Optional[str] = None, page_size: int = 1000
+    ) -> Iterator[List[dict]]:
+        for user_ids in self.snapshot.iter_created_between(since, until, page_size):
+            check_deadline(self.deadline)
+            accounts_page = [
+                self.snapshot.get_user(user_id, self.CREATED_ACCOUNTS_COLUMNS)
+                for user_id in user_ids
+            ]
+            if role is not None:
+                accounts_page = [
+                    account for account in accounts_page if account["role"] == role
+                ]
+            if accounts_page:
+                yield accounts_page
+
+    def search_users(self, query: str, limit: Optional[int] = None) -> Iterator[dict]:
+        for _, user_id in self.prefix_index.search(
+            query, self.get_user_search_terms, limit
+        ):
+            check_deadline(self.deadline)
+            yield self.snapshot.get_user(user_id, self.SEARCH_RESULTS_COLUMNS)
+
+
+def raise_backend_error(func):
+    @wraps(func)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return func(self, *args, **kwargs)
+        except sqlite3.Error as e:
+            raise self.get_backend_error(e) from e
+
+    return wrapper
+
+
+class SqliteUsersBackend:
+    USERS_COLUMNS = ["firstname", "email", "telephone_number", "role", "created_at"]
+    # Canonical children ages signature of parents, as built by
+    # get_children_ages_signature. The order of a plain group_concat is
+    # arbitrary, as a window function it concatenates in the window order
+    # (group_concat ORDER BY needs SQLite 3.44, and trigger SQL stored with it
+    # would make the database unreadable by older libraries).
+    SELECT_PARENT_SIGNATURES = """SELECT parent_id, signature FROM (
+                    SELECT parent_id,
+                        group_concat(child_age, ',') OVER (
+                            PARTITION BY parent_id ORDER BY child_age
+                            ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING
+                        ) AS signature,
+                        row_number() OVER (
+                            PARTITION BY parent_id ORDER BY child_age
+                        ) AS child_number
+                    FROM users_children {where}
+                )
+                WHERE child_number = 1"""
+    SELECT_SIGNATURES = SELECT_PARENT_SIGNATURES.format(where="")
+    BUSY_TIMEOUT = 5000
+    PROGRESS_STEPS = 10000
+
+    def __init__(
+        self, db_path: str, read_only: bool = True, busy_timeout: int = BUSY_TIMEOUT
+    ):
+        self.db_path = db_path
+        self.read_only = read_only
+        self.busy_timeout = busy_timeout
+        self.db_conn = None
+        self.summary_tables_available = None
+        self.search_table_available = None
+        self.children_signature_table_available = None
+        self.login_filter = None
+        self.deadline = None
+
+    @staticmethod
+    def connect(
+        db_path: str, read_only: bool = False, busy_timeout: int = BUSY_TIMEOUT
+    ) -> Connection:
+        # Read-only URI connections never take write locks, so readers don't
+        # queue behind a refresh job; busy_timeout (ms) covers the WAL checkpoint
+        if read_only:
+            db_conn = sqlite3.connect(
+                f"{Path(db_path).absolute().as_uri()}?mode=ro", uri=True
+            )
+        else:
+            db_conn = sqlite3.connect(db_path)
+        db_conn.execute(f"PRAGMA busy_timeout = {int(busy_timeout)};")
+        return db_conn
+
+    def get_cursor(self) -> Cursor:
+        if self.db_conn is None:
+            self.db_conn = SqliteUsersBackend.connect(
+                self.db_path, self.read_only, self.busy_timeout
+            )
+            self.set_progress_handler()
+        return self.db_conn.cursor()
+
+    def set_deadline(self, deadline: Optional[Deadline]):
+        self.deadline = deadline
+        if self.db_conn is not None:
+            self.set_progress_handler()
+
+    def set_progress_handler(self):
+        # SQLite calls the handler every PROGRESS_STEPS virtual machine steps,
+        # a true result interrupts the running statement
+        if self.deadline is None:
+            self.db_conn.set_progress_handler(None, 0)
+        else:
+            self.db_conn.set_progress_handler(
+                self.deadline.expired, self.PROGRESS_STEPS
+            )
+
+    def get_backend_error(self, error: sqlite3.Error) -> Exception:
+        if self.deadline is not None and self.deadline.expired():
+            return QueryTimeout(f"Time budget of {self.deadline.timeout:g} s expired.")
+        return BackendError(str(error))
+
+    def close(self):
+        if self.db_conn is not None:
+            self.db_conn.close()
+            self.db_conn = None
+
+    def has_summary_tables(self, cursor: Cursor) -> bool:
+        # Databases created before the summary tables fall back to full scans
+        if self.summary_tables_available is None:
+            cursor.execute(
+                """SELECT COUNT(*) FROM sqlite_master
+                    WHERE type = 'table'
+                    AND name IN ('users_summary', 'children_ages_summary');"""
+            )
+            self.summary_tables_available = cursor.fetchone()[0] == 2
+        return self.summary_tables_available
+
+    def has_search_table(self, cursor: Cursor) -> bool:
+        # Databases created before the search table are searched by full scan
+        if self.search_table_available is None:
+            cursor.execute(
+                """SELECT COUNT(*) FROM sqlite_master
+                    WHERE type = 'table' AND name = 'users_search';"""
+            )
+            self.search_table_available = cursor.fetchone()[0] == 1
+        return self.search_table_available
+
+    def has_children_signature_table(self, cursor: Cursor) -> bool:
+        # Databases created before the signatures compute them by full scan
+        if self.children_signature_table_available is None:
+            cursor.execute(
+                """SELECT COUNT(*) FROM sqlite_master
+                    WHERE type = 'table' AND name = 'users_children_signature';"""
+            )
+            self.children_signature_table_available = cursor.fetchone()[0] == 1
+        return self.children_signature_table_available
+
+    @raise_backend_error
+    def might_have_login(self, login: str) -> bool:
+        # Databases created before the login filter, or changed since it was
+        # built, look up every login
+        if self.login_filter is None:
+            cursor = self.get_cursor()
+            cursor.execute(
+                """SELECT COUNT(*) FROM sqlite_master
+                    WHERE type = 'table' AND name = 'users_login_filter';"""
+            )
+            login_filter = None
+            if cursor.fetchone()[0]:
+                cursor.execute(
+                    """SELECT hashes_count, bits FROM users_login_filter
+                        WHERE filter_id = 1;"""
+                )
+                login_filter = cursor.fetchone()
+            if login_filter is None:
+                return True
+            hashes_count, bits = login_filter
+            self.login_filter = LoginsBloomFilter(
+                np.frombuffer(bits, dtype=np.uint8), hashes_count
+            )
+        return login in self.login_filter
+
+    @raise_backend_error
+    def get_data_version(self) -> Optional[str]:
+        # None for databases created before the version table
+        cursor = self.get_cursor()
+        cursor.execute(
+            """SELECT COUNT(*) FROM sqlite_master
+                WHERE type = 'table' AND name = 'users_data_version';"""
+        )
+        if not cursor.fetchone()[0]:
+            return None
+        cursor.execute(
+            """SELECT dataset_id, version FROM users_data_version
+                WHERE version_id = 1;"""
+        )
+        data_version = cursor.fetchone()
+        return None if data_version is None else "{}:{}".format(*data_version)
+
+    @staticmethod
+    def get_user_from_row(row: tuple) -> dict:
+        return dict(zip(SqliteUsersBackend.USERS_COLUMNS, row))
+
+    def find_user_id(
+        self, cursor: Cursor, login: str, password: Optional[str]
+    ) -> Optional[int]:
+        if password is None:
+            cursor.execute(
+                """SELECT user_id FROM users_data
+                    WHERE email = ? OR telephone_number = ?;""",
+                (login, login),
+            )
+        else:
+            cursor.execute(
+                """SELECT user_id FROM users_data
+                    WHERE (email = ? OR telephone_number = ?) AND password = ?;""",
+                (login, login, password),
+            )
+        user = cursor.fetchone()
+        return user[0] if user else None
+
+    def select_children(self, cursor: Cursor, user_id: int) -> Optional[List[dict]]:
+        cursor.execute(
+            """SELECT child_name, child_age FROM users_children WHERE parent_id = ?;""",
+            (user_id,),
+        )
+        children = [{"name": name, "age": age} for name, age in cursor.fetchall()]
+        return children or None
+
+    @raise_backend_error
+    def find_user(self, login: str, password: Optional[str]) -> Optional[dict]:
+        cursor = self.get_cursor()
+        user_id = self.find_user_id(cursor, login, password)
+        if user_id is None:
+            return None
+        cursor.execute(
+            """SELECT firstname, email, telephone_number, role, created_at
+                FROM users_data WHERE user_id = ?;""",
+            (user_id,),
+        )
+        user = self.get_user_from_row(cursor.fetchone())
+        user["children"] = self.select_children(cursor, user_id)
+        return user
+
+    @raise_backend_error
+    def get_children(self, login: str, password: Optional[str]) -> Optional[List[dict]]:
+        cursor = self.get_cursor()
+        user_id = self.find_user_id(cursor, login, password)
+        if user_id is None:
+            return None
+        return self.select_children(cursor, user_id)
+
+    def find_users_with_children_of_age(self, ages: List[int]) -> Iterator[dict]:
+        for _, user in self.iter_users_with_children_of_age(ages):
+            yield user
+
+    def iter_users_with_children_of_age(
+        self, ages: List[int]
+    ) -> Iterator[Tuple[int, dict]]:
+        if not ages:
+            return
+        yield from self.iter_users_with_children(
+            """SELECT parent_id FROM users_children WHERE child_age IN ({})""".format(
+                ",".join("?" * len(ages))
+            ),
+            list(ages),
+        )
+
+    def find_users_with_children_ages(
+        self, ages: List[int], superset: bool = False
+    ) -> Iterator[dict]:
+        for _, user in self.iter_users_with_children_ages(ages, superset):
+            yield user
+
+    def iter_users_with_children_ages(
+        self, ages: List[int], superset: bool = False
+    ) -> Iterator[Tuple[int, dict]]:
+        if not ages:
+            return
+        if superset:
+            # Parents found by the child age index, then counted per age
+            required_ages = Counter(ages)
+            yield from self.iter_users_with_children(
+                """SELECT parent_id FROM users_children WHERE child_age IN ({})
+                    GROUP BY parent_id HAVING {}""".format(
+                    ",".join("?" * len(required_ages)),
+                    " AND ".join(["SUM(child_age = ?) >= ?"] * len(required_ages)),
+                ),
+                list(required_ages) + list(itertools.chain(*required_ages.items())),
+            )
+            return
+        try:
+            signature_table_available = self.has_children_signature_table(
+                self.get_cursor()
+            )
+        except sqlite3.Error as e:
+            raise self.get_backend_error(e) from e
+        if signature_table_available:
+            # Exact profiles are one lookup in the signature index
+            user_ids_query = """SELECT user_id FROM users_children_signature
+                WHERE signature = ?"""
+        else:
+            user_ids_query = """SELECT parent_id FROM ({})
+                WHERE signature = ?""".format(SqliteUsersBackend.SELECT_SIGNATURES)
+        yield from self.iter_users_with_children(
+            user_ids_query, [get_children_ages_signature(ages)]
+        )
+
+    def iter_users_with_children(
+        self, user_ids_query: str, params: list
+    ) -> Iterator[Tuple[int, dict]]:
+        try:
+            cursor = self.get_cursor()
+            # One query for matching users and all their children, read from the
+            # cursor one user at a time
+            cursor.execute(
+                """SELECT ud.user_id, ud.firstname, ud.email, ud.telephone_number,
+                        uc.child_name, uc.child_age
+                    FROM users_data ud
+                    JOIN users_children uc ON uc.parent_id = ud.user_id
+                    WHERE ud.user_id IN ({})
+                    ORDER BY ud.user_id;""".format(user_ids_query),
+                params,
+            )
+            for (
+                user_id,
+                firstname,
+                email,
+                telephone_number,
+            ), rows in itertools.groupby(cursor, key=lambda row: row[:4]):
+                check_deadline(self.deadline)
+                yield user_id, {
+                    "firstname": firstname,
+                    "email": email,
+                    "telephone_number": telephone_number,
+                    "children": [{"name": row[4], "age": row[5]} for row in rows],
+                }
+        except sqlite3.Error as e:
+            raise self.get_backend_error(e) from e
+
+    @raise_backend_error
+    def get_children_ages_histogram(self) -> List[Tuple[int, int]]:
+        cursor = self.get_cursor()
+        if self.has_summary_tables(cursor):
+            cursor.execute(
+                """SELECT child_age, children_count FROM children_ages_summary
+                    ORDER BY child_age;"""
+            )
+        else:
+            cursor.execute(
+                """SELECT child_age, COUNT(*) FROM users_children
+                    GROUP BY child_age ORDER BY child_age;"""
+            )
+        return cursor.fetchall()
+
+    @raise_backend_error
+    def count_users(self) -> int:
+        cursor = self.get_cursor()
+        if self.has_summary_tables(cursor):
+            cursor.execute(
+                """SELECT total_accounts FROM users_summary WHERE summary_id = 1;"""
+            )
+        else:
+            cursor.execute("""SELECT COUNT(*) FROM users_data;""")
+        return int(cursor.fetchone()[0])
+
+    @raise_backend_error
+    def get_oldest_user(self) -> Optional[dict]:
+        cursor = self.get_cursor()
+        if self.has_summary_tables(cursor):
+            cursor.execute(
+                """SELECT firstname, email, telephone_number, role, created_at
+                    FROM users_data WHERE user_id = (
+                        SELECT oldest_user_id FROM users_summary WHERE summary_id = 1
+                    );"""
+            )
+        else:
+            cursor.execute(
+                """SELECT firstname, email, telephone_number, role, created_at
+                    FROM users_data ORDER BY created_at ASC LIMIT 1;"""
+            )
+        user = cursor.fetchone()
+        return self.get_user_from_row(user) if user else None
+
+    @raise_backend_error
+    def check_summary_tables(
+        self, false_positive_rate: float = LoginsBloomFilter.FALSE_POSITIVE_RATE
+    ) -> List[str]:
+        # Compares summary tables with base tables and recomputes stale ones,
+        # returns names of recomputed summaries. Needs a writable connection.
+        cursor = self.get_cursor()
+        with self.db_conn:
+            SqliteUsersBackend.create_summary_tables(cursor)
+            self.summary_tables_available = True
+            stale_summaries = []
+
+            cursor.execute("""SELECT COUNT(*) FROM users_data;""")
+            total_accounts = cursor.fetchone()[0]
+            cursor.execute(
+                """SELECT total_accounts FROM users_summary WHERE summary_id = 1;"""
+            )
+            if cursor.fetchone()[0] != total_accounts:
+                stale_summaries.append("accounts count")
+                cursor.execute(
+                    """UPDATE users_summary SET total_accounts = ?
+                        WHERE summary_id = 1;""",
+                    (total_accounts,),
+                )
+
+            cursor.execute(
+                """SELECT child_age, COUNT(*) FROM users_children
+                    GROUP BY child_age ORDER BY child_age;"""
+            )
+            children_ages = cursor.fetchall()
+            cursor.execute(
+                """SELECT child_age, children_count FROM children_ages_summary
+                    ORDER BY child_age;"""
+            )
+            if cursor.fetchall() != children_ages:
+                stale_summaries.append("children ages histogram")
+                cursor.execute("""DELETE FROM children_ages_summary;""")
+                cursor.executemany(
+                    """INSERT INTO children_ages_summary (child_age, children_count)
+                        VALUES (?, ?);""",
+                    children_ages,
+                )
+
+            cursor.execute(
+                """SELECT user_id, created_at FROM users_data
+                    ORDER BY created_at ASC LIMIT 1;"""
+            )
+            oldest_user = cursor.fetchone()
+            cursor.execute(
+                """SELECT ud.created_at FROM users_summary us
+                    LEFT JOIN users_data ud ON ud.user_id = us.oldest_user_id
+                    WHERE us.summary_id = 1;"""
+            )
+            # Ties on created_at are equally valid oldest accounts
+            if cursor.fetchone()[0] != (oldest_user[1] if oldest_user else None):
+                stale_summaries.append("oldest account")
+                cursor.execute(
+                    """UPDATE users_summary SET oldest_user_id = ?
+                        WHERE summary_id = 1;""",
+                    (oldest_user[0] if oldest_user else None,),
+                )
+
+            SqliteUsersBackend.create_login_filter_table(cursor)
+            cursor.execute(
+                """SELECT COUNT(*) FROM users_login_filter WHERE filter_id = 1;"""
+            )
+            if not cursor.fetchone()[0]:
+                stale_summaries.append("login filter")
+                SqliteUsersBackend.build_login_filter(cursor, false_positive_rate)
+                self.login_filter = None
+
+            SqliteUsersBackend.create_children_signature_table(cursor)
+            self.children_signature_table_available = True
+            cursor.execute(
+                """{} ORDER BY parent_id;""".format(
+                    SqliteUsersBackend.SELECT_SIGNATURES
+                )
+            )
+            signatures = cursor.fetchall()
+            cursor.execute(
+                """SELECT user_id, signature FROM users_children_signature
+                    ORDER BY user_id;"""
+            )
+            if cursor.fetchall() != signatures:
+                stale_summaries.append("children ages signatures")
+                cursor.execute("""DELETE FROM users_children_signature;""")
+                cursor.executemany(
+                    """INSERT INTO users_children_signature (user_id, signature)
+                        VALUES (?, ?);""",
+                    signatures,
+                )
+
+            SqliteUsersBackend.create_data_version_table(cursor)
+            # Results read from stale summaries are outdated as well
+            if stale_summaries:
+                cursor.execute(
+                    """UPDATE users_data_version SET version = version + 1;"""
+                )
+        return stale_summaries
+
+    def iter_accounts_created(
+        self, since: str, until: str, role: Optional[str] = None, page_size: int = 1000
+    ) -> Iterator[List[dict]]:
+        query = """SELECT firstname, email, telephone_number, role, created_at
+                    FROM users_data WHERE created_at >= ? AND created_at <= ?"""
+        params = [since, until]
+        if role is not None:
+            query += " AND role = ?"
+            params.append(role)
+        query += " ORDER BY created_at ASC;"
+        try:
+            cursor = self.get_cursor()
+            cursor.execute(query, params)
+            accounts_page = cursor.fetchmany(page_size)
+            while accounts_page:
+                check_deadline(self.deadline)
+                yield [self.get_user_from_row(account) for account in accounts_page]
+                accounts_page = cursor.fetchmany(page_size)
+        except sqlite3.Error as e:
+            raise self.get_backend_error(e) from e
+
+    def search_users(self, query: str, limit: Optional[int] = None) -> Iterator[dict]:
+        for _, _, user in self.iter_search_results(query, limit):
+            yield user
+
+    def iter_search_results(
+        self, query: str, limit: Optional[int] = None
+    ) -> Iterator[Tuple[int, int, dict]]:
+        # (score, user_id, user) best first. FTS5 finds users matching every
+        # prefix, scores are computed here to rank like the in-memory index;
+        # with a limit only the best matches are kept while scoring.
+        query_terms = get_search_terms(query)
+        if not query_terms:
+            return
+        try:
+            cursor = self.get_cursor()
+            if self.has_search_table(cursor):
+                cursor.execute(
+                    """SELECT user_id, firstname, email, telephone_number, role, created_at
+                        FROM users_data WHERE user_id IN (
+                            SELECT rowid FROM users_search WHERE users_search MATCH ?
+                        );""",
+                    (" ".join(f'"{query_term}"*' for query_term in query_terms),),
+                )
+            else:
+                cursor.execute(
+                    """SELECT user_id, firstname, email, telephone_number, role, created_at
+                        FROM users_data;"""
+                )
+            search_results = self.iter_scored_users(cursor, query_terms)
+            if limit is None:
+                search_results = sorted(
+                    search_results, key=lambda search_result: search_result[:2]
+                )
+            else:
+                search_results = heapq.nsmallest(
+                    limit, search_results, key=lambda search_result: search_result[:2]
+                )
+        except sqlite3.Error as e:
+            raise self.get_backend_error(e) from e
+        yield from search_results
+
+    def iter_scored_users(
+        self, cursor: Cursor, query_terms: List[str]
+    ) -> Iterator[Tuple[int, int, dict]]:
+        for user_id, *row in cursor:
+            check_deadline(self.deadline)
+            user = self.get_user_from_row(row)
+            score = get_search_score(query_terms, get_user_search_terms(user))
+            if score is not None:
+                yield score, user_id, user
+
+    @classmethod
+    def create(
+        cls,
+        db_path: str,
+        users_data: DataFrame,
+        busy_timeout: int = BUSY_TIMEOUT,
+        user_ids: Optional[List[int]] = None,
+        false_positive_rate: float = LoginsBloomFilter.FALSE_POSITIVE_RATE,
+    ) -> int:
+        try:
+            with closing(cls.connect(db_path, busy_timeout=busy_timeout)) as db_conn:
+                # WAL is persistent, readers keep working while data is loaded
+                db_conn.execute("PRAGMA journal_mode = WAL;")
+                with db_conn:
+                    cls.create_starting_db_tables(db_conn.cursor())
+                inserted_users = cls.add_users_data_to_db(db_conn, users_data, user_ids)
+                with db_conn:
+                    cls.build_login_filter(db_conn.cursor(), false_positive_rate)
+                return inserted_users
+        except sqlite3.Error as e:
+            raise BackendError(str(e)) from e
+
+    @staticmethod
+    def add_users_data_to_db(
+        db_conn: Connection,
+        users_data: DataFrame,
+        user_ids: Optional[List[int]] = None,
+    ) -> int:
+        # Users and their children are inserted in one transaction, an invalid
+        # row rolls back all of them and its error is raised. Without user_ids
+        # users are numbered after the last one, in insertion order. Returns
+        # the number of users inserted.
+        with db_conn:
+            cursor = db_conn.cursor()
+            if user_ids is None:
+                cursor.execute("""SELECT COALESCE(MAX(user_id), 0) FROM users_data;""")
+                first_user_id = cursor.fetchone()[0] + 1
+                user_ids = range(first_user_id, first_user_id + len(users_data))
+            cursor.executemany(
+                """INSERT INTO users_data
+                    (user_id, email, firstname, telephone_number, password, role, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                zip(
+                    user_ids,
+                    *(
+                        users_data[column]
+                        for column in [
+                            "email",
+                            "firstname",
+                            "telephone_number",
+                            "password",
+                            "role",
+                            "created_at",
+                        ]
+                    ),
+                ),
+            )
+            cursor.executemany(
+                """INSERT INTO users_children (parent_id, child_name, child_age) VALUES (?, ?, ?)""",
+                (
+                    (user_id, child["name"], child["age"])
+                    for user_id, children in zip(
+                        user_ids, users_data.get("children", [])
+                    )
+                    if isinstance(children, list)
+                    for child in children
+                ),
+            )
+        return len(users_data)
+
+    @staticmethod
+    def create_starting_db_tables(cursor: Cursor):
+        cursor.execute(
+            """CREATE TABLE IF NOT EXISTS users_data
+              (
+                 user_id          INTEGER PRIMARY KEY,
+                 email            TEXT NOT NULL,
+                 firstname        TEXT NOT NULL,
+                 telephone_number TEXT NOT NULL,
+                 password         TEXT NOT NULL,
+                 role             TEXT NOT NULL,
+                 created_at       TEXT NOT NULL,
+                 UNIQUE (email, telephone_number)
+              )
+        ;"""
+        )
+
+        cursor.execute(
+            """CREATE TABLE IF NOT EXISTS users_children
+              (
+                 parent_id  INTEGER NOT NULL,
+                 child_name TEXT NOT NULL,
+                 child_age  INTEGER NOT NULL,
+                 FOREIGN KEY (parent_id) REFERENCES users_data(user_id) ON DELETE CASCADE
+              );"""
+        )
+
+        cursor.execute(
+            """CREATE INDEX IF NOT EXISTS idx_users_data_created_at
+                ON users_data(created_at);"""
+        )
+
+        cursor.execute(
+            """CREATE INDEX IF NOT EXISTS idx_users_data_telephone_number
+                ON users_data(telephone_number);"""
+        )
+
+        # One account per email, as kept by deduplication of the data files
+        cursor.execute(
+            """CREATE UNIQUE INDEX IF NOT EXISTS idx_users_data_email
+                ON users_data(email);"""
+        )
+
+        cursor.execute(
+            """CREATE INDEX IF NOT EXISTS idx_users_children_parent_id
+                ON users_children(parent_id);"""
+        )
+
+        cursor.execute(
+            """CREATE INDEX IF NOT EXISTS idx_users_children_child_age
+                ON users_children(child_age);"""
+        )
+
+        SqliteUsersBackend.create_search_table(cursor)
+
+        SqliteUsersBackend.create_summary_tables(cursor)
+
+        SqliteUsersBackend.create_login_filter_table(cursor)
+
+        SqliteUsersBackend.create_children_signature_table(cursor)
+
+        SqliteUsersBackend.create_data_version_table(cursor)
+
+    @staticmethod
+    def create_children_signature_table(cursor: Cursor):
+        # Exact children ages profiles are looked up by signature, triggers
+        # recompute the signature of every parent whose children change
+        cursor.execute(
+            """CREATE TABLE IF NOT EXISTS users_children_signature
+              (
+                 user_id   INTEGER PRIMARY KEY,
+                 signature TEXT NOT NULL
+              );"""
+        )
+
+        cursor.execute(
+            """CREATE INDEX IF NOT EXISTS idx_users_children_signature_signature
+                ON users_children_signature(signature);"""
+        )
+
+        set_signature = """
+                    DELETE FROM users_children_signature WHERE user_id = {parent_id};
+                    INSERT INTO users_children_signature (user_id, signature)
+                        {select_signature};"""
+        for event, parent_ids in [
+            ("INSERT", ["NEW.parent_id"]),
+            ("DELETE", ["OLD.parent_id"]),
+            ("UPDATE", ["OLD.parent_id", "NEW.parent_id"]),
+        ]:
+            statements = "".join(
+                set_signature.format(
+                    parent_id=parent_id,
+                    select_signature=SqliteUsersBackend.SELECT_PARENT_SIGNATURES.format(
+                        where=f"WHERE parent_id = {parent_id}"
+                    ),
+                )
+                for parent_id in parent_ids
+            )
+            # Triggers of older databases are replaced by the current ones
+            cursor.execute(
+                f"""DROP TRIGGER IF EXISTS users_children_signature_after_{event.lower()};"""
+            )
+            cursor.execute(
+                f"""CREATE TRIGGER users_children_signature_after_{event.lower()}
+                    AFTER {event} ON users_children
+                    BEGIN{statements}
+                    END;"""
+            )
+
+        cursor.execute(
+            """CREATE TRIGGER IF NOT EXISTS users_data_children_signature_after_delete
+                AFTER DELETE ON users_data
+                BEGIN
+                    DELETE FROM users_children_signature WHERE user_id = OLD.user_id;
+                END;"""
+        )
+
+    @staticmethod
+    def create_login_filter_table(cursor: Cursor):
+        # Bloom filter of emails and telephone numbers, deleted by any change
+        # that could add a login and rebuilt by check-database
+        cursor.execute(
+            """CREATE TABLE IF NOT EXISTS users_login_filter
+              (
+                 filter_id    INTEGER PRIMARY KEY CHECK (filter_id = 1),
+                 hashes_count INTEGER NOT NULL,
+                 bits         BLOB NOT NULL
+              );"""
+        )
+
+        cursor.execute(
+            """CREATE TRIGGER IF NOT EXISTS users_data_login_filter_after_insert
+                AFTER INSERT ON users_data
+                BEGIN
+                    DELETE FROM users_login_filter;
+                END;"""
+        )
+
+        cursor.execute(
+            """CREATE TRIGGER IF NOT EXISTS users_data_login_filter_after_update
+                AFTER UPDATE OF email, telephone_number ON users_data
+                BEGIN
+                    DELETE FROM users_login_filter;
+                END;"""
+        )
+
+    @staticmethod
+    def create_data_version_table(cursor: Cursor):
+        # Counter bumped by every change of users or children, with a random id
+        # of the database, so results cached for it can tell they are outdated
+        cursor.execute(
+            """CREATE TABLE IF NOT EXISTS users_data_version
+              (
+                 version_id INTEGER PRIMARY KEY CHECK (version_id = 1),
+                 dataset_id TEXT NOT NULL,
+                 version    INTEGER NOT NULL
+              );"""
+        )
+
+        cursor.execute(
+            """INSERT OR IGNORE INTO users_data_version (version_id, dataset_id, version)
+                VALUES (1, lower(hex(randomblob(8))), 0);"""
+        )
+
+        for table in ["users_data", "users_children"]:
+            for event in ["INSERT", "UPDATE", "DELETE"]:
+                cursor.execute(
+                    f"""CREATE TRIGGER IF NOT EXISTS {table}_version_after_{event.lower()}
+                        AFTER {event} ON {table}
+                        BEGIN
+                            UPDATE users_data_version SET version = version + 1;
+                        END;"""
+                )
+
+    @staticmethod
+    def build_login_filter(
+        cursor: Cursor,
+        false_positive_rate: float = LoginsBloomFilter.FALSE_POSITIVE_RATE,
+    ):
+        cursor.execute("""SELECT email, telephone_number FROM users_data;""")
+        login_filter = LoginsBloomFilter.from_logins(
+            (login for logins in cursor.fetchall() for login in logins),
+            false_positive_rate,
+        )
+        cursor.execute(
+            """INSERT OR REPLACE INTO users_login_filter (filter_id, hashes_count, bits)
+                VALUES (1, ?, ?);""",
+            (login_filter.hashes_count, login_filter.bits.tobytes()),
+        )
+
+    @staticmethod
+    def create_summary_tables(cursor: Cursor):
+        # Admin aggregates read these instead of scanning users tables,
+        # triggers keep them in step with every insert, delete and update
+        cursor.execute(
+            """CREATE TABLE IF NOT EXISTS users_summary
+              (
+                 summary_id     INTEGER PRIMARY KEY CHECK (summary_id = 1),
+                 total_accounts INTEGER NOT NULL,
+                 oldest_user_id INTEGER
+              );"""
+        )
+
+        cursor.execute(
+            """INSERT OR IGNORE INTO users_summary
+                (summary_id, total_accounts, oldest_user_id) VALUES (1, 0, NULL);"""
+        )
+
+        cursor.execute(
+            """CREATE TABLE IF NOT EXISTS children_ages_summary
+              (
+                 child_age      INTEGER PRIMARY KEY,
+                 children_count INTEGER NOT NULL
+              );"""
+        )
+
+        cursor.execute(
+            """CREATE TRIGGER IF NOT EXISTS users_data_after_insert
+                AFTER INSERT ON users_data
+                BEGIN
+                    UPDATE users_summary SET
+                        total_accounts = total_accounts + 1,
+                        oldest_user_id = CASE
+                            WHEN oldest_user_id IS NULL OR new.created_at < (
+                                SELECT created_at FROM users_data
+                                WHERE user_id = oldest_user_id
+                            ) THEN new.user_id
+                            ELSE oldest_user_id
+                        END
+                    WHERE summary_id = 1;
+                END;"""
+        )
+
+        cursor.execute(
+            """CREATE TRIGGER IF NOT EXISTS users_data_after_delete
+                AFTER DELETE ON users_data
+                BEGIN
+                    UPDATE users_summary SET
+                        total_accounts = total_accounts - 1,
+                        oldest_user_id = CASE
+                            WHEN oldest_user_id = old.user_id THEN (
+                                SELECT user_id FROM users_data
+                                ORDER BY created_at ASC LIMIT 1
+                            )
+                            ELSE oldest_user_id
+                        END
+                    WHERE summary_id = 1;
+                END;"""
+        )
+
+        cursor.execute(
+            """CREATE TRIGGER IF NOT EXISTS users_data_after_update
+                AFTER UPDATE OF user_id, created_at ON users_data
+                BEGIN
+                    UPDATE users_summary SET oldest_user_id = (
+                        SELECT user_id FROM users_data ORDER BY created_at ASC LIMIT 1
+                    )
+                    WHERE summary_id = 1;
+                END;"""
+        )
+
+        cursor.execute(
+            """CREATE TRIGGER IF NOT EXISTS users_children_after_insert
+                AFTER INSERT ON users_children
+                BEGIN
+                    INSERT OR IGNORE INTO children_ages_summary (child_age, children_count)
+                        VALUES (new.child_age, 0);
+                    UPDATE children_ages_summary SET children_count = children_count + 1
+                        WHERE child_age = new.child_age;
+                END;"""
+        )
+
+        cursor.execute(
+            """CREATE TRIGGER IF NOT EXISTS users_children_after_delete
+                AFTER DELETE ON users_children
+                BEGIN
+                    UPDATE children_ages_summary SET children_count = children_count - 1
+                        WHERE child_age = old.child_age;
+                    DELETE FROM children_ages_summary
+                        WHERE child_age = old.child_age AND children_count = 0;
+                END;"""
+        )
+
+        cursor.execute(
+            """CREATE TRIGGER IF NOT EXISTS users_children_after_update
+                AFTER UPDATE OF child_age ON users_children
+                BEGIN
+                    UPDATE children_ages_summary SET children_count = children_count - 1
+                        WHERE child_age = old.child_age;
+                    DELETE FROM children_ages_summary
+                        WHERE child_age = old.child_age AND children_count = 0;
+                    INSERT OR IGNORE INTO children_ages_summary (child_age, children_count)
+                        VALUES (new.child_age, 0);
+                    UPDATE children_ages_summary SET children_count = children_count + 1
+                        WHERE child_age = new.child_age;
+                END;"""
+        )
+
+    @staticmethod
+    def create_search_table(cursor: Cursor):
+        # Full-text index over users_data, which keeps the text (external
+        # content). Diacritics are kept, as by users_data_index.get_search_terms.
+        cursor.execute(
+            """CREATE VIRTUAL TABLE IF NOT EXISTS users_search USING fts5
+              (
+                 firstname,
+                 email,
+                 telephone_number,
+                 content = 'users_data',
+                 content_rowid = 'user_id',
+                 tokenize = 'unicode61 remove_diacritics 0'
+              );"""
+        )
+
+        cursor.execute(
+            """CREATE TRIGGER IF NOT EXISTS users_data_search_after_insert
+                AFTER INSERT ON users_data
+                BEGIN
+                    INSERT INTO users_search (rowid, firstname, email, telephone_number)
+                        VALUES (new.user_id, new.firstname, new.email, new.telephone_number);
+                END;"""
+        )
+
+        cursor.execute(
+            """CREATE TRIGGER IF NOT EXISTS users_data_search_after_delete
+                AFTER DELETE ON users_data
+                BEGIN
+                    INSERT INTO users_search
+                        (users_search, rowid, firstname, email, telephone_number)
+                        VALUES ('delete', old.user_id, old.firstname, old.email,
+                            old.telephone_number);
+                END;"""
+        )
+
+        cursor.execute(
+            """CREATE TRIGGER IF NOT EXISTS users_data_search_after_update
+                AFTER UPDATE OF user_id, firstname, email, telephone_number ON users_data
+                BEGIN
+                    INSERT INTO users_search
+                        (users_search, rowid, firstname, email, telephone_number)
+                        VALUES ('delete', old.user_id, old.firstname, old.email,
+                            old.telephone_number);
+                    INSERT INTO users_search (rowid, firstname, email, telephone_number)
+                        VALUES (new.user_id, new.firstname, new.email, new.telephone_number);
+                END;"""
+        )
+
+
+class ShardedSqliteUsersBackend:
+    # Users are hash-partitioned by telephone number across SQLite files listed
+    # in a JSON manifest. Shards keep global user ids, so merged results come in
+    # the same order as from a single database.
+    MANIFEST_VERSION = 1
+    PARTITION_KEY = "telephone_number"
+
+    def __init__(
+        self,
+        manifest_path: str,
+        read_only: bool = True,
+        busy_timeout: int = SqliteUsersBackend.BUSY_TIMEOUT,
+    ):
+        self.manifest_path = manifest_path
+        try:
+            with open(manifest_path) as file:
+                manifest = json.load(file)
+        except (OSError, ValueError) as e:
+            raise BackendError(f"Invalid shards manifest: {manifest_path}") from e
+        if (
+            manifest.get("version") != self.MANIFEST_VERSION
+            or manifest.get("partition_key") != self.PARTITION_KEY
+        ):
+            raise BackendError(f"Unsupported shards manifest: {manifest_path}")
+        directory = os.path.dirname(os.path.abspath(manifest_path))
+        self.shards = [
+            SqliteUsersBackend(
+                os.path.join(directory, shard["path"]), read_only, busy_timeout
+            )
+            for shard in manifest["shards"]
+        ]
+
+    def close(self):
+        for shard in self.shards:
+            shard.close()
+
+    def set_deadline(self, deadline: Optional[Deadline]):
+        for shard in self.shards:
+            shard.set_deadline(deadline)
+
+    @staticmethod
+    def get_shard_number(telephone_number: str, shards_count: int) -> int:
+        return zlib.crc32(telephone_number.encode()) % shards_count
+
+    def get_login_shards(self, login: str) -> List[SqliteUsersBackend]:
+        # Email logins are looked up in every shard whose login filter may
+        # have them, by index
+        if "@" in login:
+            return [shard for shard in self.shards if shard.might_have_login(login)]
+        return [self.shards[self.get_shard_number(login, len(self.shards))]]
+
+    def might_have_login(self, login: str) -> bool:
+        return any(
+            shard.might_have_login(login) for shard in self.get_login_shards(login)
+        )
+
+    def get_data_version(self) -> Optional[str]:
+        versions = [shard.get_data_version() for shard in self.shards]
+        if None in versions:
+            return None
+        return ",".join(versions)
+
+    def find_user(self, login: str, password: Optional[str]) -> Optional[dict]:
+        for shard in self.get_login_shards(login):
+            user = shard.find_user(login, password)
+            if user is not None:
+                return user
+        return None
+
+    def get_children(self, login: str, password: Optional[str]) -> Optional[List[dict]]:
+        for shard in self.get_login_shards(login):
+            children = shard.get_children(login, password)
+            if children is not None:
+                return children
+        return None
+
+    def find_users_with_children_of_age(self, ages: List[int]) -> Iterator[dict]:
+        for _, user in heapq.merge(
+            *(shard.iter_users_with_children_of_age(ages) for shard in self.shards),
+            key=lambda user: user[0],
+        ):
+            yield user
+
+    def find_users_with_children_ages(
+        self, ages: List[int], superset: bool = False
+    ) -> Iterator[dict]:
+        for _, user in heapq.merge(
+            *(
+                shard.iter_users_with_children_ages(ages, superset)
+                for shard in self.shards
+            ),
+            key=lambda user: user[0],
+        ):
+            yield user
+
+    def get_children_ages_histogram(self) -> List[Tuple[int, int]]:
+        ages = Counter()
+        for shard in self.shards:
+            ages.update(dict(shard.get_children_ages_histogram()))
+        return sorted(ages.items())
+
+    def count_users(self) -> int:
+        return sum(shard.count_users() for shard in self.shards)
+
+    def check_summary_tables(
+        self, false_positive_rate: float = LoginsBloomFilter.FALSE_POSITIVE_RATE
+    ) -> List[str]:
+        stale_summaries = []
+        for shard in self.shards:
+            for summary in shard.check_summary_tables(false_positive_rate):
+                if summary not in stale_summaries:
+                    stale_summaries.append(summary)
+        return stale_summaries
+
+    def get_oldest_user(self) -> Optional[dict]:
+        oldest_users = [
+            user
+            for user in (shard.get_oldest_user() for shard in self.shards)
+            if user is not None
+        ]
+        if not oldest_users:
+            return None
+        return min(oldest_users, key=lambda user: user["created_at"])
+
+    def iter_accounts_created(
+        self, since: str, until: str, role: Optional[str] = None, page_size: int = 1000
+    ) -> Iterator[List[dict]]:
+        accounts = heapq.merge(
+            *(
+                itertools.chain.from_iterable(
+                    shard.iter_accounts_created(since, until, role, page_size)
+                )
+                for shard in self.shards
+            ),
+            key=lambda account: account["created_at"],
+        )
+        while True:
+            accounts_page = list(itertools.islice(accounts, page_size))
+            if not accounts_page:
+                return
+            yield accounts_page
+
+    def search_users(self, query: str, limit: Optional[int] = None) -> Iterator[dict]:
+        # Global user ids break ties, as in a single database
+        search_results = heapq.merge(
+            *(shard.iter_search_results(query, limit) for shard in self.shards),
+            key=lambda search_result: search_result[:2],
+        )
+        for _, _, user in itertools.islice(search_results, limit):
+            yield user
+
+    @classmethod
+    def create(
+        cls,
+        manifest_path: str,
+        users_data: DataFrame,
+        shards_count: int,
+        busy_timeout: int = SqliteUsersBackend.BUSY_TIMEOUT,
+        false_positive_rate: float = LoginsBloomFilter.FALSE_POSITIVE_RATE,
+    ) -> int:
+        directory = os.path.dirname(os.path.abspath(manifest_path))
+        name = os.path.basename(manifest_path).split(".")[0]
+        shard_paths = [f"{name}-shard{number}.db" for number in range(shards_count)]
+        shard_numbers = np.array(
+            [
+                cls.get_shard_number(telephone_number, shards_count)
+                for telephone_number in users_data.get(cls.PARTITION_KEY, [])
+            ],
+            dtype=np.int64,
+        )
+        # Global ids follow the merged data order, as in a single database
+        user_ids = np.arange(1, len(users_data) + 1)
+
+        # Shards are separate files with separate write locks, load them in
+        # parallel processes
+        with ProcessPoolExecutor(
+            max_workers=min(shards_count, os.cpu_count() or 1)
+        ) as executor:
+            futures = []
+            for number, shard_path in enumerate(shard_paths):
+                shard_path = os.path.join(directory, shard_path)
+                cls.remove_shard_files(shard_path)
+                shard_mask = shard_numbers == number
+                futures.append(
+                    executor.submit(
+                        SqliteUsersBackend.create,
+                        shard_path,
+                        users_data[shard_mask],
+                        busy_timeout,
+                        user_ids[shard_mask].tolist(),
+                        false_positive_rate,
+                    )
+                )
+            shard_errors = [future.exception() for future in futures]
+        if any(shard_errors):
+            # No manifest is written for partly loaded shards
+            for shard_path in shard_paths:
+                cls.remove_shard_files(os.path.join(directory, shard_path))
+            error = next(error for error in shard_errors if error is not None)
+            if isinstance(error, BackendError):
+                raise error
+            raise BackendError(str(error)) from error
+        shard_users = [future.result() for future in futures]
+
+        manifest = {
+            "version": cls.MANIFEST_VERSION,
+            "partition_key": cls.PARTITION_KEY,
+            "hash": "crc32",
+            "shards": [
+                {"path": shard_path, "users": users}
+                for shard_path, users in zip(shard_paths, shard_users)
+            ],
+        }
+        # Readers only see the layout once every shard is loaded
+        temporary_path = f"{manifest_path}.tmp"
+        try:
+            with open(temporary_path, "w") as file:
+                json.dump(manifest, file, indent=2)
+            os.replace(temporary_path, manifest_path)
+        except OSError as e:
+            raise BackendError(str(e)) from e
+        return sum(shard_users)
+
+    @staticmethod
+    def remove_shard_files(shard_path: str):
+        for path in [shard_path, f"{shard_path}-wal", f"{shard_path}-shm"]:
+            if os.path.exists(path):
+                os.remove(path)
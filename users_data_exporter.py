@@ -0,0 +1,165 @@
+from contextlib import closing
+import itertools
+import math
+import os
+import sqlite3
+from typing import Iterator, List, Optional, TextIO
+from xml.sax.saxutils import escape
+from pandas import DataFrame
+from results_writer import ResultsWriter
+from users_data_utils import UsersDataExtractor
+
+EXPORT_FORMATS = ["csv", "jsonl", "xml", "sqlite"]
+# Passwords are never exported
+EXPORT_COLUMNS = [
+    "firstname",
+    "telephone_number",
+    "email",
+    "role",
+    "created_at",
+    "children",
+]
+
+
+class UsersDataExporter:
+    # Users are read from the merged frame one at a time and written through
+    # large buffers, CSV, JSON lines and XML in the layout of the data files.
+    # Output is compressed by path suffix (.gz, .bz2, .xz) and replaces the
+    # file at the end, so readers never see a partial export.
+    BUFFER_SIZE = 1024 * 1024
+    SQLITE_BATCH_SIZE = 10000
+
+    def __init__(
+        self,
+        output_path: str,
+        export_format: str,
+        columns: Optional[List[str]] = None,
+    ):
+        self.output_path = output_path
+        self.export_format = export_format
+        self.columns = EXPORT_COLUMNS if columns is None else columns
+        self.compression = UsersDataExtractor.get_compression(output_path)
+        if export_format == "sqlite" and self.compression is not None:
+            raise ValueError("SQLite export can not be compressed")
+
+    @staticmethod
+    def get_value(value):
+        # Columns missing in some data files are NaN in the merged frame
+        if isinstance(value, float) and math.isnan(value):
+            return None
+        return value
+
+    def iter_users(self, users_data: DataFrame) -> Iterator[dict]:
+        # Columns are zipped, selecting them from the frame would copy the data
+        columns = [column for column in self.columns if column in users_data]
+        for values in zip(*(users_data[column] for column in columns)):
+            yield {
+                column: self.get_value(value) for column, value in zip(columns, values)
+            }
+
+    def open_output(self, path: str) -> TextIO:
+        if self.compression is None:
+            return open(path, "w", newline="", buffering=self.BUFFER_SIZE)
+        return UsersDataExtractor.COMPRESSION_OPENERS[self.compression](
+            path, "wt", newline=""
+        )
+
+    def export(self, users_data: DataFrame) -> int:
+        temporary_path = f"{self.output_path}.tmp"
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        try:
+            if self.export_format == "sqlite":
+                users_count = self.write_sqlite(users_data, temporary_path)
+            else:
+                with self.open_output(temporary_path) as file:
+                    users_count = self.write_text(users_data, file)
+        except BaseException:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            raise
+        os.replace(temporary_path, self.output_path)
+        return users_count
+
+    def write_text(self, users_data: DataFrame, file: TextIO) -> int:
+        writer = ResultsWriter(self.export_format, stream=file)
+        writer.BUFFER_SIZE = self.BUFFER_SIZE
+        if self.export_format != "xml":
+            return writer.write_records(self.iter_users(users_data), self.columns, str)
+        users_count = 0
+        writer.write("<?xml version='1.0' encoding='utf-8'?>\n<users>\n")
+        for user in self.iter_users(users_data):
+            writer.write(self.format_xml_user(user))
+            users_count += 1
+        writer.write("</users>\n")
+        writer.flush()
+        return users_count
+
+    @staticmethod
+    def format_xml_user(user: dict) -> str:
+        fields = []
+        for column, value in user.items():
+            if column == "children":
+                children = "".join(
+                    f"<child><name>{escape(str(child['name']))}</name>"
+                    f"<age>{child['age']}</age></child>"
+                    for child in value or []
+                )
+                fields.append(f"<children>{children}</children>")
+            elif value is None:
+                fields.append(f"<{column} />")
+            else:
+                fields.append(f"<{column}>{escape(str(value))}</{column}>")
+        return f"<user>{''.join(fields)}</user>\n"
+
+    def write_sqlite(self, users_data: DataFrame, path: str) -> int:
+        user_columns = [column for column in self.columns if column != "children"]
+        users_count = 0
+        with closing(sqlite3.connect(path)) as db_conn:
+            # New file written in one transaction, no journal needed
+            db_conn.execute("PRAGMA journal_mode = OFF;")
+            db_conn.execute("PRAGMA synchronous = OFF;")
+            with db_conn:
+                db_conn.execute(
+                    "CREATE TABLE users (user_id INTEGER PRIMARY KEY{});".format(
+                        "".join(f", {column} TEXT" for column in user_columns)
+                    )
+                )
+                if "children" in self.columns:
+                    db_conn.execute(
+                        """CREATE TABLE users_children (
+                            user_id INTEGER NOT NULL REFERENCES users(user_id),
+                            name TEXT,
+                            age INTEGER
+                        );"""
+                    )
+                users = enumerate(self.iter_users(users_data), start=1)
+                while True:
+                    batch = list(itertools.islice(users, self.SQLITE_BATCH_SIZE))
+                    if not batch:
+                        break
+                    db_conn.executemany(
+                        "INSERT INTO users VALUES (?{});".format(
+                            ", ?" * len(user_columns)
+                        ),
+                        (
+                            [user_id] + [user.get(column) for column in user_columns]
+                            for user_id, user in batch
+                        ),
+                    )
+                    if "children" in self.columns:
+                        db_conn.executemany(
+                            "INSERT INTO users_children VALUES (?, ?, ?);",
+                            (
+                                (user_id, child["name"], child["age"])
+                                for user_id, user in batch
+                                for child in user.get("children") or []
+                            ),
+                        )
+                    users_count += len(batch)
+                if "children" in self.columns:
+                    db_conn.execute(
+                        "CREATE INDEX users_children_user_id "
+                        "ON users_children(user_id);"
+                    )
+        return users_count
@@ -0,0 +1,216 @@
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+import hashlib
+import heapq
+import itertools
+import math
+import re
+import sys
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+from pandas import DataFrame
+
+SEARCH_COLUMNS = ["firstname", "email", "telephone_number"]
+SEARCH_TERM_PATTERN = re.compile(r"[^\W_]+")
+
+
+def get_search_terms(text: Optional[str]) -> List[str]:
+    # Lower-cased words, split like the SQLite unicode61 tokenizer does
+    if not isinstance(text, str):
+        return []
+    return list(dict.fromkeys(SEARCH_TERM_PATTERN.findall(text.lower())))
+
+
+def get_user_search_terms(user: dict) -> List[str]:
+    return [
+        term for column in SEARCH_COLUMNS for term in get_search_terms(user.get(column))
+    ]
+
+
+def get_search_score(query_terms: List[str], user_terms: List[str]) -> Optional[int]:
+    # Every query term has to prefix a user term. Lower is better: the number
+    # of characters the query terms leave out of the closest matching terms,
+    # so exact matches rank first.
+    score = 0
+    for query_term in query_terms:
+        distances = [
+            len(term) - len(query_term)
+            for term in user_terms
+            if term.startswith(query_term)
+        ]
+        if not distances:
+            return None
+        score += min(distances)
+    return score
+
+
+def get_children_ages_signature(ages: Iterable[int]) -> str:
+    # Canonical form of a multiset of children ages, equal for the same ages
+    # in any order; the SQLite signature triggers build the same string
+    return ",".join(str(age) for age in sorted(ages))
+
+
+class CreatedAtIndex:
+    def __init__(self, users_data: DataFrame):
+        if users_data.empty:
+            self.users_data = users_data
+            self.created_at = []
+        else:
+            self.users_data = users_data.sort_values(
+                by="created_at", kind="stable"
+            ).reset_index(drop=True)
+            self.created_at = self.users_data["created_at"].to_list()
+
+    def get_range_bounds(self, since: str, until: str) -> tuple:
+        start = bisect_left(self.created_at, since)
+        stop = bisect_right(self.created_at, until)
+        return start, max(start, stop)
+
+    def iter_pages(
+        self, since: str, until: str, role: Optional[str] = None, page_size: int = 1000
+    ) -> Iterator[List[dict]]:
+        start, stop = self.get_range_bounds(since, until)
+        for page_start in range(start, stop, page_size):
+            page = self.users_data.iloc[page_start : min(page_start + page_size, stop)]
+            if role is not None:
+                page = page[page["role"] == role]
+            if not page.empty:
+                yield page.to_dict(orient="records")
+
+
+class UsersPrefixIndex:
+    # Sorted unique search terms, ids of users with term i are
+    # user_ids[offsets[i]:offsets[i + 1]]. A prefix is a contiguous range of terms.
+    def __init__(self, users_terms: Iterable[Tuple[int, List[str]]]):
+        term_users = defaultdict(list)
+        for user_id, terms in users_terms:
+            for term in terms:
+                term_users[term].append(user_id)
+        self.terms = sorted(term_users)
+        self.term_lengths = np.array([len(term) for term in self.terms], dtype=np.int64)
+        self.offsets = np.cumsum(
+            [0] + [len(term_users[term]) for term in self.terms], dtype=np.int64
+        )
+        self.user_ids = np.fromiter(
+            itertools.chain.from_iterable(term_users[term] for term in self.terms),
+            dtype=np.int64,
+            count=int(self.offsets[-1]),
+        )
+
+    def get_prefix_range(self, prefix: str) -> Tuple[int, int]:
+        # Terms starting with prefix sort together
+        start = bisect_left(self.terms, prefix)
+        return start, bisect_left(self.terms, prefix + chr(sys.maxunicode), start)
+
+    def get_prefix_users(self, prefix: str) -> np.ndarray:
+        start, stop = self.get_prefix_range(prefix)
+        return self.user_ids[self.offsets[start] : self.offsets[stop]]
+
+    def get_prefix_distances(self, prefix: str) -> Tuple[np.ndarray, np.ndarray]:
+        # Users with a term starting with prefix and the fewest characters
+        # the prefix leaves out of their terms
+        start, stop = self.get_prefix_range(prefix)
+        user_ids = self.user_ids[self.offsets[start] : self.offsets[stop]]
+        distances = np.repeat(
+            self.term_lengths[start:stop] - len(prefix),
+            np.diff(self.offsets[start : stop + 1]),
+        )
+        order = np.lexsort((distances, user_ids))
+        user_ids, distances = user_ids[order], distances[order]
+        first = np.ones(len(user_ids), dtype=bool)
+        first[1:] = user_ids[1:] != user_ids[:-1]
+        return user_ids[first], distances[first]
+
+    def search(
+        self,
+        query: str,
+        get_user_terms: Callable[[int], List[str]],
+        limit: Optional[int] = None,
+    ) -> List[Tuple[int, int]]:
+        # (score, user_id) pairs, best first, at most limit of them. Candidates
+        # are the users of the most selective query term, other terms are
+        # scored on their own terms.
+        query_terms = get_search_terms(query)
+        if not query_terms:
+            return []
+        prefix = min(
+            query_terms, key=lambda query_term: len(self.get_prefix_users(query_term))
+        )
+        other_terms = [query_term for query_term in query_terms if query_term != prefix]
+        user_ids, distances = self.get_prefix_distances(prefix)
+        if not other_terms:
+            order = np.lexsort((user_ids, distances))[:limit]
+            return list(zip(distances[order].tolist(), user_ids[order].tolist()))
+        search_results = []
+        for user_id, distance in zip(user_ids.tolist(), distances.tolist()):
+            score = get_search_score(other_terms, get_user_terms(user_id))
+            if score is not None:
+                search_results.append((distance + score, user_id))
+        if limit is None:
+            return sorted(search_results)
+        return heapq.nsmallest(limit, search_results)
+
+
+class LoginsBloomFilter:
+    # Bit array answering "maybe a login" or "surely not a login", without
+    # false negatives. Each login sets hashes_count bits picked by double
+    # hashing of its BLAKE2b digest. Logins are compared stripped and
+    # lower-cased, which can only add false positives.
+    FALSE_POSITIVE_RATE = 0.01
+    MASK = (1 << 64) - 1
+
+    def __init__(self, bits: np.ndarray, hashes_count: int):
+        self.bits = bits
+        self.hashes_count = hashes_count
+        self.bits_count = len(bits) * 8
+
+    @classmethod
+    def from_logins(
+        cls, logins: Iterable[str], false_positive_rate: float = FALSE_POSITIVE_RATE
+    ) -> "LoginsBloomFilter":
+        hashes = np.array(
+            [cls.get_hashes(login) for login in logins], dtype=np.uint64
+        ).reshape(-1, 2)
+        # Optimal size for the number of logins and false positive rate
+        bits_count = max(
+            64,
+            math.ceil(-len(hashes) * math.log(false_positive_rate) / math.log(2) ** 2),
+        )
+        hashes_count = max(1, round(bits_count / max(len(hashes), 1) * math.log(2)))
+        login_filter = cls(np.zeros(-(-bits_count // 8), dtype=np.uint8), hashes_count)
+        steps = np.arange(hashes_count, dtype=np.uint64)
+        # uint64 arithmetic wraps around like get_positions masks
+        positions = (hashes[:, :1] + steps * hashes[:, 1:]) % np.uint64(
+            login_filter.bits_count
+        )
+        positions = positions.ravel()
+        np.bitwise_or.at(
+            login_filter.bits,
+            positions >> np.uint64(3),
+            (np.uint8(1) << (positions & np.uint64(7)).astype(np.uint8)),
+        )
+        return login_filter
+
+    @staticmethod
+    def get_hashes(login: str) -> Tuple[int, int]:
+        digest = hashlib.blake2b(
+            str(login).strip().lower().encode(), digest_size=16
+        ).digest()
+        # Odd step, so the positions of a login don't repeat early when the
+        # bits count is a power of two
+        return int.from_bytes(digest[:8], "little"), (
+            int.from_bytes(digest[8:], "little") | 1
+        )
+
+    def get_positions(self, login: str) -> List[int]:
+        first_hash, second_hash = self.get_hashes(login)
+        return [
+            ((first_hash + step * second_hash) & self.MASK) % self.bits_count
+            for step in range(self.hashes_count)
+        ]
+
+    def __contains__(self, login: str) -> bool:
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self.get_positions(login)
+        )
@@ -1,17 +1,64 @@
-from users_data_utils import UsersDataMerger, UsersDataExtractor, UsersDataFormatter
+from users_data_utils import (
+    UsersDataMerger,
+    UsersDataExtractor,
+    ChunkedCsvUsersDataExtractor,
+    UsersDataFormatter,
+    RejectionCollector,
+    DataFile,
+)
+from users_backends import InMemoryUsersBackend
+from metrics import MetricsRegistry
+from functools import lru_cache
 import os
+from typing import List, NamedTuple, Optional, Tuple
 from pandas import DataFrame
 
+CSV_ENGINES = {"python": UsersDataExtractor, "pandas": ChunkedCsvUsersDataExtractor}
 
-def process_users_data(files_path) -> DataFrame:
+
+class UsersDataOptions(NamedTuple):
+    data_files: Optional[Tuple[DataFile, ...]] = None
+    quarantine_path: Optional[str] = None
+    workers: int = 1
+    csv_engine: str = "python"
+    metrics: Optional[MetricsRegistry] = None
+    split_size: int = UsersDataMerger.SPLIT_SIZE
+
+
+def process_users_data(
+    files_path,
+    columns: Optional[List[str]] = None,
+    quarantine_path: Optional[str] = None,
+    workers: int = 1,
+    csv_engine: str = "python",
+    metrics: Optional[MetricsRegistry] = None,
+    split_size: int = UsersDataMerger.SPLIT_SIZE,
+) -> DataFrame:
+    if columns is not None:
+        columns = list(dict.fromkeys(columns + UsersDataMerger.DEDUPLICATION_COLUMNS))
+    rejections = RejectionCollector(quarantine_path)
     try:
-        merged_data = UsersDataMerger.merge_data(files_path, UsersDataExtractor, UsersDataFormatter)
-        final_data = UsersDataMerger.process_merged_users_data(merged_data)
+        merged_data = UsersDataMerger.merge_data(
+            files_path,
+            CSV_ENGINES[csv_engine],
+            UsersDataFormatter,
+            columns,
+            rejections,
+            workers,
+            metrics,
+            split_size,
+        )
+        final_data = UsersDataMerger.process_merged_users_data(merged_data, metrics)
     except Exception as e:
         print(f"An error occurred during data processing: {e}")
         return DataFrame()
     else:
         return final_data
+    finally:
+        rejections.write_quarantine()
+        rejections.print_summary()
+        if metrics is not None:
+            rejections.add_to_metrics(metrics)
 
 
 paths = [
@@ -25,4 +72,26 @@ paths = [
     ]
 ]
 
-final_users_data = process_users_data(paths)
+
+@lru_cache(maxsize=None)
+def load_final_users_data(
+    columns: Optional[Tuple[str, ...]] = None,
+    options: UsersDataOptions = UsersDataOptions(),
+) -> DataFrame:
+    return process_users_data(
+        paths if options.data_files is None else list(options.data_files),
+        None if columns is None else list(columns),
+        options.quarantine_path,
+        options.workers,
+        options.csv_engine,
+        options.metrics,
+        options.split_size,
+    )
+
+
+@lru_cache(maxsize=None)
+def load_users_backend(
+    columns: Optional[Tuple[str, ...]] = None,
+    options: UsersDataOptions = UsersDataOptions(),
+) -> InMemoryUsersBackend:
+    return InMemoryUsersBackend(load_final_users_data(columns, options))
@@ -1,60 +1,464 @@
+import bz2
+import gzip
+import io
+import lzma
+import os
 import re
-import xmltodict
+import sys
 import xml.etree.ElementTree as ET
-from typing import List, Optional
+from collections import Counter, deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from fnmatch import fnmatch
+from functools import partial
+from itertools import islice
+from typing import (
+    Callable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    TextIO,
+    Tuple,
+    Union,
+)
 import csv
 import json
-from pandas import DataFrame
+from pandas import DataFrame, Series, concat, read_csv
+from metrics import MetricsRegistry
+
+
+class DataFile(NamedTuple):
+    path: str
+    data_format: Optional[str] = None
+    size: int = 0
+    mtime_ns: int = 0
+    # Part of a CSV file: (start, end) byte offsets at line boundaries
+    byte_range: Optional[Tuple[int, int]] = None
+
+
+class UsersDataFinder:
+    DATA_FORMATS = ["csv", "json", "xml"]
+    SNIFF_SIZE = 1024
+
+    def __init__(
+        self,
+        data_dir: str,
+        include: Optional[List[str]] = None,
+        exclude: Optional[List[str]] = None,
+        stat_workers: int = 8,
+    ):
+        self.data_dir = data_dir
+        self.include = include or ["*"]
+        self.exclude = exclude or []
+        self.stat_workers = stat_workers
+
+    def is_path_selected(self, relative_path: str) -> bool:
+        included = any(fnmatch(relative_path, pattern) for pattern in self.include)
+        excluded = any(fnmatch(relative_path, pattern) for pattern in self.exclude)
+        return included and not excluded
+
+    def walk_files(self) -> List[str]:
+        files_path = []
+        directories = [self.data_dir]
+        while directories:
+            with os.scandir(directories.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        directories.append(entry.path)
+                    elif entry.is_file() and self.is_path_selected(
+                        os.path.relpath(entry.path, self.data_dir).replace(os.sep, "/")
+                    ):
+                        files_path.append(entry.path)
+        return files_path
+
+    @classmethod
+    def sniff_data_format(cls, path: str) -> Optional[str]:
+        try:
+            with UsersDataExtractor.open_data_file(path, "rb") as file:
+                head = file.read(cls.SNIFF_SIZE).lstrip()
+        except (OSError, EOFError, lzma.LZMAError):
+            return None
+        if head.startswith(b"<"):
+            return "xml"
+        elif head.startswith((b"[", b"{")):
+            return "json"
+        elif b";" in head.split(b"\n", 1)[0]:
+            return "csv"
+        return None
+
+    @classmethod
+    def detect_data_format(cls, path: str) -> Optional[str]:
+        # Extension read before the compression suffix, content sniffed from
+        # the file itself, decompressed by its opener
+        file_name = os.path.basename(path)
+        compression = UsersDataExtractor.get_compression(path)
+        if compression is not None:
+            file_name = file_name[: -len(compression) - 1]
+        file_extension = (
+            file_name.rsplit(".", 1)[-1].lower() if "." in file_name else None
+        )
+        if file_extension in cls.DATA_FORMATS:
+            return file_extension
+        return cls.sniff_data_format(path)
+
+    @classmethod
+    def describe_file(cls, path: str) -> Optional[DataFile]:
+        data_format = cls.detect_data_format(path)
+        if data_format is None:
+            return None
+        stat_result = os.stat(path)
+        return DataFile(path, data_format, stat_result.st_size, stat_result.st_mtime_ns)
+
+    def find_data_files(self) -> List[DataFile]:
+        files_path = self.walk_files()
+        with ThreadPoolExecutor(max_workers=self.stat_workers) as executor:
+            data_files = [
+                data_file
+                for data_file in executor.map(UsersDataFinder.describe_file, files_path)
+                if data_file is not None
+            ]
+        # Largest files first, so parallel ingestion workers get balanced work
+        return sorted(
+            data_files, key=lambda data_file: (-data_file.size, data_file.path)
+        )
+
+
+class JsonArrayReader:
+    CHUNK_SIZE = 64 * 1024
+    WHITESPACE_PATTERN = re.compile(r"[ \t\n\r]*")
+
+    def __init__(self, file: TextIO, chunk_size: int = CHUNK_SIZE):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.position = 0
+        self.end_of_file = False
+
+    def fill_buffer(self) -> bool:
+        if self.end_of_file:
+            return False
+        chunk = self.file.read(self.chunk_size)
+        if not chunk:
+            self.end_of_file = True
+            return False
+        self.buffer = self.buffer[self.position :] + chunk
+        self.position = 0
+        return True
+
+    def next_char(self) -> str:
+        while True:
+            self.position = self.WHITESPACE_PATTERN.match(
+                self.buffer, self.position
+            ).end()
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self.fill_buffer():
+                raise ValueError("Unexpected end of JSON array")
+
+    def decode_value(self):
+        self.next_char()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError:
+                if not self.fill_buffer():
+                    raise
+                continue
+            # Value touching the end of buffer (e.g. number) may continue in next chunk
+            if end == len(self.buffer) and self.fill_buffer():
+                continue
+            self.position = end
+            return value
+
+    def __iter__(self) -> Iterator:
+        if self.next_char() != "[":
+            raise ValueError("JSON data is not an array")
+        self.position += 1
+        if self.next_char() == "]":
+            self.position += 1
+            return
+        while True:
+            yield self.decode_value()
+            char = self.next_char()
+            self.position += 1
+            if char == "]":
+                return
+            if char != ",":
+                raise ValueError(f"Expected ',' or ']' in JSON array, got: {char}")
 
 
 class UsersDataExtractor:
-    def __init__(self, path_to_file: str):
+    COMPRESSION_OPENERS = {"gz": gzip.open, "bz2": bz2.open, "xz": lzma.open}
+
+    def __init__(
+        self,
+        path_to_file: str,
+        columns: Optional[List[str]] = None,
+        data_format: Optional[str] = None,
+        byte_range: Optional[Tuple[int, int]] = None,
+    ):
         self.path_to_file = path_to_file
-        self.file_extension = self.extract_file_extension()
+        self.columns = columns
+        self.byte_range = byte_range
+        self.compression = UsersDataExtractor.get_compression(path_to_file)
+        self.file_extension = (
+            self.extract_file_extension() if data_format is None else data_format
+        )
+        self.data_format = (
+            self.file_extension.split(".", 1)[0]
+            if self.file_extension is not None
+            else None
+        )
+
+    @classmethod
+    def get_compression(cls, path_to_file: str) -> Optional[str]:
+        suffix = path_to_file.rsplit(".", 1)[-1].lower()
+        return suffix if suffix in cls.COMPRESSION_OPENERS else None
+
+    @classmethod
+    def open_data_file(
+        cls, path_to_file: str, mode: str = "rt", newline: Optional[str] = None
+    ):
+        compression = cls.get_compression(path_to_file)
+        if compression is None:
+            return open(path_to_file, mode, newline=newline)
+        if "b" in mode:
+            return cls.COMPRESSION_OPENERS[compression](path_to_file, mode)
+        return cls.COMPRESSION_OPENERS[compression](path_to_file, mode, newline=newline)
+
+    def open_csv_file(self) -> TextIO:
+        if self.byte_range is None:
+            return self.open_data_file(self.path_to_file, newline="")
+        # Header line followed by the rows of the byte range
+        start, end = self.byte_range
+        with open(self.path_to_file, "rb") as file:
+            header = file.readline()
+            file.seek(start)
+            data = file.read(end - start)
+        return io.TextIOWrapper(io.BytesIO(header + data), newline="")
+
+    @staticmethod
+    def get_csv_byte_ranges(
+        path_to_file: str, split_size: int
+    ) -> List[Tuple[int, int]]:
+        # Ranges of about split_size bytes, each ending after a newline.
+        # Fields with quoted newlines are not supported, as in the data files.
+        byte_ranges = []
+        with open(path_to_file, "rb") as file:
+            start = len(file.readline())
+            size = os.fstat(file.fileno()).st_size
+            while start < size:
+                file.seek(min(start + split_size, size))
+                file.readline()
+                end = file.tell()
+                byte_ranges.append((start, end))
+                start = end
+        return byte_ranges
 
     def extract_file_extension(self) -> Optional[str]:
+        path_to_file = self.path_to_file
+        if self.compression is not None:
+            path_to_file = path_to_file[: -len(self.compression) - 1]
         try:
-            file_extension = self.path_to_file.rsplit(".", 1)[1]
+            file_extension = path_to_file.rsplit(".", 1)[1]
         except IndexError:
             print(f"File extension not recognized in: {self.path_to_file}")
             return None
         else:
+            if self.compression is not None:
+                return f"{file_extension}.{self.compression}"
             return file_extension
 
-    def extract_data(self) -> Optional[List[dict]]:
-        if self.file_extension == "xml":
+    def extract_data(self) -> Optional[Union[List[dict], Iterator[dict]]]:
+        if self.data_format == "xml":
             return self.parse_xml()
-        elif self.file_extension == "csv":
+        elif self.data_format == "csv":
             return self.read_csv()
-        elif self.file_extension == "json":
+        elif self.data_format == "json":
             return self.read_json()
         else:
             print(f"File extension ({self.file_extension}) is not supported.")
             return None
 
+    def extract_records(self) -> Optional[Iterator]:
+        # Lazy version of extract_data, one user (or frame of users) at a time
+        if self.data_format == "xml":
+            return self.iter_xml()
+        elif self.data_format == "csv":
+            return self.iter_csv()
+        elif self.data_format == "json":
+            return self.read_json()
+        return None
+
+    def iter_batches(
+        self, batch_size: int, metrics: Optional[MetricsRegistry] = None
+    ) -> Iterator[list]:
+        records = self.extract_records()
+        if records is None:
+            return
+        if metrics is not None:
+            records = self.count_rows(records, metrics)
+        while True:
+            batch = list(islice(records, batch_size))
+            if not batch:
+                return
+            yield batch
+
+    def count_rows(self, rows: Iterator, metrics: MetricsRegistry) -> Iterator:
+        rows_count = 0
+        try:
+            for row in rows:
+                rows_count += len(row) if isinstance(row, DataFrame) else 1
+                yield row
+        finally:
+            metrics.inc(
+                "users_data_rows_read_total", rows_count, source=self.path_to_file
+            )
+
+    def extract_counted_data(
+        self, metrics: Optional[MetricsRegistry] = None
+    ) -> Optional[Union[List[dict], Iterator]]:
+        # Lazy readers are counted as their rows are consumed by the formatter
+        extracted_data = self.extract_data()
+        if metrics is None or extracted_data is None:
+            return extracted_data
+        if isinstance(extracted_data, list):
+            metrics.inc(
+                "users_data_rows_read_total",
+                len(extracted_data),
+                source=self.path_to_file,
+            )
+            return extracted_data
+        return self.count_rows(extracted_data, metrics)
+
+    def project_user(self, user: dict) -> dict:
+        if self.columns is None:
+            return user
+        return {key: user[key] for key in self.columns if key in user}
+
+    @staticmethod
+    def get_xml_text(element: ET.Element) -> Optional[str]:
+        return element.text.strip() if element.text else None
+
+    def parse_xml_user(self, user_element: ET.Element) -> dict:
+        user = {}
+        for field in user_element:
+            if self.columns is not None and field.tag not in self.columns:
+                continue
+            if field.tag == "children":
+                user["children"] = [
+                    {
+                        child_field.tag: UsersDataExtractor.get_xml_text(child_field)
+                        for child_field in child
+                    }
+                    for child in field.findall("child")
+                ]
+            else:
+                user[field.tag] = UsersDataExtractor.get_xml_text(field)
+        return user
+
+    def iter_xml(self) -> Iterator[dict]:
+        with self.open_data_file(self.path_to_file, "rb") as file:
+            for _, element in ET.iterparse(file):
+                if element.tag == "user":
+                    yield self.parse_xml_user(element)
+                    element.clear()
+
     def parse_xml(self) -> List[dict]:
-        tree = ET.parse(self.path_to_file)
-        root = tree.getroot()
-        return xmltodict.parse(ET.tostring(root))["users"]["user"]
+        return list(self.iter_xml())
 
-    def read_json(self) -> List[dict]:
-        with open(self.path_to_file) as file:
-            data = json.load(file)
-        return data
+    def read_json(self) -> Iterator[dict]:
+        with self.open_data_file(self.path_to_file) as file:
+            for user in JsonArrayReader(file):
+                yield self.project_user(user)
+
+    def iter_csv(self) -> Iterator[dict]:
+        with self.open_csv_file() as csvfile:
+            for user in csv.DictReader(csvfile, delimiter=";"):
+                yield self.project_user(user)
 
     def read_csv(self) -> List[dict]:
-        with open(self.path_to_file, newline="") as csvfile:
-            reader = csv.DictReader(csvfile, delimiter=";")
-            data = list(reader)
-        return data
+        return list(self.iter_csv())
+
+
+class ChunkedCsvUsersDataExtractor(UsersDataExtractor):
+    CHUNK_SIZE = 100000
+
+    def __init__(
+        self,
+        path_to_file: str,
+        columns: Optional[List[str]] = None,
+        data_format: Optional[str] = None,
+        chunk_size: int = CHUNK_SIZE,
+        byte_range: Optional[Tuple[int, int]] = None,
+    ):
+        super().__init__(path_to_file, columns, data_format, byte_range)
+        self.chunk_size = chunk_size
+        if self.data_format == "csv":
+            self.data_format = "csv-chunks"
+
+    def extract_data(self) -> Optional[Union[List[dict], Iterator]]:
+        if self.data_format == "csv-chunks":
+            return self.read_csv_chunks()
+        return super().extract_data()
+
+    def extract_records(self) -> Optional[Iterator]:
+        if self.data_format == "csv-chunks":
+            return self.read_csv_chunks()
+        return super().extract_records()
+
+    def iter_batches(
+        self, batch_size: int, metrics: Optional[MetricsRegistry] = None
+    ) -> Iterator[list]:
+        # Frames of the C parser are batches already
+        return super().iter_batches(
+            1 if self.data_format == "csv-chunks" else batch_size, metrics
+        )
+
+    def read_csv_chunks(self) -> Iterator[DataFrame]:
+        with self.open_csv_file() as csvfile:
+            for chunk in read_csv(
+                csvfile,
+                sep=";",
+                dtype=str,
+                keep_default_na=False,
+                usecols=(
+                    None
+                    if self.columns is None
+                    else lambda column: column in self.columns
+                ),
+                chunksize=self.chunk_size,
+            ):
+                # Missing trailing fields are None, as in csv.DictReader
+                yield chunk.astype(object).where(chunk.notna(), None)
 
 
 class UsersDataFormatter:
     TELEPHONE_FORMATTING_PATTERN = r"\s|\+48|\(48\)|^00"
     EMAIL_VALID_PATTERN = r"(^[^@]+@[^@\.]+\.[a-z\d]{1,4}$)"
 
-    def __init__(self, data_to_format: List[dict]):
+    def __init__(
+        self,
+        data_to_format: List[dict],
+        columns: Optional[List[str]] = None,
+        rejections: Optional["RejectionCollector"] = None,
+        source: Optional[str] = None,
+    ):
         self.data = data_to_format
+        self.columns = columns
+        self.rejections = rejections
+        self.source = source
+
+    @classmethod
+    def for_data_format(cls, data_format: Optional[str]):
+        formatters = {
+            "csv": CsvUsersDataFormatter,
+            "csv-chunks": ChunkedCsvUsersDataFormatter,
+            "json": JsonUsersDataFormatter,
+            "xml": XmlUsersDataFormatter,
+        }
+        return formatters.get(data_format, cls)
 
     @staticmethod
     def filter_data(data: List[dict]) -> List[dict]:
@@ -78,7 +482,9 @@ class UsersDataFormatter:
             return True if result else False
 
     @classmethod
-    def get_info_on_user_children(cls, user: dict) -> Optional[List[dict]]:
+    def get_info_on_user_children(
+        cls, user: dict, reject: Optional[Callable] = None
+    ) -> Optional[List[dict]]:
         if not cls.is_data_present("children", user):
             return None
         children_data = user.get("children", "")
@@ -106,64 +512,502 @@ class UsersDataFormatter:
             ]
 
     @staticmethod
-    def children_age_to_int(children_data: List[dict]) -> Optional[List[dict]]:
+    def children_age_to_int(
+        children_data: List[dict], reject: Optional[Callable] = None
+    ) -> Optional[List[dict]]:
         if children_data is not None:
             for child in children_data:
                 try:
                     child["age"] = int(child["age"])
                 except (ValueError, KeyError):
-                    print(f"Incorrect format of child age: {child}")
+                    if reject is not None:
+                        reject("incorrect format of child age", child)
         return children_data
 
     @classmethod
-    def format_user_data(cls, user: dict) -> Optional[dict]:
-        if not cls.is_data_present("telephone_number", user) or not cls.is_email_valid(
-                user.get("email")
-        ):
+    def format_user_data(
+        cls,
+        user: dict,
+        columns: Optional[List[str]] = None,
+        reject: Optional[Callable] = None,
+    ) -> Optional[dict]:
+        if not cls.is_data_present("telephone_number", user):
+            if reject is not None:
+                reject("missing telephone number", user)
+            return None
+        if not cls.is_email_valid(user.get("email")):
+            if reject is not None:
+                reject("invalid email", user)
             return None
         user["telephone_number"] = cls.format_tel_num(user["telephone_number"])
-        user["children"] = cls.get_info_on_user_children(user)
-        user["children"] = cls.children_age_to_int(user["children"])
+        if columns is None or "children" in columns:
+            user["children"] = cls.get_info_on_user_children(user, reject)
+            user["children"] = cls.children_age_to_int(user["children"], reject)
         return user
 
     def process_data(self) -> Optional[List[dict]]:
+        reject = (
+            partial(self.rejections.reject, self.source)
+            if self.rejections is not None
+            else None
+        )
         try:
             format_data = [
-                UsersDataFormatter.format_user_data(user) for user in self.data
+                self.format_user_data(user, self.columns, reject) for user in self.data
             ]
             valid_data = UsersDataFormatter.filter_data(format_data)
         except Exception as e:
-            print(f"Encounter error while processing data {e}")
+            if reject is None:
+                print(f"Encounter error while processing data {e}")
+            else:
+                reject("error while processing data", {"error": str(e)})
             return None
         return valid_data
 
 
+class CsvUsersDataFormatter(UsersDataFormatter):
+    CHILDREN_PATTERN = re.compile(r"\s*([^,(]+?)\s*\(\s*([^)]*?)\s*\)")
+
+    @classmethod
+    def get_info_on_user_children(
+        cls, user: dict, reject: Optional[Callable] = None
+    ) -> Optional[List[dict]]:
+        if not cls.is_data_present("children", user):
+            return None
+        return cls.parse_children(user["children"], reject)
+
+    @classmethod
+    def parse_children(
+        cls, children_data: str, reject: Optional[Callable] = None
+    ) -> List[dict]:
+        # Entries without "(age)" between the matching ones are rejected
+        children = []
+        position = 0
+        for match in cls.CHILDREN_PATTERN.finditer(children_data):
+            cls.reject_children_without_age(
+                children_data[position : match.start()], reject
+            )
+            children.append({"name": match.group(1), "age": match.group(2)})
+            position = match.end()
+        cls.reject_children_without_age(children_data[position:], reject)
+        return children
+
+    @staticmethod
+    def reject_children_without_age(text: str, reject: Optional[Callable]):
+        if reject is None:
+            return
+        for child in text.split(","):
+            if child.strip():
+                reject("missing child age", {"child": child.strip()})
+
+
+class ChunkedCsvUsersDataFormatter(CsvUsersDataFormatter):
+    def format_chunk(self, chunk: DataFrame, reject: Optional[Callable]) -> DataFrame:
+        telephone_numbers = (
+            chunk["telephone_number"]
+            if "telephone_number" in chunk
+            else Series(None, index=chunk.index, dtype=object)
+        )
+        emails = (
+            chunk["email"]
+            if "email" in chunk
+            else Series(None, index=chunk.index, dtype=object)
+        )
+        missing_telephone = telephone_numbers.isna() | (telephone_numbers == "")
+        valid_email = (
+            emails.str.match(self.EMAIL_VALID_PATTERN, case=False)
+            .fillna(False)
+            .astype(bool)
+        )
+        if reject is not None:
+            self.rejections.reject_rows(
+                self.source, "missing telephone number", chunk[missing_telephone]
+            )
+            self.rejections.reject_rows(
+                self.source, "invalid email", chunk[~missing_telephone & ~valid_email]
+            )
+        valid_data = chunk[~missing_telephone & valid_email].reset_index(drop=True)
+        if valid_data.empty:
+            return valid_data
+        valid_data["telephone_number"] = valid_data["telephone_number"].str.replace(
+            self.TELEPHONE_FORMATTING_PATTERN, "", regex=True
+        )
+        if "children" in valid_data and (
+            self.columns is None or "children" in self.columns
+        ):
+            valid_data["children"] = Series(
+                [
+                    (
+                        self.children_age_to_int(
+                            self.parse_children(children, reject), reject
+                        )
+                        if children not in ["", None]
+                        else None
+                    )
+                    for children in valid_data["children"]
+                ],
+                dtype=object,
+            )
+        return valid_data
+
+    def process_data(self) -> Optional[DataFrame]:
+        reject = (
+            partial(self.rejections.reject, self.source)
+            if self.rejections is not None
+            else None
+        )
+        try:
+            formatted_chunks = [self.format_chunk(chunk, reject) for chunk in self.data]
+        except Exception as e:
+            if reject is None:
+                print(f"Encounter error while processing data {e}")
+            else:
+                reject("error while processing data", {"error": str(e)})
+            return None
+        if not formatted_chunks:
+            return DataFrame()
+        return concat(formatted_chunks, ignore_index=True)
+
+
+class JsonUsersDataFormatter(UsersDataFormatter):
+    @classmethod
+    def get_info_on_user_children(
+        cls, user: dict, reject: Optional[Callable] = None
+    ) -> Optional[List[dict]]:
+        if not cls.is_data_present("children", user):
+            return None
+        return list(user["children"])
+
+
+class XmlUsersDataFormatter(JsonUsersDataFormatter):
+    # Children are already extracted as list of dicts by UsersDataExtractor.parse_xml
+    pass
+
+
+class RejectionCollector:
+    def __init__(self, quarantine_path: Optional[str] = None, sample_size: int = 1000):
+        self.quarantine_path = quarantine_path
+        self.sample_size = sample_size
+        self.counts = Counter()
+        self.samples = []
+
+    def merge(self, other: "RejectionCollector"):
+        self.counts.update(other.counts)
+        self.samples.extend(other.samples[: self.sample_size - len(self.samples)])
+
+    def reject(self, source: Optional[str], reason: str, row: Optional[dict] = None):
+        self.counts[(reason, source)] += 1
+        if (
+            self.quarantine_path is not None
+            and row is not None
+            and len(self.samples) < self.sample_size
+        ):
+            self.reject_sample(source, reason, row)
+
+    def reject_sample(self, source: Optional[str], reason: str, row: dict):
+        self.samples.append(
+            {
+                "source": source,
+                "reason": reason,
+                "row": {key: row[key] for key in row if key != "password"},
+            }
+        )
+
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+    def summary(self) -> List[str]:
+        return [
+            f"{reason} in {source}: {count}"
+            for (reason, source), count in sorted(
+                self.counts.items(), key=lambda item: (item[0][0], str(item[0][1]))
+            )
+        ]
+
+    def reject_rows(self, source: Optional[str], reason: str, rows: DataFrame):
+        if rows.empty:
+            return
+        self.counts[(reason, source)] += len(rows)
+        if self.quarantine_path is not None and len(self.samples) < self.sample_size:
+            for row in rows.head(self.sample_size - len(self.samples)).to_dict(
+                orient="records"
+            ):
+                self.reject_sample(source, reason, row)
+
+    def write_quarantine(self):
+        if self.quarantine_path is None or not self.samples:
+            return
+        with open(self.quarantine_path, "w") as quarantine_file:
+            quarantine_file.write(
+                "\n".join(json.dumps(sample, default=str) for sample in self.samples)
+                + "\n"
+            )
+
+    def add_to_metrics(self, metrics: MetricsRegistry):
+        for (reason, source), count in self.counts.items():
+            metrics.inc(
+                "users_data_rows_rejected_total",
+                count,
+                reason=reason,
+                source="" if source is None else source,
+            )
+
+    def print_summary(self):
+        if self.counts:
+            print(
+                "\n".join([f"Rejected rows: {self.total()}"] + self.summary()),
+                file=sys.stderr,
+            )
+
+
 class UsersDataMerger:
+    DEDUPLICATION_COLUMNS = ["created_at", "telephone_number", "email"]
+    # With workers, files larger than SPLIT_SIZE bytes are formatted in parts
+    SPLIT_SIZE = 32 * 1024 * 1024
+    BATCH_SIZE = 50000
 
     @staticmethod
-    def merge_data(files_path: List[str], data_extractor, data_formatter) -> List[dict]:
-        merged_data = []
-        for path in files_path:
-            extracted_data = data_extractor(path).extract_data()
-            formatted_data = data_formatter(extracted_data).process_data()
-            if formatted_data:
-                merged_data.extend(formatted_data)
-        return merged_data
+    def process_file(
+        data_file: Union[str, DataFile],
+        data_extractor,
+        data_formatter,
+        columns: Optional[List[str]] = None,
+        rejections: Optional[RejectionCollector] = None,
+        metrics: Optional[MetricsRegistry] = None,
+    ) -> Optional[List[dict]]:
+        if isinstance(data_file, str):
+            data_file = DataFile(data_file)
+        extractor = data_extractor(
+            data_file.path,
+            columns,
+            data_file.data_format,
+            byte_range=data_file.byte_range,
+        )
+        try:
+            extracted_data = extractor.extract_counted_data(metrics)
+        except Exception as e:
+            # XML files are parsed whole here, other readers fail while formatted
+            UsersDataMerger.reject_file(data_file, rejections, e)
+            return None
+        if extracted_data is None and rejections is not None:
+            rejections.reject(data_file.path, "unsupported file format")
+            return None
+        formatter = data_formatter.for_data_format(extractor.data_format)
+        return formatter(
+            extracted_data, columns, rejections, data_file.path
+        ).process_data()
 
     @staticmethod
-    def process_merged_users_data(merged_data: List[dict]) -> DataFrame:
+    def reject_file(
+        data_file: DataFile, rejections: Optional[RejectionCollector], error: Exception
+    ):
+        if rejections is None:
+            print(f"Encounter error while processing data {error}")
+        else:
+            rejections.reject(
+                data_file.path, "error while processing data", {"error": str(error)}
+            )
+
+    @staticmethod
+    def process_file_in_worker(
+        data_file: Union[str, DataFile],
+        data_extractor,
+        data_formatter,
+        columns: Optional[List[str]],
+        rejections: Optional[RejectionCollector],
+        metrics: Optional[MetricsRegistry],
+    ) -> tuple:
+        formatted_data = UsersDataMerger.process_file(
+            data_file, data_extractor, data_formatter, columns, rejections, metrics
+        )
+        return formatted_data, rejections, metrics
+
+    @staticmethod
+    def format_batch_in_worker(
+        batch: list,
+        data_format: Optional[str],
+        data_formatter,
+        columns: Optional[List[str]],
+        rejections: Optional[RejectionCollector],
+        source: str,
+    ) -> tuple:
+        formatter = data_formatter.for_data_format(data_format)
+        formatted_data = formatter(batch, columns, rejections, source).process_data()
+        return formatted_data, rejections, None
+
+    @staticmethod
+    def submit_file(
+        executor: ProcessPoolExecutor,
+        data_file: Union[str, DataFile],
+        data_extractor,
+        data_formatter,
+        columns: Optional[List[str]] = None,
+        rejections: Optional[RejectionCollector] = None,
+        metrics: Optional[MetricsRegistry] = None,
+        split_size: int = SPLIT_SIZE,
+    ) -> Iterator[Future]:
+        # Futures of the file parts, in file order, submitted as they are
+        # consumed. Uncompressed CSV files are split into byte ranges read by
+        # the workers, other formats are read here by the streaming parsers and
+        # batches of users formatted in workers.
+        if isinstance(data_file, str):
+            data_file = DataFile(data_file)
+
+        def get_rejections() -> Optional[RejectionCollector]:
+            if rejections is None:
+                return None
+            return RejectionCollector(
+                rejections.quarantine_path, rejections.sample_size
+            )
+
+        def submit_part(part: DataFile) -> Future:
+            return executor.submit(
+                UsersDataMerger.process_file_in_worker,
+                part,
+                data_extractor,
+                data_formatter,
+                columns,
+                get_rejections(),
+                None if metrics is None else MetricsRegistry(),
+            )
+
+        try:
+            size = data_file.size or os.path.getsize(data_file.path)
+        except OSError:
+            size = 0
+        extractor = data_extractor(data_file.path, columns, data_file.data_format)
+        if size <= split_size or extractor.extract_records() is None:
+            yield submit_part(data_file)
+        elif (
+            extractor.data_format in ["csv", "csv-chunks"] and not extractor.compression
+        ):
+            for byte_range in UsersDataExtractor.get_csv_byte_ranges(
+                data_file.path, split_size
+            ):
+                yield submit_part(data_file._replace(byte_range=byte_range))
+        else:
+            for batch in extractor.iter_batches(UsersDataMerger.BATCH_SIZE, metrics):
+                yield executor.submit(
+                    UsersDataMerger.format_batch_in_worker,
+                    batch,
+                    extractor.data_format,
+                    data_formatter,
+                    columns,
+                    get_rejections(),
+                    data_file.path,
+                )
+
+    @staticmethod
+    def merge_data(
+        files_path: List[Union[str, DataFile]],
+        data_extractor,
+        data_formatter,
+        columns: Optional[List[str]] = None,
+        rejections: Optional[RejectionCollector] = None,
+        workers: int = 1,
+        metrics: Optional[MetricsRegistry] = None,
+        split_size: int = SPLIT_SIZE,
+    ) -> Union[List[dict], DataFrame]:
+        merged_parts = []
+        # Files whose part failed to parse or format are dropped whole, as
+        # process_file drops them without workers
+        failed_files = set()
+
+        def drop_file(file_number: int):
+            failed_files.add(file_number)
+            merged_parts[:] = [part for part in merged_parts if part[0] != file_number]
+
+        def merge_part(file_number: int, future: Future):
+            formatted_data, part_rejections, part_metrics = future.result()
+            if rejections is not None:
+                rejections.merge(part_rejections)
+            if metrics is not None and part_metrics is not None:
+                metrics.merge(part_metrics)
+            if formatted_data is None:
+                drop_file(file_number)
+            elif len(formatted_data) and file_number not in failed_files:
+                merged_parts.append((file_number, formatted_data))
+
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                # Parts are merged in submission order, as formatted one by one.
+                # At most 2 * workers parts are pending, so batches read here
+                # don't pile up ahead of the workers.
+                pending = deque()
+                for file_number, data_file in enumerate(files_path):
+                    if isinstance(data_file, str):
+                        data_file = DataFile(data_file)
+                    try:
+                        for future in UsersDataMerger.submit_file(
+                            executor,
+                            data_file,
+                            data_extractor,
+                            data_formatter,
+                            columns,
+                            rejections,
+                            metrics,
+                            split_size,
+                        ):
+                            pending.append((file_number, future))
+                            if len(pending) >= 2 * workers:
+                                merge_part(*pending.popleft())
+                    except Exception as e:
+                        # Batches of XML, JSON and compressed files are read here
+                        UsersDataMerger.reject_file(data_file, rejections, e)
+                        drop_file(file_number)
+                while pending:
+                    merge_part(*pending.popleft())
+        else:
+            for file_number, data_file in enumerate(files_path):
+                formatted_data = UsersDataMerger.process_file(
+                    data_file,
+                    data_extractor,
+                    data_formatter,
+                    columns,
+                    rejections,
+                    metrics,
+                )
+                if formatted_data is not None and len(formatted_data):
+                    merged_parts.append((file_number, formatted_data))
+        return UsersDataMerger.combine_merged_parts(
+            [formatted_data for _, formatted_data in merged_parts]
+        )
+
+    @staticmethod
+    def combine_merged_parts(merged_parts: list) -> Union[List[dict], DataFrame]:
+        # Columnar formatters return frames, keep plain list when there are none
+        if not any(isinstance(part, DataFrame) for part in merged_parts):
+            return [user for part in merged_parts for user in part]
+        return concat(
+            [
+                part if isinstance(part, DataFrame) else DataFrame(part)
+                for part in merged_parts
+            ],
+            ignore_index=True,
+        )
+
+    @staticmethod
+    def process_merged_users_data(
+        merged_data: Union[List[dict], DataFrame],
+        metrics: Optional[MetricsRegistry] = None,
+    ) -> DataFrame:
         try:
             df_merged_data = DataFrame(merged_data)
             if not df_merged_data.empty:
                 df_merged_data = df_merged_data.sort_values(
                     by="created_at", ascending=False
                 )
-                df_merged_data.drop_duplicates(
-                    subset=["telephone_number"], keep="first", inplace=True
-                )
-                df_merged_data.drop_duplicates(
-                    subset=["email"], keep="first", inplace=True
-                )
+                for column in ["telephone_number", "email"]:
+                    rows_count = len(df_merged_data)
+                    df_merged_data.drop_duplicates(
+                        subset=[column], keep="first", inplace=True
+                    )
+                    if metrics is not None:
+                        metrics.inc(
+                            "users_data_duplicates_dropped_total",
+                            rows_count - len(df_merged_data),
+                            column=column,
+                        )
         except Exception as e:
             print(f"Encounter error while processing merged data: {e}")
             return DataFrame()
@@ -0,0 +1,444 @@
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+import itertools
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from typing import Callable, List, Optional, Union
+from pandas import DataFrame
+from metrics import MetricsRegistry
+from users_backends import BackendError, SqliteUsersBackend
+from users_data_index import LoginsBloomFilter
+from users_data_utils import (
+    DataFile,
+    RejectionCollector,
+    UsersDataExtractor,
+    UsersDataFormatter,
+    UsersDataMerger,
+)
+
+STAGING_COLUMNS = [
+    "email",
+    "firstname",
+    "telephone_number",
+    "password",
+    "role",
+    "created_at",
+    "children",
+    "file_number",
+    "batch_number",
+    "batch_row",
+]
+
+# Formatted users land here first, one row per telephone number. Temporary
+# tables live in a separate file, dropped with the connection.
+CREATE_STAGING_TABLE = """CREATE TEMP TABLE users_staging
+  (
+     email            TEXT,
+     firstname        TEXT,
+     telephone_number TEXT NOT NULL,
+     password         TEXT,
+     role             TEXT,
+     created_at       TEXT,
+     children         TEXT,
+     file_number      INTEGER NOT NULL,
+     batch_number     INTEGER NOT NULL,
+     batch_row        INTEGER NOT NULL
+  );"""
+
+CREATE_STAGING_INDEX = """CREATE UNIQUE INDEX temp.idx_users_staging_telephone_number
+    ON users_staging(telephone_number);"""
+
+# Newest row per telephone number wins, ties keep the first in file order
+UPSERT_STAGING = """INSERT INTO users_staging ({columns})
+    VALUES ({values})
+    ON CONFLICT (telephone_number) DO UPDATE SET {updates}
+    WHERE excluded.created_at > users_staging.created_at
+        OR (excluded.created_at = users_staging.created_at
+            AND (excluded.file_number, excluded.batch_number, excluded.batch_row)
+                < (users_staging.file_number, users_staging.batch_number,
+                    users_staging.batch_row));""".format(
+    columns=", ".join(STAGING_COLUMNS),
+    values=", ".join("?" * len(STAGING_COLUMNS)),
+    updates=", ".join(f"{column} = excluded.{column}" for column in STAGING_COLUMNS),
+)
+
+# Users are numbered newest first, as in merged data. The unique email index
+# of users_data keeps the newest of the users sharing an email.
+INSERT_USERS = """INSERT INTO users_data
+    (email, firstname, telephone_number, password, role, created_at)
+    SELECT email, firstname, telephone_number, password, role, created_at
+    FROM users_staging WHERE true
+    ORDER BY created_at DESC, file_number, batch_number, batch_row
+    ON CONFLICT (email) DO NOTHING;"""
+
+INSERT_CHILDREN = """INSERT INTO users_children (parent_id, child_name, child_age)
+    SELECT users_data.user_id, json_extract(child.value, '$.name'),
+        json_extract(child.value, '$.age')
+    FROM users_data
+    JOIN users_staging USING (telephone_number),
+        json_each(users_staging.children) AS child
+    ORDER BY users_data.user_id, child.key;"""
+
+
+class PipelineStopped(Exception):
+    pass
+
+
+class UsersDbLoader:
+    # Loads data files into a new SQLite database in a pipeline: reader
+    # threads stream batches of rows from the files, formatter threads
+    # validate them (in worker processes with workers > 1) and one writer
+    # thread upserts them into a staging table with executemany. Queues are
+    # bounded, a slow stage holds back the ones before it and memory stays
+    # flat. Duplicates are dropped by unique indexes as by
+    # UsersDataMerger.process_merged_users_data.
+    STAGES = ["read", "format", "write", "finalize"]
+    BATCH_SIZE = 2000
+    QUEUE_SIZE = 4
+    READERS = 2
+    POLL_SECONDS = 0.1
+
+    def __init__(
+        self,
+        db_path: str,
+        data_extractor=UsersDataExtractor,
+        data_formatter=UsersDataFormatter,
+        workers: int = 1,
+        rejections: Optional[RejectionCollector] = None,
+        metrics: Optional[MetricsRegistry] = None,
+        busy_timeout: int = SqliteUsersBackend.BUSY_TIMEOUT,
+        false_positive_rate: float = LoginsBloomFilter.FALSE_POSITIVE_RATE,
+        batch_size: int = BATCH_SIZE,
+        queue_size: int = QUEUE_SIZE,
+    ):
+        self.db_path = db_path
+        self.data_extractor = data_extractor
+        self.data_formatter = data_formatter
+        self.workers = workers
+        self.rejections = rejections
+        self.metrics = metrics
+        self.busy_timeout = busy_timeout
+        self.false_positive_rate = false_positive_rate
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.stopped = threading.Event()
+        self.errors = []
+        self.lock = threading.Lock()
+        # Rows and busy seconds of each stage, summed over its threads
+        self.rows = dict.fromkeys(self.STAGES, 0)
+        self.seconds = dict.fromkeys(self.STAGES, 0.0)
+        self.staged_users = 0
+        self.inserted_users = 0
+
+    def load(self, data_files: List[Union[str, DataFile]]) -> int:
+        files = queue.Queue()
+        for file_number, data_file in enumerate(data_files):
+            if isinstance(data_file, str):
+                data_file = DataFile(data_file)
+            files.put((file_number, data_file))
+        raw_batches = queue.Queue(self.queue_size)
+        formatted_batches = queue.Queue(self.queue_size)
+        readers_count = max(1, min(self.READERS, len(data_files)))
+        formatters_count = max(1, self.workers)
+        rejections = [self.new_rejections() for _ in range(readers_count)] + [
+            self.new_rejections() for _ in range(formatters_count)
+        ]
+        reader_metrics = [
+            None if self.metrics is None else MetricsRegistry()
+            for _ in range(readers_count)
+        ]
+
+        with (
+            ProcessPoolExecutor(max_workers=self.workers)
+            if self.workers > 1
+            else nullcontext()
+        ) as executor:
+            writer = self.start(self.write_users, formatted_batches)
+            formatters = [
+                self.start(
+                    self.format_batches,
+                    raw_batches,
+                    formatted_batches,
+                    executor,
+                    rejections[readers_count + number],
+                )
+                for number in range(formatters_count)
+            ]
+            readers = [
+                self.start(
+                    self.read_files,
+                    files,
+                    raw_batches,
+                    rejections[number],
+                    reader_metrics[number],
+                )
+                for number in range(readers_count)
+            ]
+            # End of input flows down the pipeline, one marker per consumer
+            self.join(readers, raw_batches, formatters_count)
+            self.join(formatters, formatted_batches, 1)
+            self.join([writer])
+
+        for stage_rejections in rejections:
+            if self.rejections is not None:
+                self.rejections.merge(stage_rejections)
+        if self.metrics is not None:
+            for registry in reader_metrics:
+                self.metrics.merge(registry)
+        if self.errors:
+            for path in [self.db_path, f"{self.db_path}-wal", f"{self.db_path}-shm"]:
+                if os.path.exists(path):
+                    os.remove(path)
+            raise BackendError(str(self.errors[0])) from self.errors[0]
+        if self.metrics is not None:
+            self.add_to_metrics(self.metrics)
+        return self.inserted_users
+
+    def new_rejections(self) -> Optional[RejectionCollector]:
+        if self.rejections is None:
+            return None
+        return RejectionCollector(
+            self.rejections.quarantine_path, self.rejections.sample_size
+        )
+
+    def start(self, stage: Callable, *args) -> threading.Thread:
+        thread = threading.Thread(target=self.run_stage, args=(stage, *args))
+        thread.start()
+        return thread
+
+    def run_stage(self, stage: Callable, *args):
+        # A failed stage stops the others, its error is raised by load
+        try:
+            stage(*args)
+        except PipelineStopped:
+            pass
+        except BaseException as e:
+            with self.lock:
+                self.errors.append(e)
+            self.stopped.set()
+
+    def join(
+        self,
+        threads: List[threading.Thread],
+        consumers_queue: Optional[queue.Queue] = None,
+        consumers_count: int = 0,
+    ):
+        for thread in threads:
+            thread.join()
+        try:
+            for _ in range(consumers_count):
+                self.put(consumers_queue, None)
+        except PipelineStopped:
+            pass
+
+    def put(self, batches: queue.Queue, item):
+        while True:
+            if self.stopped.is_set():
+                raise PipelineStopped
+            try:
+                batches.put(item, timeout=self.POLL_SECONDS)
+                return
+            except queue.Full:
+                pass
+
+    def get(self, batches: queue.Queue):
+        while True:
+            if self.stopped.is_set():
+                raise PipelineStopped
+            try:
+                return batches.get(timeout=self.POLL_SECONDS)
+            except queue.Empty:
+                pass
+
+    def add_stage_time(self, stage: str, rows: int, started: float):
+        with self.lock:
+            self.rows[stage] += rows
+            self.seconds[stage] += time.perf_counter() - started
+
+    @staticmethod
+    def count_rows(batch: list) -> int:
+        # Batches of the chunked CSV reader hold frames of rows
+        return sum(len(row) if isinstance(row, DataFrame) else 1 for row in batch)
+
+    def read_files(
+        self,
+        files: queue.Queue,
+        raw_batches: queue.Queue,
+        rejections: Optional[RejectionCollector],
+        metrics: Optional[MetricsRegistry],
+    ):
+        while True:
+            try:
+                file_number, data_file = files.get_nowait()
+            except queue.Empty:
+                return
+            extractor = self.data_extractor(data_file.path, None, data_file.data_format)
+            if extractor.extract_records() is None:
+                if rejections is not None:
+                    rejections.reject(data_file.path, "unsupported file format")
+                continue
+            batches = extractor.iter_batches(self.batch_size, metrics)
+            for batch_number in itertools.count():
+                started = time.perf_counter()
+                try:
+                    batch = next(batches, None)
+                except Exception as e:
+                    # A malformed file stops at its last batch, others load on
+                    if rejections is None:
+                        print(f"Encounter error while processing data {e}")
+                    else:
+                        rejections.reject(
+                            data_file.path,
+                            "error while processing data",
+                            {"error": str(e)},
+                        )
+                    break
+                if batch is None:
+                    break
+                self.add_stage_time("read", self.count_rows(batch), started)
+                self.put(
+                    raw_batches,
+                    (
+                        file_number,
+                        batch_number,
+                        extractor.data_format,
+                        data_file.path,
+                        batch,
+                    ),
+                )
+
+    def format_batches(
+        self,
+        raw_batches: queue.Queue,
+        formatted_batches: queue.Queue,
+        executor: Optional[ProcessPoolExecutor],
+        rejections: Optional[RejectionCollector],
+    ):
+        while True:
+            item = self.get(raw_batches)
+            if item is None:
+                return
+            file_number, batch_number, data_format, source, batch = item
+            started = time.perf_counter()
+            if executor is None:
+                formatter = self.data_formatter.for_data_format(data_format)
+                users = formatter(batch, None, rejections, source).process_data()
+            else:
+                users, batch_rejections, _ = executor.submit(
+                    UsersDataMerger.format_batch_in_worker,
+                    batch,
+                    data_format,
+                    self.data_formatter,
+                    None,
+                    self.new_rejections(),
+                    source,
+                ).result()
+                if rejections is not None:
+                    rejections.merge(batch_rejections)
+            if isinstance(users, DataFrame):
+                users = users.to_dict(orient="records")
+            self.add_stage_time("format", self.count_rows(batch), started)
+            self.put(formatted_batches, (file_number, batch_number, users or []))
+
+    @staticmethod
+    def get_staging_row(
+        user: dict, file_number: int, batch_number: int, batch_row: int
+    ) -> tuple:
+        children = user.get("children")
+        return (
+            user.get("email"),
+            user.get("firstname"),
+            user.get("telephone_number"),
+            user.get("password"),
+            user.get("role"),
+            user.get("created_at"),
+            json.dumps(children, default=str) if isinstance(children, list) else None,
+            file_number,
+            batch_number,
+            batch_row,
+        )
+
+    def write_users(self, formatted_batches: queue.Queue):
+        db_conn = SqliteUsersBackend.connect(
+            self.db_path, busy_timeout=self.busy_timeout
+        )
+        try:
+            # WAL is persistent, readers keep working while data is loaded
+            db_conn.execute("PRAGMA journal_mode = WAL;")
+            with db_conn:
+                cursor = db_conn.cursor()
+                SqliteUsersBackend.create_starting_db_tables(cursor)
+                cursor.execute(CREATE_STAGING_TABLE)
+                cursor.execute(CREATE_STAGING_INDEX)
+            while True:
+                item = self.get(formatted_batches)
+                if item is None:
+                    break
+                file_number, batch_number, users = item
+                started = time.perf_counter()
+                with db_conn:
+                    db_conn.executemany(
+                        UPSERT_STAGING,
+                        (
+                            self.get_staging_row(
+                                user, file_number, batch_number, batch_row
+                            )
+                            for batch_row, user in enumerate(users)
+                        ),
+                    )
+                self.add_stage_time("write", len(users), started)
+            self.finalize(db_conn)
+        finally:
+            db_conn.close()
+
+    def finalize(self, db_conn: sqlite3.Connection):
+        started = time.perf_counter()
+        with db_conn:
+            cursor = db_conn.cursor()
+            cursor.execute("""SELECT COUNT(*) FROM users_staging;""")
+            self.staged_users = cursor.fetchone()[0]
+            cursor.execute(INSERT_USERS)
+            cursor.execute(INSERT_CHILDREN)
+            cursor.execute("""SELECT COUNT(*) FROM users_data;""")
+            self.inserted_users = cursor.fetchone()[0]
+            SqliteUsersBackend.build_login_filter(cursor, self.false_positive_rate)
+            cursor.execute("""DROP TABLE users_staging;""")
+        self.add_stage_time("finalize", self.staged_users, started)
+
+    def add_to_metrics(self, metrics: MetricsRegistry):
+        # Stage throughput is rows over busy seconds of the stage
+        for stage in self.STAGES:
+            metrics.inc("users_db_load_rows_total", self.rows[stage], stage=stage)
+            metrics.inc("users_db_load_seconds_total", self.seconds[stage], stage=stage)
+        metrics.inc(
+            "users_data_duplicates_dropped_total",
+            self.rows["write"] - self.staged_users,
+            column="telephone_number",
+        )
+        metrics.inc(
+            "users_data_duplicates_dropped_total",
+            self.staged_users - self.inserted_users,
+            column="email",
+        )
+
+    def throughput_summary(self) -> List[str]:
+        return [
+            f"{stage}: {self.rows[stage]} rows in {self.seconds[stage]:.2f} s"
+            + (
+                f" ({self.rows[stage] / self.seconds[stage]:.0f} rows/s)"
+                if self.seconds[stage]
+                else ""
+            )
+            for stage in self.STAGES
+        ]
+
+    def print_throughput(self):
+        print(
+            "\n".join(["Database load throughput:"] + self.throughput_summary()),
+            file=sys.stderr,
+        )